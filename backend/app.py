@@ -1,22 +1,50 @@
-from flask import Flask, jsonify, request, send_from_directory, send_file, session, redirect
+from flask import Flask, jsonify, request, send_from_directory, send_file, session, redirect, abort, make_response, Response, stream_with_context
 from flask_cors import CORS
 from flask_login import login_required, current_user
 from flask_mail import Mail
-from models import db, Vehicle, ServiceRecord, FuelRecord, Reminder, Todo, User, RecurringExpense
+from models import db, Vehicle, ServiceRecord, FuelRecord, Reminder, Todo, User, RecurringExpense, VehicleStats, Job
 from auth import auth_bp, login_manager
+import vehicle_stats
+import exports
+import imports
+import images
+import upload_store
+import jobs
+import file_delivery
+import record_writes
+import reminder_due
+import data_versions
+import backups
+import compression
+import identity
+import server_sessions
+import restore
+import sqlite_profile  # registers the per-connection PRAGMA hook
+import static_assets
 from config import Config
+from sqlalchemy import false, true, tuple_, func
+from sqlalchemy.exc import IntegrityError
 import os
-from datetime import datetime, timedelta
-import pandas as pd
+from datetime import date, datetime, timedelta
+from functools import wraps
 from werkzeug.utils import secure_filename
-import io
+from werkzeug.security import safe_join
+from werkzeug.middleware.proxy_fix import ProxyFix
 import shutil
 import zipfile
 import tempfile
 import secrets
 import re
-
-app = Flask(__name__, static_folder='../frontend/static', template_folder='../frontend/templates')
+import base64
+import json
+
+# Pages come from the asset build (see build_assets.py) when there is one,
+# so they reference fingerprinted /assets/ URLs.
+app = Flask(
+    __name__,
+    static_folder='../frontend/static',
+    template_folder=static_assets.BUILD_TEMPLATES_DIR if static_assets.is_built() else '../frontend/templates'
+)
 app.config.from_object(Config)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=12)
@@ -24,9 +52,15 @@ app.config['SESSION_COOKIE_SECURE'] = False
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 
+if app.config['TRUSTED_PROXY_HOPS']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_HOPS'], x_proto=app.config['TRUSTED_PROXY_HOPS'])
+
 CORS(app, supports_credentials=True, resources={r"/api/*": {"origins": "*"}})
 db.init_app(app)
 login_manager.init_app(app)
+compression.init_app(app)
+identity.init_app(app)
+server_sessions.init_app(app)
 mail = Mail(app)
 
 app.register_blueprint(auth_bp)
@@ -35,6 +69,10 @@ ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'gif', 'csv'}
 ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 ALLOWED_ATTACHMENT_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'txt', 'doc', 'docx', 'xls', 'xlsx', 'csv', 'odt', 'ods'}
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_BATCH_OPERATIONS = 500
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -48,9 +86,107 @@ def validate_email(email):
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return re.match(pattern, email) is not None
 
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if isinstance(v, date) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, columns):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    values = json.loads(raw)
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError('Cursor does not match sort key')
+    
+    decoded = []
+    for column, value in zip(columns, values):
+        python_type = column.type.python_type
+        if python_type is datetime:
+            decoded.append(datetime.fromisoformat(value))
+        elif python_type is date:
+            decoded.append(date.fromisoformat(value))
+        else:
+            decoded.append(python_type(value))
+    return decoded
+
+def keyset_page(query, columns):
+    # Newest first, keyed on (sort column, id) so every page is a single index
+    # range scan. Clients that send neither limit nor cursor get every row.
+    query = query.order_by(*[column.desc() for column in columns])
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    
+    if limit is None and not cursor:
+        return query.all(), None, False
+    
+    limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+    
+    if cursor:
+        try:
+            values = decode_cursor(cursor, columns)
+        except (ValueError, TypeError):
+            abort(make_response(jsonify({'error': 'Invalid cursor'}), 400))
+        query = query.filter(tuple_(*columns) < tuple_(*values))
+    
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+    return rows, next_cursor, True
+
+def page_response(items, next_cursor, paginated):
+    if paginated:
+        return jsonify({'items': items, 'next_cursor': next_cursor}), 200
+    return jsonify(items), 200
+
+def conditional_get(scope):
+    """Answer If-None-Match with 304 from the data version, before the view runs.
+
+    scope is 'vehicle' (the route's vehicle_id) or 'user'.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+            
+            if scope == 'vehicle':
+                version = data_versions.vehicle_version(kwargs['vehicle_id'])
+                if version is None:
+                    return view(*args, **kwargs)
+            else:
+                version = data_versions.user_version()
+            
+            etag = data_versions.etag(scope, version)
+            # Weak comparison: compression turns the tag into W/"...".
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+@app.before_request
+def reconnect_after_restore():
+    restore.reconnect_if_restored()
+
+@app.before_request
+def start_job_workers():
+    jobs.ensure_in_process_workers(app)
+
 @app.before_request
 def check_session():
-    session.permanent = True
+    # Assets and uploads leave the session alone, so they never start one
+    # and their responses do not vary by cookie.
+    if request.endpoint in ('serve_asset', 'serve_upload'):
+        return
+    if not session.permanent:
+        session.permanent = True
     if 'csrf_token' not in session:
         session['csrf_token'] = secrets.token_hex(16)
 
@@ -128,12 +264,17 @@ def reminders_page():
 def planner_page():
     return send_from_directory(app.template_folder, 'planner.html')
 
+@app.route('/assets/<path:filename>')
+def serve_asset(filename):
+    return static_assets.send_asset(filename)
+
 @app.route('/uploads/<path:filename>')
 def serve_upload(filename):
-    return send_from_directory('/app/uploads', filename)
+    return file_delivery.send_upload(filename, cache_control=upload_store.cache_control(filename))
 
 @app.route('/api/settings', methods=['GET'])
 @login_required
+@conditional_get('user')
 def get_settings():
     return jsonify({
         'username': current_user.username,
@@ -142,7 +283,8 @@ def get_settings():
         'unit_system': current_user.unit_system,
         'currency': current_user.currency,
         'theme': current_user.theme,
-        'photo': current_user.photo
+        'photo': current_user.photo,
+        'photo_variants': images.photo_variants(app.config['UPLOAD_FOLDER'], current_user.photo)
     }), 200
 
 @app.route('/api/settings/language', methods=['POST'])
@@ -199,114 +341,67 @@ def update_profile():
 @login_required
 def create_backup():
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_filename = f'masina_dock_backup_{timestamp}.zip'
     
-    temp_dir = tempfile.mkdtemp()
-    backup_path = os.path.join(temp_dir, backup_filename)
+    parent = None
+    if request.args.get('mode') == 'incremental':
+        base = request.args.get('base')
+        parent = backups.load_manifest(base) if base else backups.latest_manifest()
+        if base and parent is None:
+            return jsonify({'error': 'Base backup not found'}), 404
+    
+    kind = 'incremental' if parent else 'full'
+    backup_filename = f'masina_dock_backup_{timestamp}_{kind}.zip'
     
     try:
-        with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            db_path = '/app/data/masina_dock.db'
-            if os.path.exists(db_path):
-                zipf.write(db_path, 'masina_dock.db')
-            
-            uploads_dir = '/app/uploads'
-            if os.path.exists(uploads_dir):
-                for root, dirs, files in os.walk(uploads_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, '/app')
-                        zipf.write(file_path, arcname)
-        
-        return send_file(
-            backup_path,
-            mimetype='application/zip',
-            as_attachment=True,
-            download_name=backup_filename
-        )
+        snapshot_dir = backups.create_snapshot()
     except Exception as e:
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
         return jsonify({'error': str(e)}), 500
+    
+    return Response(
+        stream_with_context(backups.iter_backup_zip(snapshot_dir, app.config['UPLOAD_FOLDER'], parent)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename={backup_filename}'}
+    )
 
 @app.route('/api/backup/restore', methods=['POST'])
 @login_required
 def restore_backup():
-    if 'backup' not in request.files:
+    # A full backup on its own, or a full backup plus its incrementals.
+    files = request.files.getlist('backup')
+    if not files:
         return jsonify({'error': 'No backup file provided'}), 400
     
-    file = request.files['backup']
-    
-    if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
-    
-    if not file.filename.endswith('.zip'):
-        return jsonify({'error': 'Invalid file type. Please upload a .zip file.'}), 400
+    for file in files:
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        
+        if not file.filename.endswith('.zip'):
+            return jsonify({'error': 'Invalid file type. Please upload a .zip file.'}), 400
     
     temp_dir = tempfile.mkdtemp()
-    backup_path = os.path.join(temp_dir, secure_filename(file.filename))
     
     try:
-        file.save(backup_path)
-        
-        with zipfile.ZipFile(backup_path, 'r') as zipf:
-            zipf.extractall(temp_dir)
-        
-        extracted_db = os.path.join(temp_dir, 'masina_dock.db')
-        if os.path.exists(extracted_db):
-            target_db = '/app/data/masina_dock.db'
-            backup_db = '/app/data/masina_dock.db.backup'
-            
-            if os.path.exists(target_db):
-                shutil.copy2(target_db, backup_db)
-                os.remove(target_db)
-            
-            shutil.copy2(extracted_db, target_db)
-        else:
-            raise Exception('Database file not found in backup')
-        
-        extracted_uploads = os.path.join(temp_dir, 'uploads')
-        if os.path.exists(extracted_uploads):
-            target_uploads = '/app/uploads'
-            
-            for item in os.listdir(target_uploads):
-                item_path = os.path.join(target_uploads, item)
-                try:
-                    if os.path.isfile(item_path):
-                        os.remove(item_path)
-                    elif os.path.isdir(item_path):
-                        shutil.rmtree(item_path)
-                except Exception as e:
-                    print(f"Error removing {item_path}: {e}")
-            
-            for root, dirs, files in os.walk(extracted_uploads):
-                rel_path = os.path.relpath(root, extracted_uploads)
-                target_path = os.path.join(target_uploads, rel_path) if rel_path != '.' else target_uploads
-                
-                os.makedirs(target_path, exist_ok=True)
-                
-                for file in files:
-                    src_file = os.path.join(root, file)
-                    dst_file = os.path.join(target_path, file)
-                    shutil.copy2(src_file, dst_file)
-                    os.chmod(dst_file, 0o644)
-        
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
+        archive_paths = []
+        for index, file in enumerate(files):
+            archive_path = os.path.join(temp_dir, f'{index}_{secure_filename(file.filename)}')
+            file.save(archive_path)
+            archive_paths.append(archive_path)
         
+        restore.restore_archives(archive_paths, app.config['UPLOAD_FOLDER'])
         return jsonify({'message': 'Backup restored successfully'}), 200
         
     except zipfile.BadZipFile:
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
         return jsonify({'error': 'Invalid or corrupted backup file'}), 400
+    except (backups.BackupChainError, restore.RestoreError) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
         return jsonify({'error': f'Restore failed: {str(e)}'}), 500
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
 
 @app.route('/api/vehicles', methods=['GET', 'POST'])
 @login_required
+@conditional_get('user')
 def vehicles():
     if request.method == 'GET':
         vehicles = Vehicle.query.filter_by(user_id=current_user.id).all()
@@ -319,6 +414,7 @@ def vehicles():
             'license_plate': v.license_plate,
             'odometer': v.odometer,
             'photo': v.photo,
+            'photo_variants': images.photo_variants(app.config['UPLOAD_FOLDER'], v.photo),
             'status': v.status
         } for v in vehicles]), 200
     
@@ -334,6 +430,7 @@ def vehicles():
             odometer=data.get('odometer', 0),
             photo=data.get('photo')
         )
+        vehicle.stats = VehicleStats()
         db.session.add(vehicle)
         db.session.commit()
         return jsonify({'id': vehicle.id, 'message': 'Vehicle added successfully'}), 201
@@ -350,20 +447,27 @@ def upload_photo():
         return jsonify({'error': 'No file selected'}), 400
     
     if file and allowed_image(file.filename):
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        random_suffix = secrets.token_hex(4)
-        filename = f"{timestamp}_{random_suffix}_{filename}"
-        
-        uploads_dir = '/app/uploads'
-        os.makedirs(uploads_dir, exist_ok=True)
-        
-        filepath = os.path.join(uploads_dir, filename)
-        file.save(filepath)
+        uploads_dir = app.config['UPLOAD_FOLDER']
+        path, created = upload_store.store(file.stream, uploads_dir, file.filename)
         
-        os.chmod(filepath, 0o644)
+        try:
+            images.check_image(os.path.join(uploads_dir, path))
+        except images.ImageError:
+            db.session.rollback()
+            if created:
+                upload_store.discard(uploads_dir, path)
+            return jsonify({'error': 'The file is not a readable image'}), 400
         
-        return jsonify({'photo_url': f'/uploads/{filename}'}), 200
+        # Variants are resized in the background; until the job is done
+        # photo_variants is null and pages fall back to the original.
+        variants = images.photo_variants(uploads_dir, f'/uploads/{path}')
+        job = None if variants else jobs.enqueue('image_variants', {'path': path}, user_id=current_user.id)
+        db.session.commit()
+        return jsonify({
+            'photo_url': f'/uploads/{path}',
+            'photo_variants': variants,
+            'job_id': job.id if job else None
+        }), 200
     
     return jsonify({'error': 'Invalid file type. Only images are allowed.'}), 400
 
@@ -379,24 +483,22 @@ def upload_attachment():
         return jsonify({'error': 'No file selected'}), 400
     
     if file and allowed_attachment(file.filename):
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        random_suffix = secrets.token_hex(4)
-        filename = f"{timestamp}_{random_suffix}_{filename}"
-        
-        attachments_dir = '/app/uploads/attachments'
-        os.makedirs(attachments_dir, exist_ok=True)
-        
-        filepath = os.path.join(attachments_dir, filename)
-        file.save(filepath)
-        
-        os.chmod(filepath, 0o644)
-        
-        relative_path = f'attachments/{filename}'
-        return jsonify({'file_path': relative_path}), 200
+        path, created = upload_store.store(file.stream, app.config['UPLOAD_FOLDER'], file.filename)
+        job = None
+        if created and allowed_image(file.filename):
+            # Preview-sized variants of photographed receipts.
+            job = jobs.enqueue('image_variants', {'path': path}, user_id=current_user.id)
+        db.session.commit()
+        return jsonify({'file_path': path, 'job_id': job.id if job else None}), 200
     
     return jsonify({'error': 'Invalid file type'}), 400
 
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    job = Job.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    return jsonify(jobs.job_status(job)), 200
+
 @app.route('/api/attachments/download', methods=['GET'])
 @login_required
 def download_attachment():
@@ -405,21 +507,20 @@ def download_attachment():
     if not file_path:
         return jsonify({'error': 'No file path provided'}), 400
     
-    full_path = os.path.join('/app/uploads', file_path)
+    full_path = safe_join(app.config['UPLOAD_FOLDER'], file_path)
     
-    if not os.path.exists(full_path):
-        return jsonify({'error': 'File not found'}), 404
-    
-    if not full_path.startswith('/app/uploads'):
+    if full_path is None:
         return jsonify({'error': 'Invalid file path'}), 403
     
-    directory = os.path.dirname(full_path)
-    filename = os.path.basename(full_path)
+    if not os.path.exists(full_path):
+        return jsonify({'error': 'File not found'}), 404
     
-    return send_from_directory(directory, filename, as_attachment=True)
+    cache_control = upload_store.PRIVATE_IMMUTABLE if upload_store.is_immutable(file_path) else None
+    return file_delivery.send_upload(file_path, as_attachment=True, cache_control=cache_control)
 
 @app.route('/api/vehicles/<int:vehicle_id>', methods=['GET', 'PUT', 'DELETE'])
 @login_required
+@conditional_get('vehicle')
 def vehicle_detail(vehicle_id):
     vehicle = Vehicle.query.filter_by(id=vehicle_id, user_id=current_user.id).first_or_404()
     
@@ -433,6 +534,7 @@ def vehicle_detail(vehicle_id):
             'license_plate': vehicle.license_plate,
             'odometer': vehicle.odometer,
             'photo': vehicle.photo,
+            'photo_variants': images.photo_variants(app.config['UPLOAD_FOLDER'], vehicle.photo),
             'status': vehicle.status
         }), 200
     
@@ -454,14 +556,64 @@ def vehicle_detail(vehicle_id):
         db.session.commit()
         return jsonify({'message': 'Vehicle deleted successfully'}), 200
 
+@app.route('/api/vehicles/<int:vehicle_id>/summary', methods=['GET'])
+@login_required
+@conditional_get('vehicle')
+def vehicle_summary(vehicle_id):
+    vehicle = Vehicle.query.filter_by(id=vehicle_id, user_id=current_user.id).first_or_404()
+    
+    stats = vehicle_stats.get_vehicle_stats(vehicle)
+    fuel_query = FuelRecord.query.filter(FuelRecord.vehicle_id == vehicle_id)
+    
+    # Totals come from the rollup row; the rest is one SELECT of indexed probes.
+    extras = db.session.query(
+        fuel_query.with_entities(func.avg(FuelRecord.fuel_economy)).filter(FuelRecord.fuel_economy > 0).scalar_subquery().label('average_economy'),
+        fuel_query.with_entities(FuelRecord.unit).order_by(FuelRecord.date.desc(), FuelRecord.id.desc()).limit(1).scalar_subquery().label('economy_unit'),
+        Reminder.query.with_entities(func.count(Reminder.id)).filter(Reminder.vehicle_id == vehicle_id, Reminder.completed == false()).scalar_subquery().label('open_reminders')
+    ).one()
+    
+    cost_by_category = {category: getattr(stats, column) for category, column in vehicle_stats.CATEGORY_COLUMNS.items()}
+    cost_by_category['Other'] = stats.other_cost
+    
+    last_service = ServiceRecord.query.filter_by(vehicle_id=vehicle_id).order_by(ServiceRecord.date.desc(), ServiceRecord.id.desc()).first()
+    
+    return jsonify({
+        'vehicle_id': vehicle.id,
+        'service_count': stats.service_count,
+        'total_service_cost': stats.service_cost,
+        'cost_by_category': cost_by_category,
+        'last_service': {
+            'id': last_service.id,
+            'date': last_service.date.isoformat(),
+            'odometer': last_service.odometer,
+            'description': last_service.description,
+            'category': last_service.category,
+            'cost': last_service.cost
+        } if last_service else None,
+        'fuel_count': stats.fuel_count,
+        'total_fuel_cost': stats.fuel_cost,
+        'total_fuel_volume': stats.fuel_volume,
+        'average_fuel_economy': extras.average_economy,
+        'fuel_economy_unit': extras.economy_unit,
+        'total_distance': stats.total_distance,
+        'total_cost': stats.service_cost + stats.fuel_cost,
+        'last_odometer': max(vehicle.odometer or 0, stats.max_odometer or 0),
+        'last_fuel_date': stats.last_fuel_date.isoformat() if stats.last_fuel_date else None,
+        'open_reminders': extras.open_reminders
+    }), 200
+
 @app.route('/api/vehicles/<int:vehicle_id>/service-records', methods=['GET', 'POST'])
 @login_required
+@conditional_get('vehicle')
 def service_records(vehicle_id):
     vehicle = Vehicle.query.filter_by(id=vehicle_id, user_id=current_user.id).first_or_404()
     
     if request.method == 'GET':
-        records = ServiceRecord.query.filter_by(vehicle_id=vehicle_id).order_by(ServiceRecord.date.desc()).all()
-        return jsonify([{
+        records, next_cursor, paginated = keyset_page(
+            ServiceRecord.query.filter_by(vehicle_id=vehicle_id),
+            (ServiceRecord.date, ServiceRecord.id)
+        )
+        return page_response([{
             'id': r.id,
             'date': r.date.isoformat(),
             'odometer': r.odometer,
@@ -470,32 +622,25 @@ def service_records(vehicle_id):
             'notes': r.notes,
             'category': r.category,
             'document_path': r.document_path
-        } for r in records]), 200
+        } for r in records], next_cursor, paginated)
     
     elif request.method == 'POST':
-        data = request.get_json()
-        record = ServiceRecord(
-            vehicle_id=vehicle_id,
-            date=datetime.fromisoformat(data['date']),
-            odometer=data['odometer'],
-            description=data['description'],
-            cost=data.get('cost', 0.0),
-            notes=data.get('notes'),
-            category=data.get('category'),
-            document_path=data.get('document_path')
-        )
-        db.session.add(record)
+        record = record_writes.create_service_record(vehicle, request.get_json())
         db.session.commit()
         return jsonify({'id': record.id, 'message': 'Service record added successfully'}), 201
 
 @app.route('/api/vehicles/<int:vehicle_id>/fuel-records', methods=['GET', 'POST'])
 @login_required
+@conditional_get('vehicle')
 def fuel_records(vehicle_id):
     vehicle = Vehicle.query.filter_by(id=vehicle_id, user_id=current_user.id).first_or_404()
     
     if request.method == 'GET':
-        records = FuelRecord.query.filter_by(vehicle_id=vehicle_id).order_by(FuelRecord.date.desc()).all()
-        return jsonify([{
+        records, next_cursor, paginated = keyset_page(
+            FuelRecord.query.filter_by(vehicle_id=vehicle_id),
+            (FuelRecord.date, FuelRecord.id)
+        )
+        return page_response([{
             'id': r.id,
             'date': r.date.isoformat(),
             'odometer': r.odometer,
@@ -506,47 +651,63 @@ def fuel_records(vehicle_id):
             'fuel_economy': r.fuel_economy,
             'unit': r.unit,
             'notes': r.notes
-        } for r in records]), 200
+        } for r in records], next_cursor, paginated)
     
     elif request.method == 'POST':
-        data = request.get_json()
-        
-        last_record = FuelRecord.query.filter_by(vehicle_id=vehicle_id).order_by(FuelRecord.odometer.desc()).first()
-        distance = data['odometer'] - last_record.odometer if last_record else 0
-        
-        fuel_economy = None
-        if distance > 0 and data['fuel_amount'] > 0:
-            if data.get('unit', 'MPG') == 'MPG':
-                fuel_economy = distance / data['fuel_amount']
-            elif data.get('unit') == 'L/100KM':
-                fuel_economy = (data['fuel_amount'] / distance) * 100
-            elif data.get('unit') == 'KM/L':
-                fuel_economy = distance / data['fuel_amount']
-        
-        record = FuelRecord(
-            vehicle_id=vehicle_id,
-            date=datetime.fromisoformat(data['date']),
-            odometer=data['odometer'],
-            fuel_amount=data['fuel_amount'],
-            cost=data.get('cost', 0.0),
-            unit_cost=data.get('unit_cost'),
-            distance=distance,
-            fuel_economy=fuel_economy,
-            unit=data.get('unit', 'MPG'),
-            notes=data.get('notes')
-        )
-        db.session.add(record)
+        record = record_writes.create_fuel_record(vehicle, request.get_json())
         db.session.commit()
-        return jsonify({'id': record.id, 'message': 'Fuel record added successfully', 'fuel_economy': fuel_economy}), 201
+        return jsonify({'id': record.id, 'message': 'Fuel record added successfully', 'fuel_economy': record.fuel_economy}), 201
+
+@app.route('/api/vehicles/<int:vehicle_id>/batch', methods=['POST'])
+@login_required
+def batch_operations(vehicle_id):
+    vehicle = Vehicle.query.filter_by(id=vehicle_id, user_id=current_user.id).first_or_404()
+    data = request.get_json(silent=True)
+    operations = data.get('operations') if isinstance(data, dict) else None
+    
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'operations must be a non-empty list'}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({'error': f'At most {MAX_BATCH_OPERATIONS} operations per batch'}), 400
+    
+    # pysqlite only opens a transaction before DML, so every SAVEPOINT would
+    # otherwise run in, and be committed by, its own. IMMEDIATE also takes
+    # the write lock up front rather than part way through the batch.
+    if db.engine.dialect.name == 'sqlite':
+        db.session.connection().exec_driver_sql('BEGIN IMMEDIATE')
+    
+    results = []
+    for index, operation in enumerate(operations):
+        savepoint = db.session.begin_nested()
+        try:
+            result = record_writes.apply_operation(vehicle, operation)
+            savepoint.commit()
+        except record_writes.BatchItemError as e:
+            savepoint.rollback()
+            result = {'status': e.status, 'error': str(e)}
+        except KeyError as e:
+            savepoint.rollback()
+            result = {'status': 400, 'error': f'Missing field: {e.args[0]}'}
+        except (ValueError, TypeError, IntegrityError) as e:
+            savepoint.rollback()
+            result = {'status': 400, 'error': f'Invalid data: {str(e)}'}
+        results.append(dict(result, index=index))
+    
+    db.session.commit()
+    return jsonify({'results': results}), 200
 
 @app.route('/api/vehicles/<int:vehicle_id>/reminders', methods=['GET', 'POST'])
 @login_required
+@conditional_get('vehicle')
 def reminders(vehicle_id):
     vehicle = Vehicle.query.filter_by(id=vehicle_id, user_id=current_user.id).first_or_404()
     
     if request.method == 'GET':
-        reminders = Reminder.query.filter_by(vehicle_id=vehicle_id, completed=False).all()
-        return jsonify([{
+        reminders, next_cursor, paginated = keyset_page(
+            Reminder.query.filter(Reminder.vehicle_id == vehicle_id, Reminder.completed == false()),
+            (Reminder.id,)
+        )
+        return page_response([{
             'id': r.id,
             'description': r.description,
             'urgency': r.urgency,
@@ -557,34 +718,54 @@ def reminders(vehicle_id):
             'interval_type': r.interval_type,
             'interval_value': r.interval_value,
             'notes': r.notes
-        } for r in reminders]), 200
+        } for r in reminders], next_cursor, paginated)
     
     elif request.method == 'POST':
-        data = request.get_json()
-        reminder = Reminder(
-            vehicle_id=vehicle_id,
-            description=data['description'],
-            urgency=data.get('urgency', 'not_urgent'),
-            due_date=datetime.fromisoformat(data['due_date']) if data.get('due_date') else None,
-            due_odometer=data.get('due_odometer'),
-            metric=data.get('metric'),
-            recurring=data.get('recurring', False),
-            interval_type=data.get('interval_type'),
-            interval_value=data.get('interval_value'),
-            notes=data.get('notes')
-        )
-        db.session.add(reminder)
+        try:
+            reminder = record_writes.create_reminder(vehicle, request.get_json())
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 400
         db.session.commit()
         return jsonify({'id': reminder.id, 'message': 'Reminder added successfully'}), 201
 
+@app.route('/api/reminders/due', methods=['GET'])
+@login_required
+def due_reminders():
+    # No conditional_get: the state changes with the date, not only with data.
+    states = tuple(request.args.get('state', ','.join(reminder_due.STATES)).split(','))
+    if any(state not in reminder_due.STATES for state in states):
+        return jsonify({'error': f"state must be one or more of {', '.join(reminder_due.STATES)}"}), 400
+    
+    today = date.today()
+    return jsonify([{
+        'id': row.Reminder.id,
+        'vehicle_id': row.Reminder.vehicle_id,
+        'vehicle': f'{row.year} {row.make} {row.model}',
+        'description': row.Reminder.description,
+        'urgency': row.Reminder.urgency,
+        'state': row.state,
+        'due_date': row.Reminder.due_date.isoformat() if row.Reminder.due_date else None,
+        'due_odometer': row.Reminder.due_odometer,
+        'days_left': (row.Reminder.due_date - today).days if row.Reminder.due_date else None,
+        'distance_left': row.Reminder.due_odometer - row.odometer if row.Reminder.due_odometer is not None else None,
+        'recurring': row.Reminder.recurring,
+        'interval_type': row.Reminder.interval_type,
+        'interval_value': row.Reminder.interval_value
+    } for row in reminder_due.due_reminders(current_user.id, today, states)]), 200
+
 @app.route('/api/vehicles/<int:vehicle_id>/todos', methods=['GET', 'POST'])
 @login_required
+@conditional_get('vehicle')
 def todos(vehicle_id):
     vehicle = Vehicle.query.filter_by(id=vehicle_id, user_id=current_user.id).first_or_404()
     
     if request.method == 'GET':
-        todos = Todo.query.filter_by(vehicle_id=vehicle_id).all()
-        return jsonify([{
+        todos, next_cursor, paginated = keyset_page(
+            Todo.query.filter_by(vehicle_id=vehicle_id),
+            (Todo.created_at, Todo.id)
+        )
+        return page_response([{
             'id': t.id,
             'description': t.description,
             'cost': t.cost,
@@ -592,7 +773,7 @@ def todos(vehicle_id):
             'status': t.status,
             'type': t.type,
             'notes': t.notes
-        } for t in todos]), 200
+        } for t in todos], next_cursor, paginated)
     
     elif request.method == 'POST':
         data = request.get_json()
@@ -611,11 +792,12 @@ def todos(vehicle_id):
 
 @app.route('/api/vehicles/<int:vehicle_id>/recurring-expenses', methods=['GET', 'POST'])
 @login_required
+@conditional_get('vehicle')
 def recurring_expenses(vehicle_id):
     vehicle = Vehicle.query.filter_by(id=vehicle_id, user_id=current_user.id).first_or_404()
     
     if request.method == 'GET':
-        expenses = RecurringExpense.query.filter_by(vehicle_id=vehicle_id, is_active=True).all()
+        expenses = RecurringExpense.query.filter(RecurringExpense.vehicle_id == vehicle_id, RecurringExpense.is_active == true()).order_by(RecurringExpense.next_due_date).all()
         return jsonify([{
             'id': e.id,
             'expense_type': e.expense_type,
@@ -679,78 +861,7 @@ def cancel_recurring_expense(vehicle_id, expense_id):
 def export_all_vehicle_data(vehicle_id):
     vehicle = Vehicle.query.filter_by(id=vehicle_id, user_id=current_user.id).first_or_404()
     
-    service_records = ServiceRecord.query.filter_by(vehicle_id=vehicle_id).order_by(ServiceRecord.date.desc()).all()
-    fuel_records = FuelRecord.query.filter_by(vehicle_id=vehicle_id).order_by(FuelRecord.date.desc()).all()
-    reminders = Reminder.query.filter_by(vehicle_id=vehicle_id).all()
-    todos = Todo.query.filter_by(vehicle_id=vehicle_id).all()
-    
-    output = io.BytesIO()
-    
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        vehicle_data = pd.DataFrame([{
-            'Year': vehicle.year,
-            'Make': vehicle.make,
-            'Model': vehicle.model,
-            'VIN': vehicle.vin or '',
-            'License Plate': vehicle.license_plate or '',
-            'Current Odometer': vehicle.odometer,
-            'Status': vehicle.status,
-            'Photo URL': vehicle.photo or ''
-        }])
-        vehicle_data.to_excel(writer, sheet_name='Vehicle Info', index=False)
-        
-        if service_records:
-            service_df = pd.DataFrame([{
-                'Date': r.date.strftime('%Y-%m-%d'),
-                'Odometer': r.odometer,
-                'Description': r.description,
-                'Category': r.category or '',
-                'Cost': r.cost,
-                'Notes': r.notes or '',
-                'Document': r.document_path or ''
-            } for r in service_records])
-            service_df.to_excel(writer, sheet_name='Service Records', index=False)
-        
-        if fuel_records:
-            fuel_df = pd.DataFrame([{
-                'Date': r.date.strftime('%Y-%m-%d'),
-                'Odometer': r.odometer,
-                'Fuel Amount': r.fuel_amount,
-                'Unit': r.unit,
-                'Cost': r.cost,
-                'Unit Cost': r.unit_cost or 0,
-                'Distance': r.distance or 0,
-                'Fuel Economy': r.fuel_economy or 0,
-                'Notes': r.notes or ''
-            } for r in fuel_records])
-            fuel_df.to_excel(writer, sheet_name='Fuel Records', index=False)
-        
-        if reminders:
-            reminders_df = pd.DataFrame([{
-                'Description': r.description,
-                'Urgency': r.urgency,
-                'Due Date': r.due_date.strftime('%Y-%m-%d') if r.due_date else '',
-                'Due Odometer': r.due_odometer or '',
-                'Recurring': r.recurring,
-                'Interval Type': r.interval_type or '',
-                'Interval Value': r.interval_value or '',
-                'Notes': r.notes or '',
-                'Completed': r.completed
-            } for r in reminders])
-            reminders_df.to_excel(writer, sheet_name='Reminders', index=False)
-        
-        if todos:
-            todos_df = pd.DataFrame([{
-                'Description': t.description,
-                'Type': t.type or '',
-                'Priority': t.priority,
-                'Status': t.status,
-                'Cost': t.cost,
-                'Notes': t.notes or ''
-            } for t in todos])
-            todos_df.to_excel(writer, sheet_name='Todos', index=False)
-    
-    output.seek(0)
+    output = exports.vehicle_xlsx_file(vehicle)
     
     filename = f"{vehicle.year}_{vehicle.make}_{vehicle.model}_Complete_Data_{datetime.now().strftime('%Y%m%d')}.xlsx"
     
@@ -764,43 +875,60 @@ def export_all_vehicle_data(vehicle_id):
 @app.route('/api/export/<data_type>', methods=['GET'])
 @login_required
 def export_data(data_type):
-    vehicle_id = request.args.get('vehicle_id')
-    
-    if data_type == 'service_records':
-        records = ServiceRecord.query.filter_by(vehicle_id=vehicle_id).all()
-        df = pd.DataFrame([{
-            'Date': r.date,
-            'Odometer': r.odometer,
-            'Description': r.description,
-            'Cost': r.cost,
-            'Category': r.category,
-            'Notes': r.notes
-        } for r in records])
-    elif data_type == 'fuel_records':
-        records = FuelRecord.query.filter_by(vehicle_id=vehicle_id).all()
-        df = pd.DataFrame([{
-            'Date': r.date,
-            'Odometer': r.odometer,
-            'Fuel Amount': r.fuel_amount,
-            'Cost': r.cost,
-            'Fuel Economy': r.fuel_economy,
-            'Unit': r.unit
-        } for r in records])
-    else:
+    if data_type not in exports.CSV_LAYOUTS:
         return jsonify({'error': 'Invalid data type'}), 400
     
-    output_file = f'/tmp/{data_type}_{vehicle_id}.csv'
-    df.to_csv(output_file, index=False)
-    return send_from_directory('/tmp', f'{data_type}_{vehicle_id}.csv', as_attachment=True)
+    vehicle_id = request.args.get('vehicle_id', type=int)
+    vehicle = Vehicle.query.filter_by(id=vehicle_id, user_id=current_user.id).first_or_404()
+    
+    return Response(
+        stream_with_context(exports.iter_csv(data_type, vehicle.id)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={data_type}_{vehicle.id}.csv'}
+    )
+
+@app.route('/api/vehicles/<int:vehicle_id>/import', methods=['POST'])
+@login_required
+def import_data(vehicle_id):
+    vehicle = Vehicle.query.filter_by(id=vehicle_id, user_id=current_user.id).first_or_404()
+    
+    if 'file' not in request.files or request.files['file'].filename == '':
+        return jsonify({'error': 'No file provided'}), 400
+    
+    file = request.files['file']
+    extension = file.filename.rsplit('.', 1)[-1].lower() if '.' in file.filename else ''
+    
+    try:
+        if extension == 'xlsx':
+            result = imports.import_xlsx(vehicle, file.stream)
+        elif extension == 'csv':
+            data_type = request.form.get('data_type')
+            if data_type not in exports.CSV_LAYOUTS:
+                return jsonify({'error': 'Invalid data type'}), 400
+            result = imports.import_csv(vehicle, data_type, file.stream)
+        else:
+            return jsonify({'error': 'Invalid file type. Please upload a .csv or .xlsx file.'}), 400
+    except imports.ImportFileError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except (ValueError, zipfile.BadZipFile, imports.InvalidFileException) as e:
+        db.session.rollback()
+        return jsonify({'error': f'Could not read file: {str(e)}'}), 400
+    
+    return jsonify(result), 200
 
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+    restore.ensure_uploads_tree(app.config['UPLOAD_FOLDER'])
+    # A single dev server has no job_worker.py next to it.
+    jobs.start_workers(app, app.config['JOB_WORKERS'])
     app.run(host='0.0.0.0', port=5000, debug=False)
 
 # Edit/Delete operations for Service Records
 @app.route('/api/vehicles/<int:vehicle_id>/service-records/<int:record_id>', methods=['GET', 'PUT', 'DELETE'])
 @login_required
+@conditional_get('vehicle')
 def service_record_operations(vehicle_id, record_id):
     vehicle = Vehicle.query.filter_by(id=vehicle_id, user_id=current_user.id).first_or_404()
     record = ServiceRecord.query.filter_by(id=record_id, vehicle_id=vehicle_id).first_or_404()
@@ -818,24 +946,19 @@ def service_record_operations(vehicle_id, record_id):
         })
     
     elif request.method == 'PUT':
-        data = request.get_json()
-        record.date = datetime.fromisoformat(data['date']).date() if 'date' in data else record.date
-        record.odometer = data.get('odometer', record.odometer)
-        record.description = data.get('description', record.description)
-        record.category = data.get('category', record.category)
-        record.cost = data.get('cost', record.cost)
-        record.notes = data.get('notes', record.notes)
+        record_writes.update_service_record(vehicle, record, request.get_json())
         db.session.commit()
         return jsonify({'message': 'Service record updated successfully'})
     
     elif request.method == 'DELETE':
-        db.session.delete(record)
+        record_writes.delete_service_record(vehicle, record)
         db.session.commit()
         return jsonify({'message': 'Service record deleted successfully'})
 
 # Edit/Delete operations for Fuel Records
 @app.route('/api/vehicles/<int:vehicle_id>/fuel-records/<int:record_id>', methods=['GET', 'PUT', 'DELETE'])
 @login_required
+@conditional_get('vehicle')
 def fuel_record_operations(vehicle_id, record_id):
     vehicle = Vehicle.query.filter_by(id=vehicle_id, user_id=current_user.id).first_or_404()
     record = FuelRecord.query.filter_by(id=record_id, vehicle_id=vehicle_id).first_or_404()
@@ -851,23 +974,19 @@ def fuel_record_operations(vehicle_id, record_id):
         })
     
     elif request.method == 'PUT':
-        data = request.get_json()
-        record.date = datetime.fromisoformat(data['date']).date() if 'date' in data else record.date
-        record.odometer = data.get('odometer', record.odometer)
-        record.fuel_amount = data.get('fuel_amount', record.fuel_amount)
-        record.cost = data.get('cost', record.cost)
-        record.notes = data.get('notes', record.notes)
+        record_writes.update_fuel_record(vehicle, record, request.get_json())
         db.session.commit()
         return jsonify({'message': 'Fuel record updated successfully'})
     
     elif request.method == 'DELETE':
-        db.session.delete(record)
+        record_writes.delete_fuel_record(vehicle, record)
         db.session.commit()
         return jsonify({'message': 'Fuel record deleted successfully'})
 
 # Edit/Delete operations for Reminders
 @app.route('/api/vehicles/<int:vehicle_id>/reminders/<int:reminder_id>', methods=['GET', 'PUT', 'DELETE'])
 @login_required
+@conditional_get('vehicle')
 def reminder_operations(vehicle_id, reminder_id):
     vehicle = Vehicle.query.filter_by(id=vehicle_id, user_id=current_user.id).first_or_404()
     reminder = Reminder.query.filter_by(id=reminder_id, vehicle_id=vehicle_id).first_or_404()
@@ -883,17 +1002,15 @@ def reminder_operations(vehicle_id, reminder_id):
         })
     
     elif request.method == 'PUT':
-        data = request.get_json()
-        reminder.description = data.get('description', reminder.description)
-        reminder.urgency = data.get('urgency', reminder.urgency)
-        if 'due_date' in data and data['due_date']:
-            reminder.due_date = datetime.fromisoformat(data['due_date']).date()
-        reminder.due_odometer = data.get('due_odometer', reminder.due_odometer)
-        reminder.notes = data.get('notes', reminder.notes)
+        try:
+            record_writes.update_reminder(vehicle, reminder, request.get_json())
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 400
         db.session.commit()
         return jsonify({'message': 'Reminder updated successfully'})
     
     elif request.method == 'DELETE':
-        db.session.delete(reminder)
+        record_writes.delete_reminder(vehicle, reminder)
         db.session.commit()
         return jsonify({'message': 'Reminder deleted successfully'})
@@ -7,19 +7,27 @@ import qrcode
 import io
 import base64
 import re
+import identity
+import password_admission
 from datetime import datetime
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 login_manager = LoginManager()
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
+# Served from a per-worker cache when possible; see identity.py.
+login_manager.user_loader(identity.load_user)
 
 @login_manager.unauthorized_handler
 def unauthorized():
     return jsonify({'error': 'Unauthorized access'}), 401
 
+@auth_bp.errorhandler(password_admission.Rejected)
+def too_many_attempts(e):
+    response = jsonify({'error': e.description})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
 def validate_email(email):
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return re.match(pattern, email) is not None
@@ -153,9 +161,11 @@ def login():
         if not data.get('username') or not data.get('password'):
             return jsonify({'error': 'Missing username or password'}), 400
         
-        user = User.query.filter_by(username=data['username']).first()
+        with password_admission.admit(data['username']):
+            user = User.query.filter_by(username=data['username']).first()
+            valid = user is not None and user.check_password(data['password'])
         
-        if not user or not user.check_password(data['password']):
+        if not valid:
             return jsonify({'error': 'Invalid username or password'}), 401
         
         if current_app.config.get('ENABLE_EMAIL_VERIFICATION', False) and not user.email_verified:
@@ -187,6 +197,8 @@ def login():
             }
         }), 200
     
+    except password_admission.Rejected:
+        raise
     except Exception as e:
         print(f"Login error: {e}")
         return jsonify({'error': f'Login failed: {str(e)}'}), 500
@@ -207,7 +219,10 @@ def verify_2fa():
     
     totp = pyotp.TOTP(user.two_factor_secret)
     
-    if totp.verify(code) or user.verify_backup_code(code):
+    with password_admission.admit(user.username):
+        valid = totp.verify(code) or user.verify_backup_code(code)
+    
+    if valid:
         login_user(user, remember=True)
         user.last_login = datetime.utcnow()
         db.session.commit()
@@ -294,7 +309,10 @@ def disable_2fa():
     if not password:
         return jsonify({'error': 'Password required'}), 400
     
-    if not current_user.check_password(password):
+    with password_admission.admit(current_user.username):
+        valid = current_user.check_password(password)
+    
+    if not valid:
         return jsonify({'error': 'Invalid password'}), 401
     
     current_user.two_factor_enabled = False
@@ -375,7 +393,10 @@ def update_credentials():
 def change_password():
     data = request.get_json()
     
-    if not current_user.check_password(data['current_password']):
+    with password_admission.admit(current_user.username):
+        valid = current_user.check_password(data['current_password'])
+    
+    if not valid:
         return jsonify({'error': 'Current password is incorrect'}), 400
     
     is_valid, message = validate_password(data['new_password'])
@@ -0,0 +1,18 @@
+import sys
+from app import app
+from models import db
+from images import backfill_variants
+from upload_store import bump_photo_references
+
+def backfill_photo_variants(force=False):
+    with app.app_context():
+        generated, failed = backfill_variants(app.config['UPLOAD_FOLDER'], force=force)
+        print(f"Generated variants for {len(generated)} photos")
+        for filename, error in failed:
+            print(f"  skipped {filename}: {error}")
+
+        bump_photo_references(generated)
+        db.session.commit()
+
+if __name__ == '__main__':
+    backfill_photo_variants(force='--force' in sys.argv[1:])
@@ -0,0 +1,68 @@
+from werkzeug.security import check_password_hash
+import hashlib
+import hmac
+import re
+import secrets
+
+# Backup codes are stored as 'tags$<n>:<r>:<p>$<salt>$<tag>,<tag>,...':
+# one random salt for the whole set and an scrypt tag per code, so a code
+# is checked with a single KDF evaluation however many codes are left.
+# Sets generated before this format, a comma-separated list of Werkzeug
+# password hashes, cost one hash per remaining code. They cannot be
+# re-keyed without the codes themselves, so they are still accepted until
+# the user sets up 2FA again; codes that could never match are rejected
+# before any hashing, whichever the format.
+
+PREFIX = 'tags'
+CODE_COUNT = 10
+# The cost Werkzeug uses for password hashes.
+SCRYPT_N, SCRYPT_R, SCRYPT_P = 2 ** 15, 8, 1
+CODE_PATTERN = re.compile(r'^[0-9A-F]{8}$')
+
+def normalize(code):
+    return re.sub(r'[\s-]', '', code or '').upper()
+
+def _tag(code, salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+    return hashlib.scrypt(code.encode(), salt=salt, n=n, r=r, p=p, maxmem=132 * n * r * p, dklen=32).hex()
+
+def _pack(params, salt, tags):
+    return f"{PREFIX}${params}${salt}${','.join(tags)}"
+
+def generate(count=CODE_COUNT):
+    """Returns (codes, stored): the codes to show once, and the column value."""
+    codes = [secrets.token_hex(4).upper() for _ in range(count)]
+    salt = secrets.token_bytes(16)
+    params = f'{SCRYPT_N}:{SCRYPT_R}:{SCRYPT_P}'
+    return codes, _pack(params, salt.hex(), [_tag(code, salt) for code in codes])
+
+def consume(stored, code):
+    """Check a backup code against the stored set.
+
+    Returns the value to store with that code used up, or None if it does
+    not match.
+    """
+    code = normalize(code)
+    if not stored or not CODE_PATTERN.match(code):
+        return None
+
+    if stored.startswith(f'{PREFIX}$'):
+        _, params, salt, tags = stored.split('$', 3)
+        n, r, p = map(int, params.split(':'))
+        candidate = _tag(code, bytes.fromhex(salt), n, r, p)
+        tags = tags.split(',') if tags else []
+        match = None
+        # Compares against every tag, so timing does not tell which matched.
+        for index, tag in enumerate(tags):
+            if hmac.compare_digest(tag, candidate):
+                match = index
+        if match is None:
+            return None
+        del tags[match]
+        return _pack(params, salt, tags)
+
+    hashes = stored.split(',')
+    for index, hashed in enumerate(hashes):
+        if check_password_hash(hashed, code):
+            del hashes[index]
+            return ','.join(hashes)
+    return None
@@ -0,0 +1,283 @@
+from models import db
+from datetime import datetime
+import hashlib
+import json
+import os
+import secrets
+import shutil
+import sqlite3
+import tempfile
+import zipfile
+
+DATABASE_ARCNAME = 'masina_dock.db'
+UPLOADS_ARCNAME = 'uploads'
+MANIFEST_ARCNAME = 'manifest.json'
+MANIFEST_FORMAT = 1
+
+# Pages copied per backup step. The source read lock is released between
+# steps, so writers are never blocked for longer than one step.
+SNAPSHOT_PAGES_PER_STEP = 256
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Already-compressed formats gain nothing from deflate.
+STORED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'webp', 'pdf', 'zip', 'docx', 'xlsx', 'odt', 'ods'}
+
+def database_path():
+    return db.engine.url.database
+
+def snapshot_database(target_path):
+    """Copy the live database to target_path through SQLite's online backup API.
+
+    SQLite restarts the copy if another connection writes mid-way, so the
+    result is always a consistent snapshot.
+    """
+    source = sqlite3.connect(database_path())
+    try:
+        target = sqlite3.connect(target_path)
+        try:
+            source.backup(target, pages=SNAPSHOT_PAGES_PER_STEP, sleep=0.005)
+        finally:
+            target.close()
+    finally:
+        source.close()
+
+def create_snapshot():
+    """Snapshot the database into a fresh temp directory and return its path."""
+    snapshot_dir = tempfile.mkdtemp(prefix='masina_dock_backup_')
+    try:
+        if os.path.exists(database_path()):
+            snapshot_database(os.path.join(snapshot_dir, DATABASE_ARCNAME))
+    except Exception:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+        raise
+    return snapshot_dir
+
+class _ZipStream:
+    # Write-only sink for ZipFile. It has no seek/tell, so zipfile writes
+    # data descriptors and the archive can be sent as it is produced.
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+class BackupChainError(Exception):
+    pass
+
+def manifest_dir():
+    return os.path.join(os.path.dirname(database_path()), 'backup_manifests')
+
+def new_backup_id():
+    # Sorts chronologically, which latest_manifest() relies on.
+    return f"{datetime.utcnow().strftime('%Y%m%d_%H%M%S_%f')}_{secrets.token_hex(3)}"
+
+def save_manifest(manifest):
+    os.makedirs(manifest_dir(), exist_ok=True)
+    path = os.path.join(manifest_dir(), f"{manifest['backup_id']}.json")
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, path)
+
+def load_manifest(backup_id):
+    if not backup_id or os.path.basename(backup_id) != backup_id:
+        return None
+    path = os.path.join(manifest_dir(), f'{backup_id}.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def latest_manifest():
+    if not os.path.isdir(manifest_dir()):
+        return None
+    names = sorted(name for name in os.listdir(manifest_dir()) if name.endswith('.json'))
+    return load_manifest(names[-1][:-len('.json')]) if names else None
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _upload_entries(uploads_dir):
+    # Hidden entries are scratch space (the upload store's .incoming);
+    # uploaded names never start with a dot because secure_filename() strips it.
+    for root, dirs, files in os.walk(uploads_dir):
+        dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+        for name in sorted(files):
+            if name.startswith('.'):
+                continue
+            path = os.path.join(root, name)
+            yield path, os.path.relpath(path, uploads_dir).replace(os.sep, '/')
+
+def _write_entry(zipf, stream, path, arcname):
+    # Yields archive bytes as they are produced; returns the file's sha256.
+    info = zipfile.ZipInfo.from_file(path, arcname)
+    extension = arcname.rsplit('.', 1)[-1].lower()
+    info.compress_type = zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source, zipf.open(info, 'w') as target:
+        while True:
+            chunk = source.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            target.write(chunk)
+            data = stream.drain()
+            if data:
+                yield data
+    data = stream.drain()
+    if data:
+        yield data
+    return digest.hexdigest()
+
+def _unchanged(known, stat, path):
+    # Size and mtime match: trust the parent's hash without reading the file.
+    # Only a size match: the file was touched, so compare content hashes.
+    if not known or known['size'] != stat.st_size:
+        return False
+    if known['mtime_ns'] == stat.st_mtime_ns:
+        return True
+    return file_sha256(path) == known['sha256']
+
+def iter_backup_zip(snapshot_dir, uploads_dir, parent=None):
+    """Yield a backup archive chunk by chunk and remove snapshot_dir afterwards.
+
+    Every archive carries a manifest of the complete uploads tree. With a
+    parent manifest, only files that are new or changed since the parent are
+    written; the rest are found further back in the chain on restore. The
+    manifest is stored server-side once the archive has been fully sent, so
+    it can serve as the parent of the next incremental backup.
+    """
+    try:
+        stream = _ZipStream()
+        parent_files = parent['files'] if parent else {}
+        files = {}
+        with zipfile.ZipFile(stream, 'w') as zipf:
+            snapshot = os.path.join(snapshot_dir, DATABASE_ARCNAME)
+            if os.path.exists(snapshot):
+                yield from _write_entry(zipf, stream, snapshot, DATABASE_ARCNAME)
+            if os.path.exists(uploads_dir):
+                for path, relpath in _upload_entries(uploads_dir):
+                    stat = os.stat(path)
+                    known = parent_files.get(relpath)
+                    if _unchanged(known, stat, path):
+                        files[relpath] = dict(known, mtime_ns=stat.st_mtime_ns)
+                        continue
+                    digest = yield from _write_entry(zipf, stream, path, f'{UPLOADS_ARCNAME}/{relpath}')
+                    files[relpath] = {'sha256': digest, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+            manifest = {
+                'format': MANIFEST_FORMAT,
+                'backup_id': new_backup_id(),
+                'parent_id': parent['backup_id'] if parent else None,
+                'created_at': datetime.utcnow().isoformat(),
+                'files': files
+            }
+            zipf.writestr(MANIFEST_ARCNAME, json.dumps(manifest))
+        yield stream.drain()
+        save_manifest(manifest)
+    finally:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+def read_archive_manifest(zipf):
+    if MANIFEST_ARCNAME not in zipf.namelist():
+        return None
+    return json.loads(zipf.read(MANIFEST_ARCNAME))
+
+def order_chain(archives):
+    """Order (manifest, zipf) pairs from the full base to the newest incremental.
+
+    A single archive without a manifest is a pre-manifest full backup.
+    """
+    if len(archives) == 1 and archives[0][0] is None:
+        return archives
+    if any(manifest is None for manifest, _ in archives):
+        raise BackupChainError('Only backups with a manifest can be combined')
+
+    by_id = {manifest['backup_id']: (manifest, zipf) for manifest, zipf in archives}
+    parents = {manifest['parent_id'] for manifest, _ in archives}
+    tips = [backup_id for backup_id in by_id if backup_id not in parents]
+    if len(tips) != 1:
+        raise BackupChainError('Backups do not form a single chain')
+
+    chain = []
+    backup_id = tips[0]
+    while backup_id is not None:
+        if backup_id not in by_id:
+            raise BackupChainError(f'Backup chain is missing {backup_id}')
+        chain.append(by_id[backup_id])
+        backup_id = by_id[backup_id][0]['parent_id']
+    if len(chain) != len(archives):
+        raise BackupChainError('Backups do not form a single chain')
+    return list(reversed(chain))
+
+def safe_relpath(relpath):
+    normalized = os.path.normpath(relpath).replace(os.sep, '/')
+    if normalized.startswith('/') or normalized == '..' or normalized.startswith('../'):
+        raise BackupChainError(f'Unsafe path in backup: {relpath}')
+    return normalized
+
+def restore_plan(chain):
+    """Map each upload of the final state to the newest archive holding it.
+
+    Returns (database_zipf, [(relpath, zipf), ...]).
+    """
+    tip_manifest, tip_zipf = chain[-1]
+    if DATABASE_ARCNAME not in tip_zipf.namelist():
+        raise BackupChainError('Database file not found in backup')
+
+    prefix = f'{UPLOADS_ARCNAME}/'
+    if tip_manifest is None:
+        relpaths = [name[len(prefix):] for name in tip_zipf.namelist() if name.startswith(prefix) and not name.endswith('/')]
+    else:
+        relpaths = sorted(tip_manifest['files'])
+
+    uploads = []
+    for relpath in relpaths:
+        for _, zipf in reversed(chain):
+            if f'{prefix}{relpath}' in zipf.NameToInfo:
+                uploads.append((safe_relpath(relpath), zipf))
+                break
+        else:
+            raise BackupChainError(f'No backup in the chain contains uploads/{relpath}')
+    return tip_zipf, uploads
+
+def stage_restore(archive_paths, database_target, uploads_target):
+    """Reconstruct database and uploads from a base plus incrementals.
+
+    Entries are copied one at a time straight from the archives. Returns
+    False when the backup carries no uploads tree, in which case the live
+    uploads should be left alone.
+    """
+    zipfs = [zipfile.ZipFile(path) for path in archive_paths]
+    try:
+        chain = order_chain([(read_archive_manifest(zipf), zipf) for zipf in zipfs])
+        database_zipf, uploads = restore_plan(chain)
+        with database_zipf.open(DATABASE_ARCNAME) as source, open(database_target, 'wb') as target:
+            shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+
+        # A manifest describes the whole tree, even when it is empty.
+        has_uploads = chain[-1][0] is not None or bool(uploads)
+        if has_uploads:
+            os.makedirs(uploads_target, exist_ok=True)
+        for relpath, zipf in uploads:
+            target_path = os.path.join(uploads_target, relpath)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            with zipf.open(f'{UPLOADS_ARCNAME}/{relpath}') as source, open(target_path, 'wb') as target:
+                shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+        return has_uploads
+    finally:
+        for zipf in zipfs:
+            zipf.close()
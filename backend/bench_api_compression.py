@@ -0,0 +1,96 @@
+"""Measure API response compression: bytes on the wire and CPU per request.
+
+Usage: python bench_api_compression.py [--sizes 50,500,2000] [--repeat N]
+
+Seeds a throwaway database with one vehicle holding N fuel and N service
+records, then requests the record lists (unpaginated, i.e. the whole
+history) and the streamed CSV export through a test client once per
+encoding. "cpu ms" is process time per request including the view itself,
+which is noisy next to the compression cost; "compress ms" times the
+compressor alone on the identity body at the configured level.
+"""
+import argparse
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from bench_support import add_vehicle, open_app, register
+
+ENCODINGS = ('identity', 'gzip', 'br')
+
+def seed(app, client, records):
+    from models import db, FuelRecord, ServiceRecord
+    import fuel_economy
+
+    vehicle_id = add_vehicle(client)
+
+    rng = random.Random(records)
+    categories = ['Oil Change', 'Tires', 'Brakes', 'Inspection', 'Filters']
+    with app.app_context():
+        for i in range(records):
+            day = date(2015, 1, 1) + timedelta(days=i * 3)
+            amount = round(rng.uniform(30, 50), 2)
+            price = round(rng.uniform(1.4, 2.1), 3)
+            db.session.add(FuelRecord(
+                vehicle_id=vehicle_id, date=day, odometer=(i + 1) * 550, fuel_amount=amount,
+                cost=round(amount * price, 2), unit_cost=price, unit='L/100KM',
+                notes='Full tank' if i % 4 == 0 else None
+            ))
+            db.session.add(ServiceRecord(
+                vehicle_id=vehicle_id, date=day, odometer=(i + 1) * 550, description=f'{categories[i % 5]} service',
+                category=categories[i % 5], cost=round(rng.uniform(40, 400), 2), notes='Dealer' if i % 3 == 0 else None
+            ))
+        db.session.flush()
+        fuel_economy.recompute_vehicle(vehicle_id)
+        db.session.commit()
+    return vehicle_id
+
+def measure(client, url, encoding, repeat):
+    headers = {'Accept-Encoding': encoding}
+    client.get(url, headers=headers)
+    started = time.process_time()
+    for _ in range(repeat):
+        response = client.get(url, headers=headers)
+        body = response.get_data()
+    cpu = (time.process_time() - started) / repeat
+    return len(body), cpu, response.headers.get('Content-Encoding', 'identity')
+
+def compress_time(body, encoding, config, repeat):
+    from compression import _Compressor
+
+    started = time.process_time()
+    for _ in range(repeat):
+        compressor = _Compressor(encoding, config)
+        compressor.compress(body)
+        compressor.finish()
+    return (time.process_time() - started) / repeat
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='50,500,2000')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = open_app(workdir)
+        client = app.test_client()
+        register(client)
+
+        print(f"{'records':>7} {'endpoint':<14} {'encoding':<9} {'bytes':>9} {'ratio':>6} {'cpu ms':>8} {'compress ms':>11}")
+        for size in (int(s) for s in args.sizes.split(',')):
+            vehicle_id = seed(app, client, size)
+            endpoints = (
+                ('fuel-records', f'/api/vehicles/{vehicle_id}/fuel-records'),
+                ('service', f'/api/vehicles/{vehicle_id}/service-records'),
+                ('fuel csv', f'/api/export/fuel_records?vehicle_id={vehicle_id}'),
+            )
+            for label, url in endpoints:
+                identity = client.get(url, headers={'Accept-Encoding': 'identity'}).get_data()
+                for encoding in ENCODINGS:
+                    size_bytes, cpu, served = measure(client, url, encoding, args.repeat)
+                    compress_ms = compress_time(identity, encoding, app.config, args.repeat) * 1000 if encoding != 'identity' else 0
+                    print(f'{size:>7} {label:<14} {served:<9} {size_bytes:>9} {len(identity) / size_bytes:>6.1f} '
+                          f'{cpu * 1000:>8.2f} {compress_ms:>11.2f}')
+
+if __name__ == '__main__':
+    main()
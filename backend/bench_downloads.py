@@ -0,0 +1,105 @@
+"""Slow large downloads against gunicorn, with and without proxy offload.
+
+Usage: python bench_downloads.py [--size-mb 64] [--rate-kb 1024] [--clients 2,4,8,16]
+
+Starts gunicorn like the entrypoint does (4 sync workers) on a throwaway
+database and uploads folder holding one large file. For each client count
+it opens that many downloads of the file, each read at --rate-kb KiB/s
+like a client on a slow link, and meanwhile requests /login once every
+100 ms. Reported per run: downloads that got their response headers
+within 2 s, and the latency of the /login probes (a probe that waits
+longer than 5 s counts as timed out).
+
+FILE_DELIVERY=x-accel is measured without nginx in front: the worker's
+part ends once it has sent the X-Accel-Redirect headers, which is what
+frees it; the bytes themselves would then come from nginx.
+"""
+import argparse
+import hashlib
+import os
+import socket
+import tempfile
+import threading
+import time
+from bench_support import database_env, gunicorn, percentile_ms, probe, run_python
+
+HEADERS_WITHIN = 2
+
+def make_file(uploads_dir, size_mb):
+    data = os.urandom(1024 * 1024)
+    digest = hashlib.sha256()
+    temp_path = os.path.join(uploads_dir, 'manual.tmp')
+    with open(temp_path, 'wb') as f:
+        for _ in range(size_mb):
+            digest.update(data)
+            f.write(data)
+    relpath = f'objects/{digest.hexdigest()[:2]}/{digest.hexdigest()[2:4]}/{digest.hexdigest()}.pdf'
+    os.makedirs(os.path.dirname(os.path.join(uploads_dir, relpath)), exist_ok=True)
+    os.replace(temp_path, os.path.join(uploads_dir, relpath))
+    return relpath
+
+def slow_download(port, path, rate, duration, results, index):
+    sock = socket.socket()
+    # A small receive buffer, so the server cannot park the whole file in it.
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 64 * 1024)
+    sock.connect(('127.0.0.1', port))
+    sock.sendall(f'GET /uploads/{path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n'.encode())
+    started = time.monotonic()
+    headers_at = None
+    received = 0
+    sock.settimeout(0.5)
+    while time.monotonic() - started < duration:
+        try:
+            chunk = sock.recv(16 * 1024)
+        except socket.timeout:
+            continue
+        if not chunk:
+            break
+        if headers_at is None:
+            headers_at = time.monotonic() - started
+        received += len(chunk)
+        ahead = received / rate - (time.monotonic() - started)
+        if ahead > 0:
+            time.sleep(ahead)
+    sock.close()
+    results[index] = headers_at
+
+def run(mode, clients, relpath, env, rate, duration):
+    with gunicorn(dict(env, FILE_DELIVERY=mode)) as port:
+        results = [None] * clients
+        threads = [
+            threading.Thread(target=slow_download, args=(port, relpath, rate, duration, results, index))
+            for index in range(clients)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.5)
+        latencies, timeouts = probe(port, '/login', duration - 1)
+        for thread in threads:
+            thread.join()
+
+    started = sum(1 for headers_at in results if headers_at is not None and headers_at <= HEADERS_WITHIN)
+    p50, worst = percentile_ms(latencies, 0.5), percentile_ms(latencies, 1)
+    label = mode or 'worker'
+    print(f'{label:>8} {clients:>8} {started:>11}/{clients:<3} {p50:>10.1f} {worst:>10.1f} {timeouts:>9}')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=64)
+    parser.add_argument('--rate-kb', type=int, default=1024)
+    parser.add_argument('--clients', default='2,4,8,16')
+    parser.add_argument('--duration', type=float, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = database_env(workdir)
+        run_python(env, 'from app import app; from models import db; app.app_context().push(); db.create_all()')
+        relpath = make_file(env['UPLOAD_FOLDER'], args.size_mb)
+
+        print(f"{'delivery':>8} {'clients':>8} {'headers<2s':>15} {'probe p50':>10} {'probe max':>10} {'timeouts':>9}")
+        for mode in ('', 'x-accel'):
+            for clients in (int(c) for c in args.clients.split(',')):
+                run(mode, clients, relpath, env, args.rate_kb * 1024, args.duration)
+
+if __name__ == '__main__':
+    main()
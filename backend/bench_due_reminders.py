@@ -0,0 +1,99 @@
+"""Due reminders across a fleet: the set-based query against a per-vehicle scan.
+
+Usage: python bench_due_reminders.py [--vehicles 200] [--reminders 50] [--repeat 20]
+
+Seeds a throwaway database with one user owning --vehicles vehicles, each
+with --reminders open reminders spread over the next few years and the
+next 100,000 distance units, so only a few are due at any time. "scan"
+is what a client had to do before /api/reminders/due: list each
+vehicle's open reminders and evaluate them itself. Also prints the query
+plan of the set-based query.
+"""
+import argparse
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from bench_support import USERNAME, EMAIL, open_app
+
+def seed(vehicles, reminders):
+    from models import db, User, Vehicle, Reminder
+
+    rng = random.Random(vehicles * reminders)
+    user = User(username=USERNAME, email=EMAIL, password_hash='-')
+    db.session.add(user)
+    db.session.flush()
+    today = date.today()
+    for index in range(vehicles):
+        odometer = rng.randint(10_000, 150_000)
+        vehicle = Vehicle(user_id=user.id, year=2015, make='Dacia', model=f'Logan {index}', odometer=odometer)
+        db.session.add(vehicle)
+        db.session.flush()
+        for _ in range(reminders):
+            by_date = rng.random() < 0.5
+            db.session.add(Reminder(
+                vehicle_id=vehicle.id, description='Service',
+                due_date=today + timedelta(days=rng.randint(-10, 1500)) if by_date else None,
+                due_odometer=None if by_date else odometer + rng.randint(-300, 100_000),
+                completed=rng.random() < 0.3
+            ))
+    db.session.commit()
+    return user.id
+
+def scan(user_id, today):
+    from models import Vehicle, Reminder
+    from sqlalchemy import false
+    import reminder_due
+
+    due = []
+    for vehicle in Vehicle.query.filter_by(user_id=user_id):
+        for reminder in Reminder.query.filter(Reminder.vehicle_id == vehicle.id, Reminder.completed == false()):
+            by_date = reminder.due_date is not None and reminder.due_date <= today + timedelta(days=reminder_due.UPCOMING_DAYS)
+            by_distance = reminder.due_odometer is not None and reminder.due_odometer <= vehicle.odometer + reminder_due.UPCOMING_DISTANCE
+            if by_date or by_distance:
+                due.append(reminder)
+    return due
+
+def timed(function, repeat):
+    from models import db
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+        db.session.expunge_all()
+    return (time.perf_counter() - started) / repeat, len(result)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vehicles', type=int, default=200)
+    parser.add_argument('--reminders', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = open_app(workdir)
+        from models import db
+        from sqlalchemy import event
+        import reminder_due
+
+        with app.app_context():
+            user_id = seed(args.vehicles, args.reminders)
+            today = date.today()
+
+            for label, function in (
+                ('scan', lambda: scan(user_id, today)),
+                ('set-based', lambda: reminder_due.due_reminders(user_id, today)),
+            ):
+                elapsed, found = timed(function, args.repeat)
+                print(f'{label:<10} {elapsed * 1000:>9.2f} ms  {found} reminders')
+
+            statements = []
+            event.listen(db.engine, 'before_cursor_execute', lambda conn, cursor, statement, parameters, *rest: statements.append((statement, parameters)))
+            reminder_due.due_reminders(user_id, today)
+            statement, parameters = statements[-1]
+            print('\nquery plan:')
+            for row in db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters):
+                print(' ', row[-1])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""A login flood against gunicorn, with and without password admission control.
+
+Usage: python bench_password_flood.py [--attackers 16] [--duration 8]
+
+Starts gunicorn like the entrypoint does (4 sync workers) on a throwaway
+database with one account. --attackers threads then send wrong passwords
+for that account as fast as they can, while a logged-in client requests
+/api/auth/me once every 100 ms. Reported per run: login responses by
+status, and the latency of the /api/auth/me probes.
+
+All attempts come from 127.0.0.1, so the runs are:
+  unlimited  PASSWORD_HASH_SLOTS=0, buckets off: the old behaviour
+  slots      the default hashing slots, buckets off, i.e. an attack
+             spread over more IPs and accounts than the buckets catch
+  default    slots and buckets as configured
+"""
+import argparse
+import collections
+import json
+import tempfile
+import threading
+import time
+from bench_support import USERNAME, PASSWORD, EMAIL, cookie_header, database_env, gunicorn, percentile_ms, probe, request, run_python
+
+PROBE_TIMEOUT = 10
+RUNS = (
+    ('unlimited', {'PASSWORD_HASH_SLOTS': '0', 'PASSWORD_IP_BURST': '0', 'PASSWORD_USER_BURST': '0'}),
+    ('slots', {'PASSWORD_IP_BURST': '0', 'PASSWORD_USER_BURST': '0'}),
+    ('default', {}),
+)
+
+def post(port, path, body, cookie=None):
+    headers = {'Content-Type': 'application/json'}
+    if cookie:
+        headers['Cookie'] = cookie
+    return request(port, 'POST', path, json.dumps(body), headers, timeout=PROBE_TIMEOUT)
+
+def attack(port, stop, statuses):
+    while not stop.is_set():
+        try:
+            statuses[post(port, '/api/auth/login', {'username': USERNAME, 'password': 'wrong'}).status] += 1
+        except OSError:
+            statuses['error'] += 1
+
+def run(label, overrides, env, attackers, duration):
+    with gunicorn(dict(env, **overrides)) as port:
+        cookie = cookie_header(post(port, '/api/auth/login', {'username': USERNAME, 'password': PASSWORD}))
+
+        stop = threading.Event()
+        statuses = collections.Counter()
+        threads = [threading.Thread(target=attack, args=(port, stop, statuses)) for _ in range(attackers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.5)
+        latencies, timeouts = probe(port, '/api/auth/me', duration, headers={'Cookie': cookie}, timeout=PROBE_TIMEOUT)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    p50, p95 = percentile_ms(latencies, 0.5), percentile_ms(latencies, 0.95)
+    logins = ' '.join(f'{status}:{count}' for status, count in sorted(statuses.items(), key=str))
+    print(f'{label:<10} {p50:>9.1f} {p95:>9.1f} {timeouts:>8}  {logins}')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--attackers', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = database_env(workdir)
+        run_python(env, (
+            'from app import app; from models import db, User; app.app_context().push(); db.create_all(); '
+            f'user = User(username={USERNAME!r}, email={EMAIL!r}, first_login=False); '
+            f'user.set_password({PASSWORD!r}); db.session.add(user); db.session.commit()'
+        ))
+
+        print(f"{'admission':<10} {'me p50':>9} {'me p95':>9} {'timeouts':>8}  logins by status")
+        for label, overrides in RUNS:
+            run(label, overrides, env, args.attackers, args.duration)
+
+if __name__ == '__main__':
+    main()
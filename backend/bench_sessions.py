@@ -0,0 +1,68 @@
+"""Session cost per request: Flask's cookie sessions against the server-side backends.
+
+Usage: python bench_sessions.py [--repeat 500] [--redis-url redis://...]
+
+Logs one user into a throwaway database and replays a browsing mix
+(pages, /api/auth/me, settings, the vehicle list) through a test client
+once per session backend. Reported per request: wall time, how many
+responses carried Set-Cookie, and the cookie bytes sent with each
+request and received in each response. Redis is measured only when
+--redis-url is given.
+"""
+import argparse
+import os
+import tempfile
+import time
+from bench_support import login, open_app, register
+
+MIX = ('/dashboard', '/api/auth/me', '/api/settings', '/vehicles', '/api/vehicles', '/api/auth/me')
+
+def measure(app, interface, repeat):
+    app.session_interface = interface
+    client = app.test_client()
+    login(client)
+    for url in MIX:
+        client.get(url)
+
+    requests = set_cookies = sent = received = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for url in MIX:
+            cookie = client.get_cookie('session')
+            sent += len(cookie.value) if cookie else 0
+            response = client.get(url)
+            response.get_data()
+            headers = response.headers.getlist('Set-Cookie')
+            set_cookies += bool(headers)
+            received += sum(len(header) for header in headers)
+            requests += 1
+    elapsed = (time.perf_counter() - started) / requests
+    return elapsed, set_cookies / requests, sent / requests, received / requests
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=500)
+    parser.add_argument('--redis-url')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = open_app(workdir)
+        from flask.sessions import SecureCookieSessionInterface
+        import server_sessions
+
+        register(app.test_client())
+
+        backends = [
+            ('cookie', SecureCookieSessionInterface()),
+            ('sqlite', server_sessions.ServerSessionInterface(server_sessions.SQLiteStore(os.path.join(workdir, 'sessions.db')))),
+        ]
+        if args.redis_url:
+            backends.append(('redis', server_sessions.ServerSessionInterface(server_sessions.RedisStore(args.redis_url))))
+
+        print(f"{'backend':<8} {'ms/request':>10} {'set-cookie':>10} {'cookie sent':>11} {'set-cookie bytes':>16}")
+        for label, interface in backends:
+            elapsed, set_cookie, sent, received = measure(app, interface, args.repeat)
+            print(f'{label:<8} {elapsed * 1000:>10.3f} {set_cookie:>10.1%} {sent:>11.0f} {received:>16.0f}')
+
+if __name__ == '__main__':
+    main()
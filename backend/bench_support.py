@@ -0,0 +1,127 @@
+"""Scaffolding shared by the bench_*.py and load_test_*.py scripts and by tests/.
+
+Everything runs against a throwaway database in a directory the caller
+owns (usually a tempfile.TemporaryDirectory). In-process scripts call
+open_app() before anything imports app, then drive a test client; the
+others start gunicorn the way the entrypoint does and talk HTTP to it.
+"""
+import contextlib
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import time
+
+USERNAME = 'benchmark'
+PASSWORD = 'Benchmark123!'
+EMAIL = 'benchmark@example.com'
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+PROBE_INTERVAL = 0.1
+PROBE_TIMEOUT = 5
+
+def database_env(workdir, **overrides):
+    """Environment for the app with its database, sessions and uploads inside workdir."""
+    uploads_dir = os.path.join(workdir, 'uploads')
+    os.makedirs(uploads_dir, exist_ok=True)
+    env = dict(os.environ, DATABASE_PATH=os.path.join(workdir, 'bench.db'), UPLOAD_FOLDER=uploads_dir)
+    env.update(overrides)
+    return env
+
+def open_app(workdir, **overrides):
+    """Import the app against a fresh database in workdir; returns it with its tables created.
+
+    Must run before anything else in the process imports app, which reads
+    its configuration once.
+    """
+    os.environ.update(database_env(workdir, **overrides))
+    from app import app
+    from models import db
+
+    with app.app_context():
+        db.create_all()
+    return app
+
+def login(client, username=USERNAME, password=PASSWORD):
+    response = client.post('/api/auth/login', json={'username': username, 'password': password})
+    if response.status_code != 200:
+        raise RuntimeError(f'login failed: {response.get_json()}')
+    return response
+
+def register(client, username=USERNAME, password=PASSWORD, email=EMAIL):
+    """Register an account and log the client in as it."""
+    client.post('/api/auth/register', json={'username': username, 'email': email, 'password': password})
+    return login(client, username, password)
+
+def add_vehicle(client, **fields):
+    vehicle = dict({'year': 2015, 'make': 'Dacia', 'model': 'Logan', 'odometer': 0}, **fields)
+    return client.post('/api/vehicles', json=vehicle).get_json()['id']
+
+def run_python(env, code):
+    """Run code in a fresh interpreter in the backend directory, e.g. to seed a database for gunicorn."""
+    subprocess.run([sys.executable, '-c', code], cwd=BACKEND_DIR, env=env, check=True)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def request(port, method, path, body=None, headers=None, timeout=PROBE_TIMEOUT):
+    """One request on a fresh connection; returns the response with its body read."""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        connection.request(method, path, body, headers or {})
+        response = connection.getresponse()
+        response.body = response.read()
+        return response
+    finally:
+        connection.close()
+
+def cookie_header(response):
+    """The Cookie header a browser would send back after response."""
+    return '; '.join(value.split(';')[0] for key, value in response.getheaders() if key.lower() == 'set-cookie')
+
+def wait_until_up(port, path='/login'):
+    for _ in range(100):
+        try:
+            request(port, 'GET', path, timeout=1)
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('gunicorn did not start')
+
+@contextlib.contextmanager
+def gunicorn(env, workers=4):
+    """Run gunicorn with the entrypoint's worker settings; yields its port."""
+    port = free_port()
+    server = subprocess.Popen(
+        ['gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--timeout', '120', 'app:app'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_until_up(port)
+        yield port
+    finally:
+        server.terminate()
+        server.wait()
+
+def probe(port, path, duration, headers=None, timeout=PROBE_TIMEOUT, interval=PROBE_INTERVAL):
+    """GET path every interval for duration seconds; returns (latencies, timeouts)."""
+    latencies, timeouts = [], 0
+    stop_at = time.monotonic() + duration
+    while time.monotonic() < stop_at:
+        started = time.monotonic()
+        try:
+            request(port, 'GET', path, headers=headers, timeout=timeout)
+            latencies.append(time.monotonic() - started)
+        except OSError:
+            timeouts += 1
+        time.sleep(interval)
+    return latencies, timeouts
+
+def percentile_ms(latencies, fraction):
+    """Nearest-rank percentile of latencies in seconds, in milliseconds; nan if there are none."""
+    if not latencies:
+        return float('nan')
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000
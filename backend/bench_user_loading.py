@@ -0,0 +1,56 @@
+"""Per-request cost of loading current_user, with and without the identity cache.
+
+Usage: python bench_user_loading.py [--repeat 2000]
+
+Logs one user into a throwaway database and times cheap authenticated
+requests through a test client, where loading the user is a large share
+of the work: a page route, /api/auth/me, and conditional GETs answered
+with 304. "off" is IDENTITY_CACHE_SIZE=0, i.e. a User row fetch per
+request as before the cache existed. Reported per request: wall time and
+SQL statements executed.
+"""
+import argparse
+import tempfile
+import time
+from bench_support import add_vehicle, open_app, register
+
+def measure(client, url, headers, repeat, statements):
+    client.get(url, headers=headers)
+    statements.clear()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        response = client.get(url, headers=headers)
+        response.get_data()
+    elapsed = (time.perf_counter() - started) / repeat
+    return response.status_code, elapsed, len(statements) / repeat
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = open_app(workdir)
+        from models import db
+        from sqlalchemy import event
+        import identity
+
+        statements = []
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+        client = app.test_client()
+        register(client)
+        vehicle_id = add_vehicle(client)
+
+        endpoints = [('page', '/dashboard', False), ('me', '/api/auth/me', False), ('settings 304', '/api/settings', True),
+                     ('fuel 304', f'/api/vehicles/{vehicle_id}/fuel-records', True)]
+        print(f"{'endpoint':<13} {'cache':<5} {'status':>6} {'ms/request':>10} {'queries':>8}")
+        for label, url, conditional in endpoints:
+            headers = {'If-None-Match': client.get(url).headers['ETag']} if conditional else {}
+            for cache, size in (('off', 0), ('on', app.config['IDENTITY_CACHE_SIZE'])):
+                identity.cache.configure(size, app.config['IDENTITY_CACHE_TTL'])
+                status, elapsed, queries = measure(client, url, headers, args.repeat, statements)
+                print(f'{label:<13} {cache:<5} {status:>6} {elapsed * 1000:>10.3f} {queries:>8.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Compare the pandas and write-only XLSX exports of a full vehicle.
+
+Usage: python bench_xlsx_export.py [ROWS ...]   (default: 10000 100000 1000000)
+
+Each run happens in a fresh interpreter against a throwaway SQLite database
+so that ru_maxrss reflects only that export. Rows are split evenly between
+service and fuel records.
+"""
+import os
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+def seed(db_path, rows):
+    from models import db
+    from sqlalchemy import create_engine
+    db.metadata.create_all(create_engine(f'sqlite:///{db_path}'))
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO user (id, username, email, password_hash) VALUES (1, 'bench', 'bench@example.com', 'x')")
+    conn.execute("INSERT INTO vehicle (id, user_id, year, make, model, odometer, status) VALUES (1, 1, 2015, 'Dacia', 'Logan', 0, 'active')")
+    start = date(2000, 1, 1)
+    half = rows // 2
+    conn.executemany(
+        "INSERT INTO service_record (vehicle_id, date, odometer, description, cost, category, notes) VALUES (1, ?, ?, ?, ?, ?, ?)",
+        ((str(start + timedelta(days=i % 9000)), i * 10, f'Service {i}', 120.5, 'Maintenance', 'Oil and filters') for i in range(half))
+    )
+    conn.executemany(
+        "INSERT INTO fuel_record (vehicle_id, date, odometer, fuel_amount, cost, unit_cost, distance, fuel_economy, unit) VALUES (1, ?, ?, 42.5, 80.0, 1.88, 600, 7.1, 'L/100KM')",
+        ((str(start + timedelta(days=i % 9000)), i * 600) for i in range(rows - half))
+    )
+    conn.commit()
+    conn.close()
+
+def legacy_export(vehicle):
+    # The pandas implementation export_all_vehicle_data() used before.
+    import io
+    import pandas as pd
+    from models import ServiceRecord, FuelRecord, Reminder, Todo
+
+    service_records = ServiceRecord.query.filter_by(vehicle_id=vehicle.id).order_by(ServiceRecord.date.desc()).all()
+    fuel_records = FuelRecord.query.filter_by(vehicle_id=vehicle.id).order_by(FuelRecord.date.desc()).all()
+    reminders = Reminder.query.filter_by(vehicle_id=vehicle.id).all()
+    todos = Todo.query.filter_by(vehicle_id=vehicle.id).all()
+
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        pd.DataFrame([{'Year': vehicle.year, 'Make': vehicle.make, 'Model': vehicle.model}]).to_excel(writer, sheet_name='Vehicle Info', index=False)
+        if service_records:
+            pd.DataFrame([{
+                'Date': r.date.strftime('%Y-%m-%d'), 'Odometer': r.odometer, 'Description': r.description,
+                'Category': r.category or '', 'Cost': r.cost, 'Notes': r.notes or '', 'Document': r.document_path or ''
+            } for r in service_records]).to_excel(writer, sheet_name='Service Records', index=False)
+        if fuel_records:
+            pd.DataFrame([{
+                'Date': r.date.strftime('%Y-%m-%d'), 'Odometer': r.odometer, 'Fuel Amount': r.fuel_amount, 'Unit': r.unit,
+                'Cost': r.cost, 'Unit Cost': r.unit_cost or 0, 'Distance': r.distance or 0,
+                'Fuel Economy': r.fuel_economy or 0, 'Notes': r.notes or ''
+            } for r in fuel_records]).to_excel(writer, sheet_name='Fuel Records', index=False)
+        if reminders:
+            pd.DataFrame([{'Description': r.description} for r in reminders]).to_excel(writer, sheet_name='Reminders', index=False)
+        if todos:
+            pd.DataFrame([{'Description': t.description} for t in todos]).to_excel(writer, sheet_name='Todos', index=False)
+    output.seek(0)
+    return output
+
+def child(mode, db_path):
+    os.environ['DATABASE_PATH'] = db_path
+    from app import app
+    from models import Vehicle
+    import exports
+
+    with app.app_context():
+        vehicle = Vehicle.query.get(1)
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        output = legacy_export(vehicle) if mode == 'pandas' else exports.vehicle_xlsx_file(vehicle)
+        elapsed = time.perf_counter() - started
+        size = output.seek(0, os.SEEK_END)
+        output.close()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f'{elapsed:.2f} {baseline} {peak} {size}')
+
+def main(row_counts):
+    print(f"{'rows':>9} {'mode':>10} {'wall s':>8} {'peak RSS MiB':>13} {'growth MiB':>11} {'file MiB':>9}")
+    for rows in row_counts:
+        with tempfile.TemporaryDirectory() as workdir:
+            db_path = os.path.join(workdir, 'bench.db')
+            seed(db_path, rows)
+            for mode in ('pandas', 'write-only'):
+                result = subprocess.run(
+                    [sys.executable, __file__, '--child', mode, db_path],
+                    capture_output=True, text=True, check=True
+                )
+                elapsed, baseline, peak, size = result.stdout.split()[-4:]
+                print(f'{rows:>9} {mode:>10} {float(elapsed):>8.2f} {int(peak) / 1024:>13.1f} '
+                      f'{(int(peak) - int(baseline)) / 1024:>11.1f} {int(size) / 2**20:>9.1f}')
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(sys.argv[2], sys.argv[3])
+    else:
+        main([int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000])
@@ -0,0 +1,5 @@
+from static_assets import build, BUILD_DIR
+
+if __name__ == '__main__':
+    manifest = build()
+    print(f"Built {len(manifest)} fingerprinted assets into {BUILD_DIR}")
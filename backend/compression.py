@@ -0,0 +1,89 @@
+from flask import request
+import brotli
+import zlib
+
+# Negotiated gzip/brotli for /api/ responses. Buffered bodies under
+# COMPRESS_MIN_SIZE are left alone; streamed bodies (CSV exports) are
+# compressed chunk by chunk as they are produced.
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/csv', 'text/plain', 'text/html'}
+# Preference order when the client accepts both with the same quality.
+ENCODINGS = ('br', 'gzip')
+
+class _Compressor:
+    def __init__(self, encoding, config):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=config['COMPRESS_BROTLI_QUALITY'])
+        else:
+            self._zlib = zlib.compressobj(config['COMPRESS_GZIP_LEVEL'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def flush(self):
+        # Emits everything compressed so far, so a streamed chunk is not
+        # held back until the compressor's window fills.
+        if self.encoding == 'br':
+            return self._brotli.flush()
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+def choose_encoding():
+    accepted = request.accept_encodings
+    candidates = [(accepted[name], -index, name) for index, name in enumerate(ENCODINGS) if accepted[name] > 0]
+    return max(candidates)[2] if candidates else None
+
+def _compress_stream(chunks, compressor):
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+def compress_response(response, config):
+    if not request.path.startswith('/api/') or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+
+    # send_file() responses advertise byte ranges over the identity body.
+    if response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, _Compressor(encoding, config))
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_SIZE']:
+            return response
+        compressor = _Compressor(encoding, config)
+        response.set_data(compressor.compress(data) + compressor.finish())
+
+    response.headers['Content-Encoding'] = encoding
+    # The bytes differ per encoding, so a strong ETag no longer identifies
+    # them; If-None-Match uses weak comparison and still matches.
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def init_app(app):
+    @app.after_request
+    def compress(response):
+        return compress_response(response, app.config)
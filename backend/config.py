@@ -6,12 +6,55 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY', 'masina-dock-super-secret-key-change-in-production-12345')
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or f'sqlite:///{os.environ.get("DATABASE_PATH", "/app/data/masina_dock.db")}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # A symlink into the uploads volume that a restore swaps; see restore.py.
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', '/app/uploads/current')
     SESSION_COOKIE_SECURE = os.environ.get('SESSION_COOKIE_SECURE', 'False').lower() == 'true'
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
     PERMANENT_SESSION_LIFETIME = timedelta(hours=12)
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
     
+    # Sessions (see server_sessions.py): 'sqlite', 'redis' or 'cookie'. The
+    # SQLite file defaults to sessions.db next to the database; the expiry
+    # of an unchanged session is slid forward at most once per interval
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'sqlite').lower()
+    SESSION_DATABASE_PATH = os.environ.get('SESSION_DATABASE_PATH')
+    SESSION_REDIS_URL = os.environ.get('SESSION_REDIS_URL', 'redis://localhost:6379/0')
+    SESSION_REFRESH_INTERVAL = int(os.environ.get('SESSION_REFRESH_INTERVAL', 900))
+    
+    # API response compression (see compression.py)
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+    
+    # Upload delivery (see file_delivery.py): '', 'x-accel' or 'x-sendfile'
+    FILE_DELIVERY = os.environ.get('FILE_DELIVERY', '').lower()
+    X_ACCEL_PREFIX = os.environ.get('X_ACCEL_PREFIX', '/protected-uploads/')
+    
+    # Background jobs (see jobs.py): threads per job_worker.py process, and
+    # threads each web worker starts for itself (0 = leave it to job_worker.py)
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_WORKERS_IN_PROCESS = int(os.environ.get('JOB_WORKERS_IN_PROCESS', 0))
+    
+    # Users loaded per request are cached per worker (see identity.py);
+    # size 0 turns the cache off
+    IDENTITY_CACHE_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE', 1024))
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', 60))
+    
+    # Password and 2FA checks (see password_admission.py): hashes running at
+    # once across all workers (0 = no limit), seconds a request may wait for
+    # one, and attempt buckets per client IP and per username (burst 0 = off)
+    PASSWORD_HASH_SLOTS = int(os.environ.get('PASSWORD_HASH_SLOTS', max(1, (os.cpu_count() or 2) // 2)))
+    PASSWORD_HASH_WAIT = float(os.environ.get('PASSWORD_HASH_WAIT', 3))
+    PASSWORD_IP_BURST = int(os.environ.get('PASSWORD_IP_BURST', 20))
+    PASSWORD_IP_PER_MINUTE = float(os.environ.get('PASSWORD_IP_PER_MINUTE', 10))
+    PASSWORD_USER_BURST = int(os.environ.get('PASSWORD_USER_BURST', 10))
+    PASSWORD_USER_PER_MINUTE = float(os.environ.get('PASSWORD_USER_PER_MINUTE', 5))
+    
+    # Reverse proxies in front of the app whose X-Forwarded-For/-Proto are
+    # trusted; behind nginx set 1, or every client shares the proxy's address
+    TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+    
     DISABLE_SIGNUPS = os.environ.get('DISABLE_SIGNUPS', 'False').lower() == 'true'
     
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
@@ -0,0 +1,68 @@
+from models import db, User, Vehicle, VehicleStats
+from flask import request
+from flask_login import current_user
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+import restore
+import hashlib
+
+# Every flush bumps the version of each vehicle and user whose data it
+# touches, in the same transaction. Read endpoints derive their ETag from
+# the version, so a conditional GET is answered without loading any rows.
+# VehicleStats is derived from the vehicle's records, whose own writes bump
+# the version; a summary request that builds missing stats on the fly must
+# not invalidate the ETag it is about to send. Code that rebuilds stats
+# which may have drifted bumps explicitly.
+
+def _touched(session):
+    vehicle_ids, user_ids = set(), set()
+    for obj in list(session.new) + list(session.deleted) + [o for o in session.dirty if session.is_modified(o)]:
+        if isinstance(obj, VehicleStats):
+            continue
+        if isinstance(obj, User):
+            user_ids.add(obj.id)
+        elif isinstance(obj, Vehicle):
+            vehicle_ids.add(obj.id)
+            user_ids.add(obj.user_id)
+        elif getattr(obj, 'vehicle_id', None) is not None:
+            vehicle_ids.add(obj.vehicle_id)
+    vehicle_ids.discard(None)
+    user_ids.discard(None)
+    return vehicle_ids, user_ids
+
+@event.listens_for(Session, 'before_flush')
+def bump_versions(session, flush_context, instances):
+    bump(session, *_touched(session))
+
+def bump(session, vehicle_ids=(), user_ids=()):
+    """Bump versions explicitly, for writes that bypass the ORM unit of work."""
+    if not vehicle_ids and not user_ids:
+        return
+    connection = session.connection()
+    if vehicle_ids:
+        connection.execute(
+            update(Vehicle.__table__)
+            .where(Vehicle.__table__.c.id.in_(vehicle_ids))
+            .values(data_version=Vehicle.__table__.c.data_version + 1)
+        )
+    if user_ids:
+        connection.execute(
+            update(User.__table__)
+            .where(User.__table__.c.id.in_(user_ids))
+            .values(data_version=User.__table__.c.data_version + 1)
+        )
+
+def vehicle_version(vehicle_id):
+    """The vehicle's data version, or None if it is not the current user's."""
+    return db.session.query(Vehicle.data_version).filter_by(id=vehicle_id, user_id=current_user.id).scalar()
+
+def user_version():
+    # Not read from current_user, which may come from the identity cache.
+    return db.session.query(User.data_version).filter_by(id=current_user.id).scalar()
+
+def etag(scope, version):
+    # Query arguments (cursor, limit, ...) change the body, so they are part
+    # of the tag; so is the user, in case two accounts share a browser cache.
+    # A restore can bring back lower versions, hence the restore generation.
+    key = f'{scope}:{current_user.id}:{version}:{restore.current_generation()}:{request.full_path}'
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
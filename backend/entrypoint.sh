@@ -4,16 +4,35 @@ set -e
 echo "Starting Masina-Dock initialization..."
 
 # Create directories
-mkdir -p /app/data /app/uploads/attachments
+mkdir -p /app/data /app/uploads
 
 # Set permissions so database can be written
 chmod -R 777 /app/data /app/uploads
 
-# Initialize database
+# Initialize database, and move the uploads into the layout restores
+# expect (see restore.ensure_uploads_tree)
 echo "Initializing database..."
 cd /app/backend
 python init_db.py
 
+# Fingerprint and precompress static assets
+echo "Building static assets..."
+python build_assets.py
+
+# Recount upload references. Deleting files nothing refers to any more is
+# opt-in (MAINTAIN_UPLOADS_GC=1): after a restore from an older backup the
+# store can hold files the database has lost track of.
+echo "Checking upload store..."
+if [ "${MAINTAIN_UPLOADS_GC:-0}" = "1" ]; then
+    python maintain_uploads.py --collect-garbage
+else
+    python maintain_uploads.py
+fi
+
+# Resize photos uploaded before variants existed (only those missing them)
+echo "Generating photo variants..."
+python backfill_photo_variants.py
+
 # Set database file permissions
 if [ -f /app/data/masina_dock.db ]; then
     chmod 666 /app/data/masina_dock.db
@@ -22,6 +41,30 @@ else
     echo "Warning: Database file not found after initialization"
 fi
 
-# Start application
+# Background jobs (photo variants, pruning) run in their own process next
+# to gunicorn. If either process exits, the other is stopped and the
+# container exits with its status, so the restart policy brings both back
+# instead of gunicorn serving while jobs queue up.
+echo "Starting job worker..."
+python job_worker.py &
+worker_pid=$!
+
 echo "Starting Gunicorn server..."
-exec gunicorn --reload --bind 0.0.0.0:5000 --workers 4 --timeout 120 --access-logfile - --error-logfile - app:app
+gunicorn --reload --bind 0.0.0.0:5000 --workers 4 --timeout 120 --access-logfile - --error-logfile - app:app &
+gunicorn_pid=$!
+
+stopping=0
+trap 'stopping=1; kill -TERM $worker_pid $gunicorn_pid 2>/dev/null' TERM INT
+set +e
+wait -n $worker_pid $gunicorn_pid
+status=$?
+if [ $stopping = 1 ]; then
+    status=0
+elif ! kill -0 $worker_pid 2>/dev/null; then
+    echo "Job worker exited with status $status, stopping"
+elif ! kill -0 $gunicorn_pid 2>/dev/null; then
+    echo "Gunicorn exited with status $status, stopping"
+fi
+kill -TERM $worker_pid $gunicorn_pid 2>/dev/null
+wait
+exit $status
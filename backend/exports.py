@@ -0,0 +1,153 @@
+from models import db, ServiceRecord, FuelRecord, Reminder, Todo
+from sqlalchemy import select
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+import csv
+import io
+import tempfile
+
+EXPORT_BATCH_SIZE = 1000
+
+# Column layout of /api/export/<data_type>, in file order.
+CSV_LAYOUTS = {
+    'service_records': (ServiceRecord, [
+        ('Date', ServiceRecord.date),
+        ('Odometer', ServiceRecord.odometer),
+        ('Description', ServiceRecord.description),
+        ('Cost', ServiceRecord.cost),
+        ('Category', ServiceRecord.category),
+        ('Notes', ServiceRecord.notes),
+    ]),
+    'fuel_records': (FuelRecord, [
+        ('Date', FuelRecord.date),
+        ('Odometer', FuelRecord.odometer),
+        ('Fuel Amount', FuelRecord.fuel_amount),
+        ('Cost', FuelRecord.cost),
+        ('Fuel Economy', FuelRecord.fuel_economy),
+        ('Unit', FuelRecord.unit),
+    ]),
+}
+
+def _date(value):
+    return value.strftime('%Y-%m-%d') if value else ''
+
+def _text(value):
+    return value or ''
+
+def _zero(value):
+    return value or 0
+
+# Sheets of /api/vehicles/<id>/export-all after "Vehicle Info":
+# (sheet, model, ordering, [(header, column, formatter)]).
+XLSX_SHEETS = [
+    ('Service Records', ServiceRecord, (ServiceRecord.date.desc(), ServiceRecord.id.desc()), [
+        ('Date', ServiceRecord.date, _date),
+        ('Odometer', ServiceRecord.odometer, None),
+        ('Description', ServiceRecord.description, None),
+        ('Category', ServiceRecord.category, _text),
+        ('Cost', ServiceRecord.cost, None),
+        ('Notes', ServiceRecord.notes, _text),
+        ('Document', ServiceRecord.document_path, _text),
+    ]),
+    ('Fuel Records', FuelRecord, (FuelRecord.date.desc(), FuelRecord.id.desc()), [
+        ('Date', FuelRecord.date, _date),
+        ('Odometer', FuelRecord.odometer, None),
+        ('Fuel Amount', FuelRecord.fuel_amount, None),
+        ('Unit', FuelRecord.unit, None),
+        ('Cost', FuelRecord.cost, None),
+        ('Unit Cost', FuelRecord.unit_cost, _zero),
+        ('Distance', FuelRecord.distance, _zero),
+        ('Fuel Economy', FuelRecord.fuel_economy, _zero),
+        ('Notes', FuelRecord.notes, _text),
+    ]),
+    ('Reminders', Reminder, (Reminder.id,), [
+        ('Description', Reminder.description, None),
+        ('Urgency', Reminder.urgency, None),
+        ('Due Date', Reminder.due_date, _date),
+        ('Due Odometer', Reminder.due_odometer, _text),
+        ('Recurring', Reminder.recurring, None),
+        ('Interval Type', Reminder.interval_type, _text),
+        ('Interval Value', Reminder.interval_value, _text),
+        ('Notes', Reminder.notes, _text),
+        ('Completed', Reminder.completed, None),
+    ]),
+    ('Todos', Todo, (Todo.id,), [
+        ('Description', Todo.description, None),
+        ('Type', Todo.type, _text),
+        ('Priority', Todo.priority, None),
+        ('Status', Todo.status, None),
+        ('Cost', Todo.cost, None),
+        ('Notes', Todo.notes, _text),
+    ]),
+]
+
+def batched_rows(statement, batch_size=EXPORT_BATCH_SIZE):
+    """Yield lists of result rows without materialising the whole result."""
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        yield partition
+
+def iter_csv(data_type, vehicle_id):
+    """Encode an export as CSV, one chunk per database batch."""
+    model, layout = CSV_LAYOUTS[data_type]
+    statement = select(*[column for _, column in layout]).where(model.vehicle_id == vehicle_id).order_by(model.id)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow([header for header, _ in layout])
+    yield buffer.getvalue().encode('utf-8')
+
+    for rows in batched_rows(statement):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+
+def _header_row(sheet, headers):
+    cells = []
+    for header in headers:
+        cell = WriteOnlyCell(sheet, value=header)
+        cell.font = Font(bold=True)
+        cells.append(cell)
+    return cells
+
+def write_vehicle_xlsx(vehicle, fileobj):
+    """Write the full vehicle workbook to fileobj.
+
+    Uses openpyxl's write-only mode, which streams rows to disk instead of
+    keeping a cell object per value, fed batch by batch from the database.
+    Sheets without rows are left out, as before.
+    """
+    workbook = Workbook(write_only=True)
+
+    info = workbook.create_sheet('Vehicle Info')
+    info.append(_header_row(info, ['Year', 'Make', 'Model', 'VIN', 'License Plate', 'Current Odometer', 'Status', 'Photo URL']))
+    info.append([
+        vehicle.year, vehicle.make, vehicle.model, vehicle.vin or '', vehicle.license_plate or '',
+        vehicle.odometer, vehicle.status, vehicle.photo or ''
+    ])
+
+    for title, model, ordering, layout in XLSX_SHEETS:
+        statement = select(*[column for _, column, _ in layout]).where(model.vehicle_id == vehicle.id).order_by(*ordering)
+        formatters = [formatter for _, _, formatter in layout]
+        sheet = None
+        for rows in batched_rows(statement):
+            if sheet is None:
+                sheet = workbook.create_sheet(title)
+                sheet.append(_header_row(sheet, [header for header, _, _ in layout]))
+            for row in rows:
+                sheet.append([formatter(value) if formatter else value for formatter, value in zip(formatters, row)])
+
+    workbook.save(fileobj)
+
+def vehicle_xlsx_file(vehicle):
+    """Return a rewound temporary file holding the vehicle workbook."""
+    spool = tempfile.TemporaryFile()
+    try:
+        write_vehicle_xlsx(vehicle, spool)
+        spool.seek(0)
+    except Exception:
+        spool.close()
+        raise
+    return spool
@@ -0,0 +1,179 @@
+from flask import abort, current_app, request, send_file
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file as werkzeug_send_file
+from urllib.parse import quote
+import mimetypes
+import os
+import secrets
+
+# FILE_DELIVERY decides who sends upload bytes: '' streams them from the
+# worker, 'x-accel' hands the file to nginx (X-Accel-Redirect, an internal
+# location aliased to the uploads folder) and 'x-sendfile' to Apache or
+# lighttpd. The proxy then handles Range and conditional requests itself.
+
+PROXY_MODES = ('x-accel', 'x-sendfile')
+# More ranges than this in one request are answered with the whole file;
+# many tiny ranges cost more in part headers than they save.
+MAX_RANGES = 16
+CHUNK_SIZE = 64 * 1024
+
+def _proxy_response(full_path, relpath, mimetype, as_attachment):
+    # Werkzeug's X-Sendfile mode builds the headers (type, length,
+    # disposition, ETag, Last-Modified) without opening the file.
+    response = werkzeug_send_file(
+        full_path, request.environ, mimetype=mimetype, as_attachment=as_attachment,
+        use_x_sendfile=True, response_class=current_app.response_class, conditional=False
+    )
+    if current_app.config['FILE_DELIVERY'] == 'x-accel':
+        del response.headers['X-Sendfile']
+        response.headers['X-Accel-Redirect'] = current_app.config['X_ACCEL_PREFIX'].rstrip('/') + '/' + quote(relpath)
+    # The body is the proxy's business; keeps after_request hooks off it.
+    response.direct_passthrough = True
+    return response
+
+def parse_ranges(header):
+    """Parse a bytes Range header into (start, stop) pairs, stop exclusive.
+
+    Suffix ranges come back as (-length, None). Returns None for anything
+    malformed, which the caller treats as no Range header at all; unlike
+    Werkzeug's parser, overlapping and unordered ranges are accepted.
+    """
+    units, _, spec = header.partition('=')
+    if units.strip().lower() != 'bytes':
+        return None
+    ranges = []
+    for item in spec.split(','):
+        first, dash, last = item.strip().partition('-')
+        if not dash:
+            return None
+        try:
+            if not first:
+                suffix = int(last)
+                if suffix <= 0:
+                    return None
+                ranges.append((-suffix, None))
+            else:
+                start = int(first)
+                stop = int(last) + 1 if last else None
+                if start < 0 or (stop is not None and stop <= start):
+                    return None
+                ranges.append((start, stop))
+        except ValueError:
+            return None
+    return ranges or None
+
+def _resolve_ranges(ranges, length):
+    resolved = []
+    for start, stop in ranges:
+        if start < 0:
+            start, stop = max(0, length + start), length
+        else:
+            stop = length if stop is None else min(stop, length)
+        if start < stop:
+            resolved.append([start, stop])
+
+    # Overlapping or adjacent ranges are sent as one part.
+    resolved.sort()
+    merged = []
+    for start, stop in resolved:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], stop)
+        else:
+            merged.append([start, stop])
+    return merged
+
+def _if_range_matches(response):
+    if_range = request.if_range
+    if if_range.etag is not None:
+        etag, weak = response.get_etag()
+        return not weak and etag == if_range.etag
+    if if_range.date is not None:
+        return response.last_modified is not None and response.last_modified <= if_range.date
+    return True
+
+def _iter_file(f, start, stop):
+    f.seek(start)
+    remaining = stop - start
+    while remaining:
+        chunk = f.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            return
+        remaining -= len(chunk)
+        yield chunk
+
+def _iter_parts(full_path, parts, boundary):
+    with open(full_path, 'rb') as f:
+        for (start, stop), header in parts:
+            yield header
+            yield from _iter_file(f, start, stop)
+            yield b'\r\n'
+        yield f'--{boundary}--\r\n'.encode()
+
+def _iter_range(full_path, start, stop):
+    with open(full_path, 'rb') as f:
+        yield from _iter_file(f, start, stop)
+
+def _send_ranges(response, full_path, ranges):
+    """Turn a full-file response into a 206 with one part or a multipart/byteranges body."""
+    length = os.path.getsize(full_path)
+    merged = _resolve_ranges(ranges, length)
+    response.close()
+    response.direct_passthrough = False
+
+    if not merged:
+        response.response = []
+        response.status_code = 416
+        response.headers['Content-Range'] = f'bytes */{length}'
+        response.content_length = 0
+        return response
+
+    response.status_code = 206
+    if len(merged) == 1:
+        start, stop = merged[0]
+        response.response = _iter_range(full_path, start, stop)
+        response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{length}'
+        response.content_length = stop - start
+        return response
+
+    boundary = secrets.token_hex(16)
+    content_type = response.headers['Content-Type']
+    parts = [
+        ((start, stop), (
+            f'--{boundary}\r\nContent-Type: {content_type}\r\n'
+            f'Content-Range: bytes {start}-{stop - 1}/{length}\r\n\r\n'
+        ).encode())
+        for start, stop in merged
+    ]
+    response.response = _iter_parts(full_path, parts, boundary)
+    response.headers['Content-Type'] = f'multipart/byteranges; boundary={boundary}'
+    response.content_length = sum(stop - start + len(header) + 2 for (start, stop), header in parts) + len(boundary) + 6
+    return response
+
+def _send_in_process(full_path, mimetype, as_attachment):
+    response = send_file(full_path, mimetype=mimetype, as_attachment=as_attachment, conditional=False)
+    response.headers['Accept-Ranges'] = 'bytes'
+    # 304 / 412 from If-None-Match, If-Modified-Since and friends; ranges
+    # are handled below, since Werkzeug only serves a single one.
+    response.make_conditional(request.environ)
+
+    header = request.headers.get('Range')
+    ranges = parse_ranges(header) if header else None
+    if response.status_code != 200 or ranges is None or len(ranges) > MAX_RANGES or not _if_range_matches(response):
+        return response
+    return _send_ranges(response, full_path, ranges)
+
+def send_upload(relpath, as_attachment=False, cache_control=None):
+    """Send a file from the uploads folder, or have the front proxy send it."""
+    full_path = safe_join(current_app.config['UPLOAD_FOLDER'], relpath)
+    if full_path is None or not os.path.isfile(full_path):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    if current_app.config['FILE_DELIVERY'] in PROXY_MODES:
+        response = _proxy_response(full_path, relpath, mimetype, as_attachment)
+    else:
+        response = _send_in_process(full_path, mimetype, as_attachment)
+
+    if cache_control and response.status_code in (200, 206, 304):
+        response.headers['Cache-Control'] = cache_control
+    return response
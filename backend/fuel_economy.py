@@ -0,0 +1,124 @@
+from models import db, FuelRecord
+from sqlalchemy import select, update, tuple_
+from sqlalchemy.orm import aliased
+import numpy as np
+import pandas as pd
+
+# Units reported as distance per volume; L/100KM is volume per 100 distance.
+DISTANCE_PER_VOLUME_UNITS = ('MPG', 'UK MPG', 'KM/L')
+VOLUME_PER_DISTANCE_UNITS = ('L/100KM',)
+
+def compute_economy(distance, fuel_amount, unit):
+    if not distance or distance <= 0 or not fuel_amount or fuel_amount <= 0:
+        return None
+    if unit in DISTANCE_PER_VOLUME_UNITS:
+        return distance / fuel_amount
+    if unit in VOLUME_PER_DISTANCE_UNITS:
+        return (fuel_amount / distance) * 100
+    return None
+
+def compute_economy_series(distance, fuel_amount, unit):
+    """Vectorized compute_economy over aligned pandas Series."""
+    valid = (distance > 0) & (fuel_amount > 0)
+    safe_distance = distance.where(distance > 0)
+    safe_amount = fuel_amount.where(fuel_amount > 0)
+    economy = np.select(
+        [unit.isin(DISTANCE_PER_VOLUME_UNITS), unit.isin(VOLUME_PER_DISTANCE_UNITS)],
+        [safe_distance / safe_amount, safe_amount / safe_distance * 100],
+        default=np.nan
+    )
+    return pd.Series(economy, index=distance.index).where(valid)
+
+def _probe(columns, vehicle_id, odometer, record_id, after):
+    # (odometer, id) keyset probe on ix_fuel_record_vehicle_odometer.
+    key = tuple_(FuelRecord.odometer, FuelRecord.id)
+    statement = select(*columns).where(FuelRecord.vehicle_id == vehicle_id)
+    if after:
+        statement = statement.where(key > tuple_(odometer, record_id)).order_by(FuelRecord.odometer, FuelRecord.id)
+    else:
+        statement = statement.where(key < tuple_(odometer, record_id)).order_by(FuelRecord.odometer.desc(), FuelRecord.id.desc())
+    return statement.limit(1)
+
+def _neighbour(vehicle_id, odometer, record_id, after, exclude_id=None):
+    statement = _probe([FuelRecord], vehicle_id, odometer, record_id, after)
+    if exclude_id is not None:
+        statement = statement.where(FuelRecord.id != exclude_id)
+    return db.session.scalars(statement).first()
+
+def previous_record(record):
+    return _neighbour(record.vehicle_id, record.odometer, record.id, after=False)
+
+def next_record(record):
+    return _neighbour(record.vehicle_id, record.odometer, record.id, after=True)
+
+def recompute_record(record):
+    previous = previous_record(record)
+    record.distance = record.odometer - previous.odometer if previous else 0
+    record.fuel_economy = compute_economy(record.distance, record.fuel_amount, record.unit)
+
+def _recompute(records):
+    seen = set()
+    for record in records:
+        if record is not None and record.id not in seen:
+            seen.add(record.id)
+            recompute_record(record)
+
+def position(record):
+    return {'odometer': record.odometer, 'id': record.id}
+
+def record_added(record):
+    db.session.flush()
+    _recompute([record, next_record(record)])
+
+def records_added(vehicle_id, ids):
+    """record_added for rows inserted together, e.g. one import chunk.
+
+    The same probes, run as correlated subqueries over the whole batch:
+    one statement finds the rows right after the inserted ones, one reads
+    the previous odometer of every row that needs recomputing.
+    """
+    db.session.flush()
+    row = aliased(FuelRecord)
+    following = _probe([FuelRecord.id], vehicle_id, row.odometer, row.id, after=True).scalar_subquery()
+    affected = set(ids) | set(db.session.scalars(select(following).where(row.id.in_(ids))))
+    affected.discard(None)
+
+    previous = _probe([FuelRecord.odometer], vehicle_id, row.odometer, row.id, after=False).scalar_subquery()
+    statement = select(row.id, row.odometer, row.fuel_amount, row.unit, previous.label('previous')).where(row.id.in_(sorted(affected)))
+    df = pd.read_sql(statement, db.session.connection())
+    return _write(df, (df['odometer'] - df['previous']).fillna(0))
+
+def record_updated(record, before):
+    """before is position(record) taken before the edit was applied."""
+    db.session.flush()
+    old_next = _neighbour(record.vehicle_id, before['odometer'], before['id'], after=True, exclude_id=record.id)
+    _recompute([record, old_next, next_record(record)])
+
+def record_deleted(record):
+    db.session.flush()
+    _recompute([next_record(record)])
+
+def recompute_vehicle(vehicle_id):
+    """Recompute distance and economy for a vehicle's whole history in one pass."""
+    statement = (
+        select(FuelRecord.id, FuelRecord.odometer, FuelRecord.fuel_amount, FuelRecord.unit)
+        .where(FuelRecord.vehicle_id == vehicle_id)
+        .order_by(FuelRecord.odometer, FuelRecord.id)
+    )
+    df = pd.read_sql(statement, db.session.connection())
+    if df.empty:
+        return 0
+
+    return _write(df, df['odometer'].diff().fillna(0))
+
+def _write(df, distance):
+    distance = distance.astype('int64')
+    economy = compute_economy_series(distance, df['fuel_amount'].astype('float64'), df['unit'])
+
+    rows = [
+        {'id': int(record_id), 'distance': int(d), 'fuel_economy': None if pd.isna(e) else float(e)}
+        for record_id, d, e in zip(df['id'], distance, economy)
+    ]
+    if rows:
+        db.session.execute(update(FuelRecord), rows)
+    return len(rows)
@@ -0,0 +1,149 @@
+from models import db, User
+from flask import abort, has_request_context, session as http_session
+from flask_login import UserMixin, user_logged_in, user_logged_out
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from collections import OrderedDict
+import secrets
+import threading
+import time
+
+# load_user() runs on every authenticated request, so each worker keeps
+# the users it loaded recently in a small LRU. Entries are keyed by the
+# user and a stamp kept in their session; a commit that changes a User
+# row gives the session that made it a new stamp, so the next request
+# (on any worker) loads the row again. Other sessions of the same user
+# see the change once the entry's TTL runs out.
+
+STAMP_KEY = '_identity'
+# Never kept in memory: secrets, and data_version, which moves with every
+# vehicle change and is read per request by data_versions.user_version().
+UNCACHED = frozenset({'password_hash', 'two_factor_secret', 'backup_codes', 'email_verification_token', 'data_version'})
+CACHED_COLUMNS = tuple(column.key for column in User.__table__.columns if column.key not in UNCACHED)
+
+class IdentityCache:
+    def __init__(self, size=0, ttl=0):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.configure(size, ttl)
+
+    def configure(self, size, ttl):
+        with self._lock:
+            self.size, self.ttl = size, ttl
+            self._entries.clear()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, values = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return values
+
+    def put(self, key, values):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def evict_user(self, user_id):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+cache = IdentityCache()
+
+class CachedUser(UserMixin):
+    """current_user built from a cache entry.
+
+    Cached columns are answered from memory. Anything else (relationships,
+    methods, uncached columns) and any assignment loads the User row, which
+    then serves every attribute for the rest of the request.
+    """
+
+    def __init__(self, values):
+        object.__setattr__(self, '_values', values)
+        object.__setattr__(self, '_user', None)
+
+    def _row(self):
+        if self._user is None:
+            user = db.session.get(User, self._values['id'])
+            if user is None:
+                abort(401)
+            object.__setattr__(self, '_user', user)
+        return self._user
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if self._user is None and name in self._values:
+            return self._values[name]
+        return getattr(self._row(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._row(), name, value)
+
+    def get_id(self):
+        return str(self._values['id'])
+
+def _new_stamp():
+    stamp = secrets.token_urlsafe(8)
+    http_session[STAMP_KEY] = stamp
+    return stamp
+
+def load_user(user_id):
+    user_id = int(user_id)
+    stamp = http_session.get(STAMP_KEY)
+    values = cache.get((user_id, stamp)) if stamp else None
+    if values is not None:
+        return CachedUser(values)
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    cache.put((user_id, stamp or _new_stamp()), {key: getattr(user, key) for key in CACHED_COLUMNS})
+    return user
+
+def init_app(app):
+    cache.configure(app.config['IDENTITY_CACHE_SIZE'], app.config['IDENTITY_CACHE_TTL'])
+
+@user_logged_in.connect
+def _stamp_login(app, user, **extra):
+    _new_stamp()
+
+@user_logged_out.connect
+def _clear_stamp(app, user, **extra):
+    http_session.pop(STAMP_KEY, None)
+
+@event.listens_for(Session, 'before_flush')
+def _note_user_changes(session, flush_context, instances):
+    changed = session.info.setdefault('identity_changed', set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None and (obj in session.deleted or session.is_modified(obj)):
+            changed.add(obj.id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed(session):
+    changed = session.info.pop('identity_changed', None)
+    if not changed:
+        return
+    current_id = http_session.get('_user_id') if has_request_context() else None
+    for user_id in changed:
+        cache.evict_user(user_id)
+        if current_id is not None and str(user_id) == str(current_id):
+            _new_stamp()
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changes(session):
+    session.info.pop('identity_changed', None)
@@ -0,0 +1,154 @@
+from PIL import Image, ImageOps, UnidentifiedImageError
+import json
+import os
+
+UPLOADS_URL = '/uploads/'
+VARIANTS_DIR = 'variants'
+
+# Target widths, largest first: each variant is scaled down from the one
+# before it. Images are never scaled up.
+VARIANTS = (('full', 1600), ('card', 480), ('thumb', 160))
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+PHOTO_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif'}
+# Where upload_store.py keeps content-addressed uploads.
+PHOTO_STORE_DIR = 'objects'
+
+class ImageError(Exception):
+    pass
+
+# filename is relative to the uploads folder; variants of a photo in a
+# subdirectory (the upload store) go to the same subdirectory of variants/.
+def _stem(filename):
+    return os.path.splitext(filename)[0]
+
+def _variant_path(uploads_dir, filename, name, key):
+    return os.path.join(uploads_dir, VARIANTS_DIR, f'{_stem(filename)}-{name}.{key}')
+
+def manifest_path(uploads_dir, filename):
+    return os.path.join(uploads_dir, VARIANTS_DIR, f'{_stem(filename)}.json')
+
+def _load(path):
+    try:
+        with Image.open(path) as original:
+            # Lets the JPEG decoder skip detail no variant needs; the size
+            # is a lower bound on both sides, whatever the orientation.
+            original.draft('RGB', (VARIANTS[0][1], VARIANTS[0][1]))
+            image = ImageOps.exif_transpose(original)
+            image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ImageError(f'Cannot read image: {e}') from e
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    icc_profile = image.info.get('icc_profile')
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    return image, icc_profile
+
+def check_image(path):
+    """Raise ImageError unless Pillow recognises path as an image; reads only the header."""
+    try:
+        with Image.open(path):
+            pass
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ImageError(f'Cannot read image: {e}') from e
+
+def _save(image, path, image_format, options):
+    temp_path = f'{path}.tmp'
+    image.save(temp_path, format=image_format, **options)
+    os.chmod(temp_path, 0o644)
+    os.replace(temp_path, path)
+
+def generate_variants(uploads_dir, filename):
+    """Write the resized WebP and JPEG variants of an uploaded photo.
+
+    EXIF orientation is applied to the pixels and no EXIF or other metadata
+    is written; only the ICC profile is kept, since dropping it shifts the
+    colours of wide-gamut phone photos. Returns the variant map the API
+    serves as photo_variants.
+    """
+    image, icc_profile = _load(os.path.join(uploads_dir, filename))
+    os.makedirs(os.path.dirname(manifest_path(uploads_dir, filename)), exist_ok=True)
+
+    flattened_for_jpeg = None
+    variants = {}
+    for name, target_width in VARIANTS:
+        width = min(target_width, image.width)
+        if width != image.width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+            flattened_for_jpeg = None
+
+        variant = {'width': image.width, 'height': image.height}
+        for key, image_format, options in FORMATS:
+            target = image
+            if image_format == 'JPEG' and image.mode == 'RGBA':
+                if flattened_for_jpeg is None:
+                    flattened_for_jpeg = Image.new('RGB', image.size, (255, 255, 255))
+                    flattened_for_jpeg.paste(image, mask=image.getchannel('A'))
+                target = flattened_for_jpeg
+            _save(target, _variant_path(uploads_dir, filename, name, key), image_format, dict(options, icc_profile=icc_profile))
+            variant[key] = f'{UPLOADS_URL}{VARIANTS_DIR}/{_stem(filename)}-{name}.{key}'
+        variants[name] = variant
+
+    path = manifest_path(uploads_dir, filename)
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump({'source': filename, 'variants': variants}, f)
+    os.replace(f'{path}.tmp', path)
+    return variants
+
+def photo_variants(uploads_dir, photo_url):
+    """The variant map for a stored photo URL, or None if it has none (yet)."""
+    if not photo_url or not photo_url.startswith(UPLOADS_URL):
+        return None
+    filename = photo_url[len(UPLOADS_URL):]
+    if not filename or os.path.normpath(filename) != filename or filename.startswith(('/', '..')):
+        return None
+    try:
+        with open(manifest_path(uploads_dir, filename)) as f:
+            return json.load(f)['variants']
+    except (OSError, ValueError, KeyError):
+        return None
+
+def remove_variants(uploads_dir, filename):
+    for name, _ in VARIANTS:
+        for key, _, _ in FORMATS:
+            try:
+                os.remove(_variant_path(uploads_dir, filename, name, key))
+            except FileNotFoundError:
+                pass
+    try:
+        os.remove(manifest_path(uploads_dir, filename))
+    except FileNotFoundError:
+        pass
+
+def _photos(uploads_dir):
+    # Top-level photos from before the upload store, then the store itself.
+    for filename in sorted(os.listdir(uploads_dir)):
+        if os.path.isfile(os.path.join(uploads_dir, filename)):
+            yield filename
+    for root, dirs, files in os.walk(os.path.join(uploads_dir, PHOTO_STORE_DIR)):
+        dirs.sort()
+        for name in sorted(files):
+            yield os.path.relpath(os.path.join(root, name), uploads_dir).replace(os.sep, '/')
+
+def backfill_variants(uploads_dir, force=False):
+    """Generate variants for photos in the uploads tree that lack them.
+
+    Returns (generated, failed): the filenames done and (filename, error) pairs.
+    Attachments in the store that are images get variants too; they are small
+    next to the originals and the store cannot tell the two apart.
+    """
+    generated, failed = [], []
+    for filename in _photos(uploads_dir):
+        if os.path.splitext(filename)[1].lower() not in PHOTO_EXTENSIONS:
+            continue
+        if not force and os.path.exists(manifest_path(uploads_dir, filename)):
+            continue
+        try:
+            generate_variants(uploads_dir, filename)
+            generated.append(filename)
+        except ImageError as e:
+            failed.append((filename, str(e)))
+    return generated, failed
@@ -0,0 +1,213 @@
+from models import db, FuelRecord
+from exports import CSV_LAYOUTS, XLSX_SHEETS
+import fuel_economy
+import data_versions
+import vehicle_stats
+from sqlalchemy import insert
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+import pandas as pd
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 500
+
+FUEL_UNITS = fuel_economy.DISTANCE_PER_VOLUME_UNITS + fuel_economy.VOLUME_PER_DISTANCE_UNITS
+
+# Export columns that are derived or point into the uploads tree; they are
+# accepted in the file but not imported.
+IGNORED_COLUMNS = {'distance', 'fuel_economy', 'document_path'}
+
+REQUIRED_COLUMNS = {
+    'service_records': ('date', 'odometer', 'description'),
+    'fuel_records': ('date', 'odometer', 'fuel_amount'),
+}
+
+class ImportFileError(Exception):
+    pass
+
+def header_columns(data_type):
+    """Map every header the CSV and XLSX exports use for data_type to its model attribute."""
+    model, layout = CSV_LAYOUTS[data_type]
+    headers = {header: column.key for header, column in layout}
+    for _, sheet_model, _, sheet_layout in XLSX_SHEETS:
+        if sheet_model is model:
+            headers.update({header: column.key for header, column, _ in sheet_layout})
+    return {header: key for header, key in headers.items() if key not in IGNORED_COLUMNS}
+
+# Workbook sheet title -> data type, for the sheets export-all writes.
+IMPORT_SHEETS = {
+    title: data_type
+    for title, sheet_model, _, _ in XLSX_SHEETS
+    for data_type, (model, _) in CSV_LAYOUTS.items()
+    if sheet_model is model
+}
+
+def check_headers(data_type, file_headers):
+    headers = header_columns(data_type)
+    present = {headers[header] for header in file_headers if header in headers}
+    missing = [header for header, key in headers.items() if key in REQUIRED_COLUMNS[data_type] and key not in present]
+    if missing:
+        raise ImportFileError(f"Missing column(s) for {data_type}: {', '.join(missing)}")
+
+def _blank(series):
+    return series.isna() | (series.astype(str).str.strip() == '')
+
+def _text(series):
+    return series.where(~_blank(series)).astype(object).map(lambda value: str(value).strip(), na_action='ignore')
+
+def _validate(frame, data_type):
+    # Every check is a whole-column operation; the row loop only runs over
+    # the rows that failed one.
+    checks = []
+    clean = pd.DataFrame(index=frame.index)
+
+    dates = pd.to_datetime(frame['date'], errors='coerce', format='ISO8601')
+    checks.append((dates.isna(), 'Date must be YYYY-MM-DD'))
+    clean['date'] = dates.dt.date
+
+    odometer = pd.to_numeric(frame['odometer'], errors='coerce')
+    checks.append((odometer.isna() | (odometer < 0) | (odometer % 1 != 0), 'Odometer must be a whole number of at least 0'))
+    clean['odometer'] = odometer
+
+    cost = pd.to_numeric(frame['cost'], errors='coerce') if 'cost' in frame else pd.Series(0.0, index=frame.index)
+    if 'cost' in frame:
+        checks.append((~_blank(frame['cost']) & (cost.isna() | (cost < 0)), 'Cost must be a number of at least 0'))
+    clean['cost'] = cost.fillna(0.0)
+    clean['notes'] = _text(frame['notes']) if 'notes' in frame else None
+
+    if data_type == 'service_records':
+        description = _text(frame['description'])
+        checks.append((description.isna(), 'Description is required'))
+        checks.append((description.str.len() > 200, 'Description is longer than 200 characters'))
+        clean['description'] = description
+        clean['category'] = _text(frame['category']) if 'category' in frame else None
+    else:
+        fuel_amount = pd.to_numeric(frame['fuel_amount'], errors='coerce')
+        checks.append((fuel_amount.isna() | (fuel_amount <= 0), 'Fuel amount must be greater than 0'))
+        clean['fuel_amount'] = fuel_amount
+
+        if 'unit_cost' in frame:
+            unit_cost = pd.to_numeric(frame['unit_cost'], errors='coerce')
+            checks.append((~_blank(frame['unit_cost']) & (unit_cost.isna() | (unit_cost < 0)), 'Unit cost must be a number of at least 0'))
+            clean['unit_cost'] = unit_cost
+        else:
+            clean['unit_cost'] = None
+
+        unit = _text(frame['unit']).fillna('MPG') if 'unit' in frame else pd.Series('MPG', index=frame.index)
+        checks.append((~unit.isin(FUEL_UNITS), f"Unit must be one of {', '.join(FUEL_UNITS)}"))
+        clean['unit'] = unit
+
+    checks = [(mask.fillna(True).astype(bool), message) for mask, message in checks]
+    invalid = pd.concat([mask for mask, _ in checks], axis=1).any(axis=1)
+    errors = [
+        {'row': int(row), 'errors': [message for mask, message in checks if mask[row]]}
+        for row in frame.index[invalid]
+    ]
+
+    valid = clean[~invalid]
+    return valid.assign(odometer=valid['odometer'].astype('int64')), errors
+
+def _records(valid, vehicle_id):
+    rows = valid.astype(object).where(valid.notna(), None).to_dict('records')
+    for row in rows:
+        row['vehicle_id'] = vehicle_id
+    return rows
+
+def import_frames(vehicle, data_type, frames, result):
+    """Import DataFrames (export headers, index = file row number) chunk by chunk.
+
+    Each chunk is validated, inserted with one executemany and committed
+    with the fuel economy of the inserted rows and of the rows after them.
+    The whole-history economy pass and the statistics rebuild run once,
+    after the last chunk or after a failure part way through, so the
+    committed chunks are always left consistent.
+    """
+    model = CSV_LAYOUTS[data_type][0]
+    headers = header_columns(data_type)
+    result['imported'].setdefault(data_type, 0)
+
+    inserted = False
+    try:
+        for frame in frames:
+            check_headers(data_type, frame.columns)
+            frame = frame.rename(columns={header: key for header, key in headers.items() if header in frame.columns})
+
+            valid, errors = _validate(frame, data_type)
+            result['error_count'] += len(errors)
+            for error in errors:
+                if len(result['errors']) < MAX_REPORTED_ERRORS:
+                    result['errors'].append(dict(error, data_type=data_type))
+
+            if valid.empty:
+                continue
+            ids = db.session.execute(insert(model).returning(model.id), _records(valid, vehicle.id)).scalars().all()
+            inserted = True
+            data_versions.bump(db.session, [vehicle.id])
+            if model is FuelRecord:
+                fuel_economy.records_added(vehicle.id, ids)
+            db.session.commit()
+            result['imported'][data_type] += len(valid)
+    finally:
+        if inserted:
+            _rebuild(vehicle, model)
+
+def _rebuild(vehicle, model):
+    # Drops whatever the failed chunk, if any, left in the session.
+    db.session.rollback()
+    if model is FuelRecord:
+        fuel_economy.recompute_vehicle(vehicle.id)
+    vehicle_stats.rebuild_vehicle_stats(vehicle)
+    data_versions.bump(db.session, [vehicle.id])
+    db.session.commit()
+
+def csv_frames(fileobj):
+    for chunk in pd.read_csv(fileobj, dtype=str, keep_default_na=False, chunksize=IMPORT_CHUNK_SIZE):
+        # Row 1 is the header.
+        chunk.index = chunk.index + 2
+        yield chunk
+
+def _sheet_header(sheet):
+    for row in sheet.iter_rows(max_row=1, values_only=True):
+        return [str(value).strip() if value is not None else '' for value in row]
+    return []
+
+def sheet_frames(sheet):
+    header = _sheet_header(sheet)
+    rows = sheet.iter_rows(min_row=2, values_only=True)
+
+    chunk, numbers = [], []
+    for row_number, row in enumerate(rows, start=2):
+        if all(value is None or value == '' for value in row):
+            continue
+        chunk.append(tuple(row[:len(header)]) + (None,) * (len(header) - len(row)))
+        numbers.append(row_number)
+        if len(chunk) == IMPORT_CHUNK_SIZE:
+            yield pd.DataFrame(chunk, columns=header, index=numbers)
+            chunk, numbers = [], []
+    if chunk:
+        yield pd.DataFrame(chunk, columns=header, index=numbers)
+
+def new_result():
+    return {'imported': {}, 'errors': [], 'error_count': 0}
+
+def import_csv(vehicle, data_type, fileobj):
+    result = new_result()
+    import_frames(vehicle, data_type, csv_frames(fileobj), result)
+    return result
+
+def import_xlsx(vehicle, fileobj):
+    """Import the Service Records and Fuel Records sheets of an export-all workbook."""
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        sheets = [(title, data_type) for title, data_type in IMPORT_SHEETS.items() if title in workbook.sheetnames]
+        if not sheets:
+            raise ImportFileError(f"No {' or '.join(IMPORT_SHEETS)} sheet found")
+        # Check every sheet before the first chunk is committed.
+        for title, data_type in sheets:
+            check_headers(data_type, _sheet_header(workbook[title]))
+        result = new_result()
+        for title, data_type in sheets:
+            import_frames(vehicle, data_type, sheet_frames(workbook[title]), result)
+        return result
+    finally:
+        workbook.close()
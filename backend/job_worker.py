@@ -0,0 +1,48 @@
+"""Run background jobs outside the web workers.
+
+Usage: python job_worker.py [--workers N]
+
+Any number of these may run against the same database; each job goes to
+exactly one worker thread. Stops cleanly on SIGTERM or Ctrl-C, leaving
+unfinished jobs to be retried once their lease runs out.
+"""
+import argparse
+import logging
+import signal
+from app import app
+from models import db
+import jobs
+import password_admission
+import server_sessions
+
+PRUNE_INTERVAL = 3600
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=app.config['JOB_WORKERS'])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(threadName)s %(levelname)s %(message)s')
+
+    stop = jobs.start_workers(app, args.workers)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    print(f"Job worker running {args.workers} threads")
+    try:
+        while not stop.is_set():
+            with app.app_context():
+                # A failed prune, e.g. on a locked database, must not take
+                # the job threads down with the process.
+                try:
+                    pruned = jobs.prune()
+                    if pruned:
+                        print(f"Pruned {pruned} finished jobs")
+                    password_admission.prune()
+                    server_sessions.prune()
+                except Exception:
+                    db.session.rollback()
+                    logging.exception('Pruning failed')
+            stop.wait(PRUNE_INTERVAL)
+    except KeyboardInterrupt:
+        stop.set()
+
+if __name__ == '__main__':
+    main()
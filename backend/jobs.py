@@ -0,0 +1,141 @@
+from models import db, Job
+from sqlalchemy import and_, or_, update
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+import socket
+import threading
+import traceback
+import restore
+
+# A job queue kept in the application database, so it needs no broker.
+# Jobs are claimed with a conditional UPDATE; whichever worker's UPDATE
+# matches the row owns the job. A worker that dies mid-job leaves it
+# 'running', and it is picked up again once its lease has run out, so
+# handlers must be safe to run twice.
+
+POLL_INTERVAL = 1.0
+LEASE = timedelta(minutes=10)
+RETRY_DELAY = timedelta(seconds=30)
+# Candidates fetched per claim attempt, in case other workers win some.
+CLAIM_BATCH = 5
+KEEP_FINISHED = timedelta(days=7)
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+class JobFailed(Exception):
+    """Raised by a handler for errors that retrying will not fix."""
+
+def handler(kind):
+    def register(function):
+        HANDLERS[kind] = function
+        return function
+    return register
+
+def enqueue(kind, payload=None, user_id=None, max_attempts=3):
+    """Add a job; it becomes visible to workers when the caller commits."""
+    job = Job(kind=kind, payload=json.dumps(payload or {}), user_id=user_id, max_attempts=max_attempts)
+    db.session.add(job)
+    db.session.flush()
+    return job
+
+def job_status(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'attempts': job.attempts,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.last_error if job.status == 'failed' else None,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+
+def claim(worker_id):
+    now = datetime.utcnow()
+    claimable = or_(
+        and_(Job.status == 'queued', Job.run_after <= now),
+        and_(Job.status == 'running', Job.locked_at < now - LEASE)
+    )
+    candidates = db.session.query(Job.id).filter(claimable).order_by(Job.run_after, Job.id).limit(CLAIM_BATCH).all()
+    for job_id, in candidates:
+        claimed = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, claimable)
+            .values(status='running', locked_by=worker_id, locked_at=now, attempts=Job.attempts + 1)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+    return None
+
+def run(job):
+    try:
+        function = HANDLERS.get(job.kind)
+        if function is None:
+            raise JobFailed(f'No handler for job kind {job.kind!r}')
+        result = function(**json.loads(job.payload))
+    except Exception as e:
+        db.session.rollback()
+        permanent = isinstance(e, JobFailed) or job.attempts >= job.max_attempts
+        job.last_error = str(e) if isinstance(e, JobFailed) else traceback.format_exc(limit=5)
+        if permanent:
+            job.status = 'failed'
+            job.finished_at = datetime.utcnow()
+            logger.warning('Job %s (%s) failed: %s', job.id, job.kind, e)
+        else:
+            job.status = 'queued'
+            job.run_after = datetime.utcnow() + RETRY_DELAY * 2 ** (job.attempts - 1)
+    else:
+        job.status = 'done'
+        job.result = json.dumps(result) if result is not None else None
+        job.finished_at = datetime.utcnow()
+    job.locked_by = job.locked_at = None
+    db.session.commit()
+
+def prune(keep=KEEP_FINISHED):
+    deleted = Job.query.filter(
+        Job.status.in_(('done', 'failed')), Job.finished_at < datetime.utcnow() - keep
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+def work(app, worker_id, stop, poll_interval=POLL_INTERVAL):
+    """Run jobs until stop (a threading.Event) is set."""
+    with app.app_context():
+        while not stop.is_set():
+            restore.reconnect_if_restored()
+            try:
+                job = claim(worker_id)
+                if job is not None:
+                    run(job)
+                    continue
+            except Exception:
+                db.session.rollback()
+                logger.exception('Job worker %s', worker_id)
+            db.session.remove()
+            stop.wait(poll_interval)
+
+def start_workers(app, count, name='jobs'):
+    """Start count worker threads; returns the Event that stops them."""
+    stop = threading.Event()
+    for index in range(count):
+        worker_id = f'{socket.gethostname()}:{os.getpid()}:{name}-{index}'
+        threading.Thread(target=work, args=(app, worker_id, stop), name=f'{name}-{index}', daemon=True).start()
+    return stop
+
+_in_process = {'pid': None}
+_in_process_lock = threading.Lock()
+
+def ensure_in_process_workers(app):
+    """Start JOB_WORKERS_IN_PROCESS threads in this process, once per process."""
+    count = app.config.get('JOB_WORKERS_IN_PROCESS', 0)
+    if not count or _in_process['pid'] == os.getpid():
+        return
+    with _in_process_lock:
+        if _in_process['pid'] != os.getpid():
+            start_workers(app, count, name='web-jobs')
+            _in_process['pid'] = os.getpid()
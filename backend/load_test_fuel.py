@@ -0,0 +1,102 @@
+"""Hammer POST /api/vehicles/<id>/fuel-records from several processes.
+
+Usage: python load_test_fuel.py [--workers N] [--requests N]
+
+Each worker process imports the app on its own, like a gunicorn worker,
+and posts fill-ups through a test client against one shared SQLite file.
+The run is repeated with SQLITE_PROFILE=off (SQLite defaults: rollback
+journal, no busy timeout beyond pysqlite's 5 s) and with the profile on.
+"locked" counts requests that failed with "database is locked"; p50 is the
+slowest worker's median latency.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from bench_support import add_vehicle, login, open_app, register
+
+def seed(workdir):
+    client = open_app(workdir).test_client()
+    register(client)
+    print(add_vehicle(client))
+
+def worker(workdir, vehicle_id, worker_index, requests, start_at):
+    app = open_app(workdir)
+    from sqlalchemy.exc import OperationalError
+
+    app.config['PROPAGATE_EXCEPTIONS'] = True
+    client = app.test_client()
+    login(client)
+
+    time.sleep(max(0, start_at - time.time()))
+    ok = locked = failed = 0
+    latencies = []
+    for i in range(requests):
+        started = time.perf_counter()
+        try:
+            response = client.post(f'/api/vehicles/{vehicle_id}/fuel-records', json={
+                'date': '2024-01-01',
+                'odometer': (i * 100 + worker_index) * 10,
+                'fuel_amount': 40.0,
+                'cost': 75.0,
+                'unit': 'L/100KM'
+            })
+            if response.status_code == 201:
+                ok += 1
+            else:
+                failed += 1
+        except OperationalError as e:
+            if 'locked' in str(e):
+                locked += 1
+            else:
+                failed += 1
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    print(f'{ok} {locked} {failed} {time.time()} {latencies[len(latencies) // 2]:.4f} {latencies[-1]:.4f}')
+
+def run(profile, workers, requests):
+    # The workers log in at the same moment; password admission would
+    # turn most of them away.
+    env = dict(os.environ, SQLITE_PROFILE=profile, PASSWORD_HASH_SLOTS='0')
+    with tempfile.TemporaryDirectory() as workdir:
+        seeded = subprocess.run([sys.executable, __file__, '--seed', workdir], env=env, capture_output=True, text=True, check=True)
+        vehicle_id = seeded.stdout.split()[-1]
+
+        start_at = time.time() + 3
+        procs = [
+            subprocess.Popen(
+                [sys.executable, __file__, '--worker', workdir, vehicle_id, str(index), str(requests), str(start_at)],
+                env=env, stdout=subprocess.PIPE, text=True
+            )
+            for index in range(workers)
+        ]
+        results = [proc.communicate()[0].split()[-6:] for proc in procs]
+
+    ok = sum(int(r[0]) for r in results)
+    locked = sum(int(r[1]) for r in results)
+    failed = sum(int(r[2]) for r in results)
+    wall = max(float(r[3]) for r in results) - start_at
+    median = max(float(r[4]) for r in results)
+    worst = max(float(r[5]) for r in results)
+    total = workers * requests
+    print(f'{profile:>8} {total:>9} {ok / wall:>10.1f} {100 * locked / total:>9.1f}% {failed:>7} {median * 1000:>10.1f} {worst * 1000:>9.1f}')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=250)
+    args = parser.parse_args()
+
+    print(f"{'profile':>8} {'requests':>9} {'ok/s':>10} {'locked':>10} {'failed':>7} {'p50 ms':>10} {'max ms':>9}")
+    for profile in ('off', 'on'):
+        run(profile, args.workers, args.requests)
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--seed':
+        seed(sys.argv[2])
+    elif len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        worker(sys.argv[2], sys.argv[3], int(sys.argv[4]), int(sys.argv[5]), float(sys.argv[6]))
+    else:
+        main()
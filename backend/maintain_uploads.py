@@ -0,0 +1,22 @@
+import sys
+from app import app
+from models import db
+from upload_store import rebuild_ref_counts, collect_garbage, adopt_legacy_files
+
+def maintain_uploads(adopt_legacy=False, garbage=False):
+    with app.app_context():
+        uploads_dir = app.config['UPLOAD_FOLDER']
+        if adopt_legacy:
+            adopted, missing = adopt_legacy_files(uploads_dir)
+            print(f"Moved {adopted} legacy uploads into the store")
+            for value in missing:
+                print(f"  missing file for {value}")
+        in_use = rebuild_ref_counts(uploads_dir)
+        db.session.commit()
+        print(f"{in_use} stored uploads in use")
+        if garbage:
+            removed = collect_garbage(uploads_dir)
+            print(f"Removed {removed} unreferenced files")
+
+if __name__ == '__main__':
+    maintain_uploads(adopt_legacy='--adopt-legacy' in sys.argv[1:], garbage='--collect-garbage' in sys.argv[1:])
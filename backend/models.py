@@ -3,6 +3,7 @@ from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import secrets
+import backup_codes as backup_code_store
 
 db = SQLAlchemy()
 
@@ -30,6 +31,8 @@ class User(UserMixin, db.Model):
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime)
+    # Bumped on every change to the user or their vehicles; see data_versions.py.
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     vehicles = db.relationship('Vehicle', backref='owner', lazy=True, cascade='all, delete-orphan')
     
@@ -52,25 +55,19 @@ class User(UserMixin, db.Model):
         return False
     
     def generate_backup_codes(self):
-        codes = [secrets.token_hex(4).upper() for _ in range(10)]
-        self.backup_codes = ','.join([generate_password_hash(code) for code in codes])
+        codes, self.backup_codes = backup_code_store.generate()
         return codes
     
     def verify_backup_code(self, code):
-        if not self.backup_codes:
+        remaining = backup_code_store.consume(self.backup_codes, code)
+        if remaining is None:
             return False
-        
-        codes = self.backup_codes.split(',')
-        for i, hashed_code in enumerate(codes):
-            if check_password_hash(hashed_code, code.upper()):
-                codes.pop(i)
-                self.backup_codes = ','.join(codes)
-                return True
-        return False
+        self.backup_codes = remaining
+        return True
 
 class Vehicle(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     year = db.Column(db.Integer, nullable=False)
     make = db.Column(db.String(50), nullable=False)
     model = db.Column(db.String(50), nullable=False)
@@ -80,14 +77,22 @@ class Vehicle(db.Model):
     photo = db.Column(db.String(255))
     status = db.Column(db.String(20), default='active')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped on every change to the vehicle or anything that belongs to it.
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     service_records = db.relationship('ServiceRecord', backref='vehicle', lazy=True, cascade='all, delete-orphan')
     fuel_records = db.relationship('FuelRecord', backref='vehicle', lazy=True, cascade='all, delete-orphan')
     reminders = db.relationship('Reminder', backref='vehicle', lazy=True, cascade='all, delete-orphan')
     todos = db.relationship('Todo', backref='vehicle', lazy=True, cascade='all, delete-orphan')
     recurring_expenses = db.relationship('RecurringExpense', backref='vehicle', lazy=True, cascade='all, delete-orphan')
+    stats = db.relationship('VehicleStats', backref='vehicle', uselist=False, cascade='all, delete-orphan')
 
 class ServiceRecord(db.Model):
+    __table_args__ = (
+        db.Index('ix_service_record_vehicle_date', 'vehicle_id', 'date'),
+        db.Index('ix_service_record_vehicle_odometer', 'vehicle_id', 'odometer'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
@@ -100,6 +105,11 @@ class ServiceRecord(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class FuelRecord(db.Model):
+    __table_args__ = (
+        db.Index('ix_fuel_record_vehicle_date', 'vehicle_id', 'date'),
+        db.Index('ix_fuel_record_vehicle_odometer', 'vehicle_id', 'odometer'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
@@ -114,6 +124,15 @@ class FuelRecord(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Reminder(db.Model):
+    __table_args__ = (
+        # Serves every per-vehicle read, open or not: the list, the export
+        # and the cascade on vehicle delete; see check_query_plans.py.
+        db.Index('ix_reminder_vehicle', 'vehicle_id'),
+        # Due-state lookups across a user's vehicles; see reminder_due.py.
+        db.Index('ix_reminder_open_due_date', 'vehicle_id', 'due_date', sqlite_where=db.text('completed = 0')),
+        db.Index('ix_reminder_open_due_odometer', 'vehicle_id', 'due_odometer', sqlite_where=db.text('completed = 0')),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), nullable=False)
     description = db.Column(db.String(200), nullable=False)
@@ -129,6 +148,10 @@ class Reminder(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Todo(db.Model):
+    __table_args__ = (
+        db.Index('ix_todo_vehicle_created', 'vehicle_id', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), nullable=False)
     description = db.Column(db.String(200), nullable=False)
@@ -140,6 +163,11 @@ class Todo(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class RecurringExpense(db.Model):
+    __table_args__ = (
+        db.Index('ix_recurring_expense_vehicle', 'vehicle_id'),
+        db.Index('ix_recurring_expense_vehicle_active', 'vehicle_id', 'next_due_date', sqlite_where=db.text('is_active = 1')),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), nullable=False)
     expense_type = db.Column(db.String(50), nullable=False)
@@ -151,3 +179,72 @@ class RecurringExpense(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     notes = db.Column(db.Text)
+
+class VehicleStats(db.Model):
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id'), primary_key=True)
+    service_count = db.Column(db.Integer, nullable=False, default=0)
+    service_cost = db.Column(db.Float, nullable=False, default=0.0)
+    maintenance_cost = db.Column(db.Float, nullable=False, default=0.0)
+    repair_cost = db.Column(db.Float, nullable=False, default=0.0)
+    inspection_cost = db.Column(db.Float, nullable=False, default=0.0)
+    upgrade_cost = db.Column(db.Float, nullable=False, default=0.0)
+    tax_cost = db.Column(db.Float, nullable=False, default=0.0)
+    other_cost = db.Column(db.Float, nullable=False, default=0.0)
+    fuel_count = db.Column(db.Integer, nullable=False, default=0)
+    fuel_cost = db.Column(db.Float, nullable=False, default=0.0)
+    fuel_volume = db.Column(db.Float, nullable=False, default=0.0)
+    fuel_min_odometer = db.Column(db.Integer)
+    fuel_max_odometer = db.Column(db.Integer)
+    max_odometer = db.Column(db.Integer)
+    last_service_date = db.Column(db.Date)
+    last_fuel_date = db.Column(db.Date)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @property
+    def total_distance(self):
+        if self.fuel_max_odometer is None or self.fuel_min_odometer is None:
+            return 0
+        return self.fuel_max_odometer - self.fuel_min_odometer
+
+class UploadObject(db.Model):
+    """A file in the content-addressed upload store (see upload_store.py)."""
+    # Relative to the uploads folder: objects/ab/cd/<sha256><extension>
+    path = db.Column(db.String(100), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    # References from Vehicle.photo, User.photo and ServiceRecord.document_path
+    ref_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Unreferenced objects are kept for a while after each upload, since the
+    # record that will point at them is saved in a later request.
+    last_uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Job(db.Model):
+    """A unit of background work (see jobs.py)."""
+    __table_args__ = (
+        db.Index('ix_job_status_run_after', 'status', 'run_after'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    # queued -> running -> done | failed; failed attempts go back to queued
+    status = db.Column(db.String(10), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(64))
+    locked_at = db.Column(db.DateTime)
+    result = db.Column(db.Text)
+    last_error = db.Column(db.Text)
+    # Whose job it is, for status polling; None for system jobs.
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+class RateBucket(db.Model):
+    """A token bucket of password attempts (see password_admission.py)."""
+    # ip:<address> or user:<username>
+    key = db.Column(db.String(200), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    # Unix time of the last take; tokens refill from there.
+    updated_at = db.Column(db.Float, nullable=False)
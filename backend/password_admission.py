@@ -0,0 +1,113 @@
+from models import db, RateBucket
+from flask import current_app, request
+from sqlalchemy import delete, func, update
+from sqlalchemy.dialects.sqlite import insert
+from werkzeug.exceptions import TooManyRequests
+from contextlib import contextmanager
+import fcntl
+import math
+import os
+import random
+import time
+import backups
+
+# Password and 2FA checks go through admit(), which (1) takes a token from
+# the client IP's and the account's bucket, and (2) takes one of
+# PASSWORD_HASH_SLOTS hashing slots shared by every worker process.
+# An empty bucket is a fast 429. A full set of slots is waited on for up
+# to PASSWORD_HASH_WAIT seconds, so ordinary logins that happen to overlap
+# queue briefly instead of failing, and only then get a 429. Either way a
+# flood of attempts cannot tie up all workers hashing for long and normal
+# requests keep being served.
+#
+# The IP is request.remote_addr, which is the proxy's own address unless
+# TRUSTED_PROXY_HOPS lets ProxyFix take it from X-Forwarded-For.
+#
+# Buckets live in the database so all workers share them; the slots are
+# flock()ed files next to it, released by the kernel if a worker dies.
+
+SLOTS_DIR = '.password-slots'
+SLOT_POLL = 0.01
+# Idle this long, a bucket has refilled and its row can go.
+KEEP_IDLE = 3600
+
+class Rejected(TooManyRequests):
+    description = 'Too many attempts, please try again later'
+
+def _take(connection, key, burst, per_minute, now):
+    table = RateBucket.__table__
+    rate = per_minute / 60
+    refilled = func.min(burst, table.c.tokens + (now - table.c.updated_at) * rate)
+    taken = connection.execute(
+        update(table).where(table.c.key == key, refilled >= 1).values(tokens=refilled - 1, updated_at=now)
+    ).rowcount
+    if taken:
+        return True
+    # No row yet means a full bucket; a row that exists is an empty one.
+    return connection.execute(
+        insert(table).values(key=key, tokens=burst - 1, updated_at=now).on_conflict_do_nothing()
+    ).rowcount == 1
+
+def take_tokens(account):
+    """Take one attempt from the client IP's and the account's bucket, or raise Rejected."""
+    config = current_app.config
+    buckets = (
+        (f'ip:{request.remote_addr}', config['PASSWORD_IP_BURST'], config['PASSWORD_IP_PER_MINUTE']),
+        (f'user:{account.lower()}', config['PASSWORD_USER_BURST'], config['PASSWORD_USER_PER_MINUTE']),
+    )
+    now = time.time()
+    # Its own transaction, committed before any rejection, so the attempt
+    # counts against the buckets that did have a token.
+    rejected = None
+    with db.engine.begin() as connection:
+        for key, burst, per_minute in buckets:
+            if burst and not _take(connection, key, burst, per_minute, now):
+                rejected = per_minute
+                break
+    if rejected is not None:
+        raise Rejected(retry_after=math.ceil(60 / rejected))
+
+def _slot_paths(slots):
+    directory = os.path.join(os.path.dirname(backups.database_path()), SLOTS_DIR)
+    os.makedirs(directory, exist_ok=True)
+    paths = [os.path.join(directory, f'{index}.lock') for index in range(slots)]
+    random.shuffle(paths)
+    return paths
+
+@contextmanager
+def hashing_slot():
+    """Hold one of PASSWORD_HASH_SLOTS across all workers, or raise Rejected."""
+    slots = current_app.config['PASSWORD_HASH_SLOTS']
+    if not slots:
+        yield
+        return
+    deadline = time.monotonic() + current_app.config['PASSWORD_HASH_WAIT']
+    paths = _slot_paths(slots)
+    while True:
+        for path in paths:
+            f = open(path, 'a')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                continue
+            try:
+                yield
+                return
+            finally:
+                f.close()
+        if time.monotonic() >= deadline:
+            raise Rejected(retry_after=1)
+        time.sleep(SLOT_POLL)
+
+@contextmanager
+def admit(account):
+    """Guard a password or 2FA check for account (a username)."""
+    take_tokens(account)
+    with hashing_slot():
+        yield
+
+def prune(keep_idle=KEEP_IDLE):
+    deleted = db.session.execute(delete(RateBucket).where(RateBucket.updated_at < time.time() - keep_idle)).rowcount
+    db.session.commit()
+    return deleted
@@ -0,0 +1,12 @@
+from app import app
+from models import db
+from vehicle_stats import rebuild_all_stats
+
+def rebuild_stats():
+    with app.app_context():
+        count = rebuild_all_stats()
+        db.session.commit()
+        print(f"Rebuilt statistics for {count} vehicles")
+
+if __name__ == '__main__':
+    rebuild_stats()
@@ -0,0 +1,14 @@
+from app import app
+from models import db, Vehicle
+from fuel_economy import recompute_vehicle
+
+def recompute_fuel_economy():
+    with app.app_context():
+        total = 0
+        for vehicle in Vehicle.query.all():
+            total += recompute_vehicle(vehicle.id)
+        db.session.commit()
+        print(f"Recomputed distance and fuel economy for {total} fuel records")
+
+if __name__ == '__main__':
+    recompute_fuel_economy()
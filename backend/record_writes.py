@@ -0,0 +1,158 @@
+from models import db, ServiceRecord, FuelRecord, Reminder
+import fuel_economy
+import vehicle_stats
+import reminder_due
+from datetime import datetime
+
+# Write paths shared by the per-record endpoints and /api/vehicles/<id>/batch.
+# None of these commit; the caller owns the transaction.
+
+def create_service_record(vehicle, data):
+    record = ServiceRecord(
+        vehicle_id=vehicle.id,
+        date=datetime.fromisoformat(data['date']),
+        odometer=data['odometer'],
+        description=data['description'],
+        cost=data.get('cost', 0.0),
+        notes=data.get('notes'),
+        category=data.get('category'),
+        document_path=data.get('document_path')
+    )
+    db.session.add(record)
+    vehicle_stats.service_record_added(vehicle, record)
+    return record
+
+def update_service_record(vehicle, record, data):
+    before = vehicle_stats.service_snapshot(record)
+    record.date = datetime.fromisoformat(data['date']).date() if 'date' in data else record.date
+    record.odometer = data.get('odometer', record.odometer)
+    record.description = data.get('description', record.description)
+    record.category = data.get('category', record.category)
+    record.cost = data.get('cost', record.cost)
+    record.notes = data.get('notes', record.notes)
+    vehicle_stats.service_record_updated(vehicle, before, record)
+
+def delete_service_record(vehicle, record):
+    db.session.delete(record)
+    vehicle_stats.service_record_deleted(vehicle, record)
+
+def create_fuel_record(vehicle, data):
+    record = FuelRecord(
+        vehicle_id=vehicle.id,
+        date=datetime.fromisoformat(data['date']),
+        odometer=data['odometer'],
+        fuel_amount=data['fuel_amount'],
+        cost=data.get('cost', 0.0),
+        unit_cost=data.get('unit_cost'),
+        unit=data.get('unit', 'MPG'),
+        notes=data.get('notes')
+    )
+    db.session.add(record)
+    fuel_economy.record_added(record)
+    vehicle_stats.fuel_record_added(vehicle, record)
+    return record
+
+def update_fuel_record(vehicle, record, data):
+    before = vehicle_stats.fuel_snapshot(record)
+    position = fuel_economy.position(record)
+    record.date = datetime.fromisoformat(data['date']).date() if 'date' in data else record.date
+    record.odometer = data.get('odometer', record.odometer)
+    record.fuel_amount = data.get('fuel_amount', record.fuel_amount)
+    record.cost = data.get('cost', record.cost)
+    record.unit = data.get('unit', record.unit)
+    record.notes = data.get('notes', record.notes)
+    fuel_economy.record_updated(record, position)
+    vehicle_stats.fuel_record_updated(vehicle, before, record)
+
+def delete_fuel_record(vehicle, record):
+    db.session.delete(record)
+    fuel_economy.record_deleted(record)
+    vehicle_stats.fuel_record_deleted(vehicle, record)
+
+def _interval_value(value):
+    # Completing a recurring reminder does arithmetic on it; see reminder_due.complete().
+    if value is None or value == '':
+        return None
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ValueError('interval_value must be a positive whole number')
+    return value
+
+def create_reminder(vehicle, data):
+    reminder = Reminder(
+        vehicle_id=vehicle.id,
+        description=data['description'],
+        urgency=data.get('urgency', 'not_urgent'),
+        due_date=datetime.fromisoformat(data['due_date']) if data.get('due_date') else None,
+        due_odometer=data.get('due_odometer'),
+        metric=data.get('metric'),
+        recurring=data.get('recurring', False),
+        interval_type=data.get('interval_type'),
+        interval_value=_interval_value(data.get('interval_value')),
+        notes=data.get('notes')
+    )
+    db.session.add(reminder)
+    return reminder
+
+def update_reminder(vehicle, reminder, data):
+    reminder.description = data.get('description', reminder.description)
+    reminder.urgency = data.get('urgency', reminder.urgency)
+    if 'due_date' in data and data['due_date']:
+        reminder.due_date = datetime.fromisoformat(data['due_date']).date()
+    reminder.due_odometer = data.get('due_odometer', reminder.due_odometer)
+    reminder.metric = data.get('metric', reminder.metric)
+    reminder.recurring = data.get('recurring', reminder.recurring)
+    reminder.interval_type = data.get('interval_type', reminder.interval_type)
+    if 'interval_value' in data:
+        reminder.interval_value = _interval_value(data['interval_value'])
+    reminder.notes = data.get('notes', reminder.notes)
+    if 'completed' in data:
+        if data['completed']:
+            reminder_due.complete(vehicle, reminder)
+        else:
+            reminder.completed = False
+
+def delete_reminder(vehicle, reminder):
+    db.session.delete(reminder)
+
+# Batch record type -> (model, create, update, delete)
+RECORD_TYPES = {
+    'service_record': (ServiceRecord, create_service_record, update_service_record, delete_service_record),
+    'fuel_record': (FuelRecord, create_fuel_record, update_fuel_record, delete_fuel_record),
+    'reminder': (Reminder, create_reminder, update_reminder, delete_reminder),
+}
+
+class BatchItemError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def apply_operation(vehicle, operation):
+    """Apply one batch operation and return its result dict (without index)."""
+    if not isinstance(operation, dict):
+        raise BatchItemError('Operation must be an object')
+    if operation.get('type') not in RECORD_TYPES:
+        raise BatchItemError(f"type must be one of {', '.join(RECORD_TYPES)}")
+    model, create, update, delete = RECORD_TYPES[operation['type']]
+    action = operation.get('op')
+    data = operation.get('data') or {}
+    if not isinstance(data, dict):
+        raise BatchItemError('data must be an object')
+
+    if action == 'create':
+        record = create(vehicle, data)
+        db.session.flush()
+        return {'status': 201, 'id': record.id}
+
+    if action not in ('update', 'delete'):
+        raise BatchItemError('op must be create, update or delete')
+    record = model.query.filter_by(id=operation.get('id'), vehicle_id=vehicle.id).first()
+    if record is None:
+        raise BatchItemError('Not found', 404)
+    if action == 'update':
+        update(vehicle, record, data)
+    else:
+        delete(vehicle, record)
+    db.session.flush()
+    return {'status': 200, 'id': record.id}
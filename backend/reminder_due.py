@@ -0,0 +1,97 @@
+from models import db, Reminder, Vehicle
+from sqlalchemy import case, false, func, or_
+from datetime import date, timedelta
+import calendar
+
+# Due state of open reminders, from the due date and the vehicle's current
+# odometer (Vehicle.odometer, kept at the highest recorded reading by
+# vehicle_stats.py). The more urgent of the two wins:
+#   overdue   the due date has passed, or the odometer is past due_odometer
+#   due       within DUE_DAYS / DUE_DISTANCE of either
+#   upcoming  within UPCOMING_DAYS / UPCOMING_DISTANCE of either
+# Reminders further out than that have no state.
+
+DUE_DAYS = 7
+DUE_DISTANCE = 500
+UPCOMING_DAYS = 30
+UPCOMING_DISTANCE = 1500
+STATES = ('overdue', 'due', 'upcoming')
+
+# interval_type values a recurring reminder can repeat by.
+DATE_INTERVALS = ('days', 'weeks', 'months', 'years')
+DISTANCE_INTERVALS = ('distance', 'miles', 'kilometers')
+
+def _state(odometer, today):
+    return case(
+        (or_(Reminder.due_date < today, Reminder.due_odometer < odometer), 'overdue'),
+        (or_(Reminder.due_date <= today + timedelta(days=DUE_DAYS),
+             Reminder.due_odometer <= odometer + DUE_DISTANCE), 'due'),
+        (or_(Reminder.due_date <= today + timedelta(days=UPCOMING_DAYS),
+             Reminder.due_odometer <= odometer + UPCOMING_DISTANCE), 'upcoming'),
+        else_=None
+    )
+
+def _open_ids(user_id, condition):
+    return (
+        db.session.query(Reminder.id)
+        .join(Vehicle, Vehicle.id == Reminder.vehicle_id)
+        .filter(Vehicle.user_id == user_id, Reminder.completed == false(), condition)
+    )
+
+def due_reminders(user_id, today=None, states=STATES):
+    """Open reminders across all of a user's vehicles that are in one of states, most urgent first.
+
+    One query. The upcoming window is found per vehicle as two index range
+    scans, on (vehicle_id, due_date) and (vehicle_id, due_odometer), so
+    reminders further out are never read.
+    """
+    today = today or date.today()
+    odometer = func.coalesce(Vehicle.odometer, 0)
+    state = _state(odometer, today)
+    rank = case({name: index for index, name in enumerate(STATES)}, value=state)
+    # A UNION rather than one OR, which SQLite would answer by reading
+    # every open reminder of each vehicle.
+    window = _open_ids(user_id, Reminder.due_date <= today + timedelta(days=UPCOMING_DAYS)).union(
+        _open_ids(user_id, Reminder.due_odometer <= odometer + UPCOMING_DISTANCE)
+    )
+    rows = (
+        db.session.query(Reminder, Vehicle.year, Vehicle.make, Vehicle.model, odometer.label('odometer'), state.label('state'))
+        .join(Vehicle, Vehicle.id == Reminder.vehicle_id)
+        .filter(Reminder.id.in_(window))
+        .order_by(rank, Reminder.due_date.is_(None), Reminder.due_date, Reminder.id)
+        .all()
+    )
+    return [row for row in rows if row.state in states]
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    year, month = day.year + month // 12, month % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+def next_due_date(day, interval_type, interval_value):
+    if interval_type == 'days':
+        return day + timedelta(days=interval_value)
+    if interval_type == 'weeks':
+        return day + timedelta(weeks=interval_value)
+    if interval_type == 'months':
+        return _add_months(day, interval_value)
+    return _add_months(day, 12 * interval_value)
+
+def complete(vehicle, reminder, today=None):
+    """Mark a reminder done; a recurring one moves to its next due point instead.
+
+    The next due point counts from completion: today for date intervals,
+    the vehicle's current odometer for distance intervals. The other due
+    field is cleared, as a recurring reminder repeats by its interval only.
+    """
+    interval_type, interval_value = reminder.interval_type, reminder.interval_value
+    if not reminder.recurring or not interval_value or interval_type not in DATE_INTERVALS + DISTANCE_INTERVALS:
+        reminder.completed = True
+        return
+    if interval_type in DATE_INTERVALS:
+        reminder.due_date = next_due_date(today or date.today(), interval_type, interval_value)
+        reminder.due_odometer = None
+    else:
+        reminder.due_odometer = (vehicle.odometer or 0) + interval_value
+        reminder.due_date = None
+    reminder.completed = False
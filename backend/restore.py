@@ -0,0 +1,183 @@
+from models import db
+import backups
+import identity
+import schema
+import os
+import secrets
+import shutil
+import sqlite3
+
+# Scratch names live next to their targets so every swap is a
+# same-filesystem rename. The uploads path is a symlink to a tree beside it
+# (the volume mount point itself cannot be renamed), so a restore stages a
+# whole new tree there and swaps the link in one rename.
+STAGING_PREFIX = '.restore-'
+TREE_PREFIX = '.tree-'
+# The Docker volume, which images from before the tree layout served as
+# UPLOAD_FOLDER itself with the files at its top level.
+LEGACY_UPLOADS_VOLUME = '/app/uploads'
+LEGACY_TREE = f'{TREE_PREFIX}initial'
+GENERATION_FILE = '.restore_generation'
+
+# Seconds to wait for in-flight writers before the database swap gives up.
+DATABASE_SWAP_TIMEOUT = 30
+
+class RestoreError(Exception):
+    pass
+
+def validate_database(path):
+    conn = sqlite3.connect(path)
+    try:
+        if conn.execute('PRAGMA integrity_check').fetchall() != [('ok',)]:
+            raise RestoreError('Backup database failed the integrity check')
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    except sqlite3.DatabaseError:
+        raise RestoreError('Backup database is not a valid SQLite file')
+    finally:
+        conn.close()
+
+    if version > schema.SCHEMA_VERSION:
+        raise RestoreError('Backup was created by a newer version of Masina-Dock')
+    missing = [table for table in schema.REQUIRED_TABLES if table not in tables]
+    if missing:
+        raise RestoreError(f"Backup database is missing tables: {', '.join(missing)}")
+
+def swap_database(staged_path, target_path):
+    # In WAL mode the live file must not be renamed over: its -wal and -shm
+    # belong to the old file and other workers still have them mapped.
+    # The backup API instead rewrites the live file in a single write
+    # transaction, which every open connection observes consistently.
+    previous_path = f'{target_path}.backup'
+    if os.path.exists(target_path):
+        if os.path.exists(previous_path):
+            os.remove(previous_path)
+        backups.snapshot_database(previous_path)
+
+    source = sqlite3.connect(staged_path)
+    try:
+        target = sqlite3.connect(target_path, timeout=DATABASE_SWAP_TIMEOUT)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+    finally:
+        source.close()
+
+def _live_tree(uploads_dir):
+    return os.path.join(os.path.dirname(uploads_dir), os.readlink(uploads_dir))
+
+def ensure_uploads_tree(uploads_dir):
+    """Make uploads_dir a symlink to a tree beside it; run before serving.
+
+    A plain directory is moved into a tree first, and so are the files of a
+    volume laid out before trees existed. Those moves are the only steps
+    that are not atomic; they happen once per install and are picked up
+    again if interrupted.
+    """
+    if os.path.islink(uploads_dir):
+        return
+    parent = os.path.dirname(uploads_dir)
+    if parent == LEGACY_UPLOADS_VOLUME and not os.path.exists(uploads_dir):
+        tree = os.path.join(parent, LEGACY_TREE)
+        os.makedirs(tree, exist_ok=True)
+        for name in os.listdir(parent):
+            if not name.startswith(TREE_PREFIX):
+                os.rename(os.path.join(parent, name), os.path.join(tree, name))
+    else:
+        tree = os.path.join(parent, f'{TREE_PREFIX}{secrets.token_hex(6)}')
+        if os.path.isdir(uploads_dir):
+            os.rename(uploads_dir, tree)
+        else:
+            os.makedirs(tree)
+    os.symlink(os.path.basename(tree), uploads_dir)
+
+def remove_stale_trees(uploads_dir):
+    """Delete trees and links left by restores that were interrupted; run before serving."""
+    parent = os.path.dirname(uploads_dir)
+    live_tree = _live_tree(uploads_dir)
+    removed = 0
+    for name in os.listdir(parent):
+        path = os.path.join(parent, name)
+        if name.startswith(TREE_PREFIX) and path != live_tree:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+        elif name.startswith(STAGING_PREFIX) and os.path.islink(path):
+            os.remove(path)
+    return removed
+
+def staged_tree_path(uploads_dir, token):
+    return os.path.join(os.path.dirname(uploads_dir), f'{TREE_PREFIX}{token}')
+
+def swap_uploads(staged_dir, uploads_dir, token):
+    # A crash on either side of the replace leaves one complete tree live.
+    previous_tree = _live_tree(uploads_dir)
+    staged_link = os.path.join(os.path.dirname(uploads_dir), f'{STAGING_PREFIX}{token}')
+    os.symlink(os.path.basename(staged_dir), staged_link)
+    os.replace(staged_link, uploads_dir)
+    shutil.rmtree(previous_tree, ignore_errors=True)
+
+def generation_path():
+    return os.path.join(os.path.dirname(backups.database_path()), GENERATION_FILE)
+
+def current_generation():
+    try:
+        stat = os.stat(generation_path())
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+def bump_generation():
+    path = generation_path()
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as f:
+        f.write(secrets.token_hex(8))
+    os.replace(temp_path, path)
+
+_NOT_CHECKED = object()
+_seen_generation = _NOT_CHECKED
+
+def reconnect_if_restored():
+    """Drop pooled connections if any worker restored a backup since the last request.
+
+    Pooled connections keep the replaced database file open, so they would
+    go on reading and writing the old data. Costs one stat() per request.
+    Cached identities describe the old data too, so they go as well.
+    """
+    global _seen_generation
+    generation = current_generation()
+    if _seen_generation is not _NOT_CHECKED and generation != _seen_generation:
+        db.engine.dispose()
+        identity.cache.clear()
+    _seen_generation = generation
+
+def restore_archives(archive_paths, uploads_dir):
+    """Stage, validate and swap in a backup chain; live data is only touched by the final swap."""
+    global _seen_generation
+    database_path = backups.database_path()
+    token = secrets.token_hex(6)
+    staged_db = os.path.join(os.path.dirname(database_path), f'{STAGING_PREFIX}{token}.db')
+    ensure_uploads_tree(uploads_dir)
+    staged_uploads = staged_tree_path(uploads_dir, token)
+    swapped_uploads = False
+
+    try:
+        has_uploads = backups.stage_restore(archive_paths, staged_db, staged_uploads)
+        validate_database(staged_db)
+        schema.upgrade_database(staged_db)
+
+        db.session.close()
+        db.engine.dispose()
+        swap_database(staged_db, database_path)
+        if has_uploads:
+            swap_uploads(staged_uploads, uploads_dir, token)
+            swapped_uploads = True
+
+        bump_generation()
+        _seen_generation = current_generation()
+    finally:
+        for path in (staged_db, f'{staged_db}-journal', f'{staged_db}-wal', f'{staged_db}-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+        if not swapped_uploads:
+            shutil.rmtree(staged_uploads, ignore_errors=True)
@@ -0,0 +1,121 @@
+from models import db
+from sqlalchemy import create_engine, inspect
+import os
+import sqlite3
+
+# Stored in PRAGMA user_version; bump it whenever a migration is added.
+SCHEMA_VERSION = 5
+
+# Tables every Masina-Dock database has had; anything newer is created on upgrade.
+REQUIRED_TABLES = ('user', 'vehicle', 'service_record', 'fuel_record')
+
+# Indexes that were declared once and have since been removed from the models.
+RETIRED_INDEXES = ('ix_reminder_vehicle_open',)
+
+def migrate_database(db_path):
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("PRAGMA table_info(user)")
+            columns = [column[1] for column in cursor.fetchall()]
+            
+            if 'language' not in columns:
+                print("Adding language column...")
+                cursor.execute("ALTER TABLE user ADD COLUMN language VARCHAR(5) DEFAULT 'en'")
+            
+            if 'unit_system' not in columns:
+                print("Adding unit_system column...")
+                cursor.execute("ALTER TABLE user ADD COLUMN unit_system VARCHAR(20) DEFAULT 'imperial'")
+            
+            if 'currency' not in columns:
+                print("Adding currency column...")
+                cursor.execute("ALTER TABLE user ADD COLUMN currency VARCHAR(10) DEFAULT 'GBP'")
+            
+            if 'photo' not in columns:
+                print("Adding photo column...")
+                cursor.execute("ALTER TABLE user ADD COLUMN photo VARCHAR(255)")
+            
+            if 'must_change_credentials' not in columns:
+                print("Adding must_change_credentials column...")
+                cursor.execute("ALTER TABLE user ADD COLUMN must_change_credentials BOOLEAN DEFAULT 0")
+            
+            if 'email_verified' not in columns:
+                print("Adding email_verified column...")
+                cursor.execute("ALTER TABLE user ADD COLUMN email_verified BOOLEAN DEFAULT 1")
+            
+            if 'email_verification_token' not in columns:
+                print("Adding email_verification_token column...")
+                cursor.execute("ALTER TABLE user ADD COLUMN email_verification_token VARCHAR(100)")
+            
+            if 'email_verification_sent_at' not in columns:
+                print("Adding email_verification_sent_at column...")
+                cursor.execute("ALTER TABLE user ADD COLUMN email_verification_sent_at DATETIME")
+            
+            if 'two_factor_enabled' not in columns:
+                print("Adding two_factor_enabled column...")
+                cursor.execute("ALTER TABLE user ADD COLUMN two_factor_enabled BOOLEAN DEFAULT 0")
+            
+            if 'two_factor_secret' not in columns:
+                print("Adding two_factor_secret column...")
+                cursor.execute("ALTER TABLE user ADD COLUMN two_factor_secret VARCHAR(32)")
+            
+            if 'backup_codes' not in columns:
+                print("Adding backup_codes column...")
+                cursor.execute("ALTER TABLE user ADD COLUMN backup_codes TEXT")
+            
+            if 'last_login' not in columns:
+                print("Adding last_login column...")
+                cursor.execute("ALTER TABLE user ADD COLUMN last_login DATETIME")
+            
+            if 'data_version' not in columns:
+                print("Adding user data_version column...")
+                cursor.execute("ALTER TABLE user ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0")
+            
+            cursor.execute("PRAGMA table_info(vehicle)")
+            vehicle_columns = [column[1] for column in cursor.fetchall()]
+            
+            if vehicle_columns and 'data_version' not in vehicle_columns:
+                print("Adding vehicle data_version column...")
+                cursor.execute("ALTER TABLE vehicle ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0")
+            
+            conn.commit()
+            print("Database migration completed!")
+            
+        except Exception as e:
+            print(f"Migration error: {e}")
+            conn.rollback()
+        finally:
+            conn.close()
+
+def ensure_indexes(engine):
+    # db.create_all() skips tables that already exist, so databases created
+    # before an index was declared on a model never receive it.
+    with engine.begin() as conn:
+        for name in RETIRED_INDEXES:
+            conn.exec_driver_sql(f'DROP INDEX IF EXISTS {name}')
+    inspector = inspect(engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                print(f"Creating index {index.name}...")
+                index.create(bind=engine)
+
+def stamp_version(engine):
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+def upgrade_database(db_path):
+    """Bring a database file that is not in use up to the current schema."""
+    migrate_database(db_path)
+    engine = create_engine(f'sqlite:///{db_path}')
+    try:
+        db.metadata.create_all(engine)
+        ensure_indexes(engine)
+        stamp_version(engine)
+    finally:
+        engine.dispose()
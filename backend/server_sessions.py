@@ -0,0 +1,183 @@
+from flask import current_app, session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+from flask_login import user_logged_in
+from itsdangerous import BadSignature, Signer
+from sqlalchemy.engine import make_url
+import math
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+# SESSION_BACKEND 'sqlite' (the default) or 'redis' keeps session data on
+# the server and only a signed random id in the cookie; 'cookie' is
+# Flask's signed-cookie session. A server-side session is written, and
+# the cookie sent, only when its contents change or when its expiry was
+# last slid forward more than SESSION_REFRESH_INTERVAL ago. Every other
+# response carries no Set-Cookie.
+
+SIGNER_SALT = 'server-session'
+SQLITE_BUSY_TIMEOUT = 15
+
+class ServerSession(SecureCookieSession):
+    def __init__(self, initial=None, sid=None, expires_at=None, stored=None):
+        super().__init__(initial)
+        self.sid = sid
+        self.expires_at = expires_at
+        # The serialized data as loaded, to tell whether it changed.
+        self.stored = stored
+        self.replaced_sid = None
+
+    def regenerate(self):
+        """Move the data to a new id when the session is next saved."""
+        if self.sid is not None:
+            self.replaced_sid, self.sid = self.sid, None
+
+class SQLiteStore:
+    """Sessions in their own SQLite file, left out of backups and restores."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        # One connection per thread, opened after any fork.
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS session (id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_session_expires_at ON session (expires_at)')
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return self._local.connection
+
+    def get(self, sid):
+        return self._connection().execute('SELECT data, expires_at FROM session WHERE id = ?', (sid,)).fetchone()
+
+    def set(self, sid, data, expires_at):
+        self._connection().execute(
+            'INSERT INTO session (id, data, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at',
+            (sid, data, expires_at)
+        )
+
+    def delete(self, sid):
+        self._connection().execute('DELETE FROM session WHERE id = ?', (sid,))
+
+    def prune(self):
+        return self._connection().execute('DELETE FROM session WHERE expires_at < ?', (time.time(),)).rowcount
+
+class RedisStore:
+    """Sessions in Redis, or anything speaking its protocol; needs the redis package
+    unless a client with get/set/delete is passed in."""
+
+    def __init__(self, url=None, prefix='session:', client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, sid):
+        value = self.client.get(self.prefix + sid)
+        if value is None:
+            return None
+        expires_at, _, data = value.decode().partition('\n')
+        return data, float(expires_at)
+
+    def set(self, sid, data, expires_at):
+        ttl = max(1, math.ceil(expires_at - time.time()))
+        self.client.set(self.prefix + sid, f'{expires_at}\n{data}', ex=ttl)
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+    def prune(self):
+        # Keys expire by themselves.
+        return 0
+
+class ServerSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=SIGNER_SALT)
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            stored = self.store.get(sid) if sid else None
+            if stored is not None and stored[1] > time.time():
+                data, expires_at = stored
+                return ServerSession(self.serializer.loads(data), sid, expires_at, data)
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+        if session.replaced_sid is not None:
+            self.store.delete(session.replaced_sid)
+
+        if not session:
+            if session.sid is not None or session.replaced_sid is not None:
+                if session.sid is not None:
+                    self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=self.get_cookie_secure(app),
+                                       httponly=self.get_cookie_httponly(app), samesite=self.get_cookie_samesite(app))
+                response.vary.add('Cookie')
+            return
+
+        now = time.time()
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        data = self.serializer.dumps(dict(session))
+        slide_due = session.sid is None or session.expires_at - now <= lifetime - app.config['SESSION_REFRESH_INTERVAL']
+        if data == session.stored and not slide_due:
+            return
+
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+        self.store.set(session.sid, data, now + lifetime)
+        response.vary.add('Cookie')
+        response.set_cookie(
+            name, self._signer(app).sign(session.sid).decode(),
+            expires=now + lifetime if session.permanent else None,
+            domain=domain, path=path, secure=self.get_cookie_secure(app),
+            httponly=self.get_cookie_httponly(app), samesite=self.get_cookie_samesite(app)
+        )
+
+def _store(app):
+    if app.config['SESSION_BACKEND'] == 'redis':
+        return RedisStore(app.config['SESSION_REDIS_URL'])
+    path = app.config['SESSION_DATABASE_PATH']
+    if not path:
+        database = make_url(app.config['SQLALCHEMY_DATABASE_URI']).database
+        path = os.path.join(os.path.dirname(os.path.abspath(database)), 'sessions.db')
+    return SQLiteStore(path)
+
+def init_app(app):
+    if app.config['SESSION_BACKEND'] != 'cookie':
+        app.session_interface = ServerSessionInterface(_store(app))
+
+def prune():
+    """Delete expired server-side sessions; returns how many went."""
+    interface = current_app.session_interface
+    return interface.store.prune() if isinstance(interface, ServerSessionInterface) else 0
+
+@user_logged_in.connect
+def _new_id_on_login(app, user, **extra):
+    # A session id known before login must not carry the login.
+    if isinstance(session._get_current_object(), ServerSession):
+        session.regenerate()
@@ -0,0 +1,34 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import os
+import sqlite3
+
+# Applied to every new SQLite connection, whichever engine opens it.
+#  journal_mode=WAL   readers no longer block the writer or each other
+#  busy_timeout       a writer waits for the lock instead of failing with
+#                     "database is locked" straight away
+#  synchronous=NORMAL safe with WAL; only the last commits before a power
+#                     loss can be lost, never consistency
+#  cache_size         negative means KiB, per connection
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('busy_timeout', int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 15000))),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -32000),
+    ('mmap_size', 256 * 1024 * 1024),
+    ('temp_store', 'MEMORY'),
+)
+
+# SQLITE_PROFILE=off keeps SQLite's defaults, for comparison runs.
+ENABLED = os.environ.get('SQLITE_PROFILE', 'on').lower() != 'off'
+
+@event.listens_for(Engine, 'connect')
+def apply_sqlite_profile(dbapi_connection, connection_record):
+    if not ENABLED or not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS:
+            cursor.execute(f'PRAGMA {name} = {value}')
+    finally:
+        cursor.close()
@@ -0,0 +1,111 @@
+from flask import abort, request, send_file
+from werkzeug.security import safe_join
+import brotli
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+FRONTEND_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend'))
+STATIC_DIR = os.path.join(FRONTEND_DIR, 'static')
+TEMPLATES_DIR = os.path.join(FRONTEND_DIR, 'templates')
+BUILD_DIR = os.path.join(FRONTEND_DIR, 'build')
+ASSETS_DIR = os.path.join(BUILD_DIR, 'assets')
+BUILD_TEMPLATES_DIR = os.path.join(BUILD_DIR, 'templates')
+MANIFEST_PATH = os.path.join(BUILD_DIR, 'manifest.json')
+
+ASSETS_URL = '/assets/'
+ASSET_EXTENSIONS = {'.js', '.css', '.svg', '.png', '.jpg', '.jpeg', '.gif', '.ico', '.webp', '.woff', '.woff2'}
+COMPRESSIBLE_EXTENSIONS = {'.js', '.css', '.svg'}
+# Below this a compressed variant saves less than its extra round of headers.
+MIN_COMPRESS_SIZE = 512
+# Served by preference order; each variant is only used if it was built.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+STATIC_REFERENCE = re.compile(r'/static/([\w./-]+)')
+
+def fingerprinted_name(relpath, data):
+    name, extension = os.path.splitext(relpath)
+    return f'{name}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+
+def _source_assets():
+    for root, dirs, files in os.walk(STATIC_DIR):
+        dirs.sort()
+        for name in sorted(files):
+            # Skips editor leftovers such as app.js.backup-clean.
+            if os.path.splitext(name)[1].lower() in ASSET_EXTENSIONS:
+                path = os.path.join(root, name)
+                yield path, os.path.relpath(path, STATIC_DIR).replace(os.sep, '/')
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def build():
+    """Fingerprint and precompress static assets and rewrite the templates.
+
+    The build is written next to the previous one and moved into place at
+    the end, so a running server never sees a half-written build.
+    """
+    staging_dir = f'{BUILD_DIR}.tmp'
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+    manifest = {}
+    for path, relpath in _source_assets():
+        with open(path, 'rb') as f:
+            data = f.read()
+        target = fingerprinted_name(relpath, data)
+        target_path = os.path.join(staging_dir, 'assets', target)
+        _write(target_path, data)
+        if os.path.splitext(relpath)[1].lower() in COMPRESSIBLE_EXTENSIONS and len(data) >= MIN_COMPRESS_SIZE:
+            _write(f'{target_path}.gz', gzip.compress(data, compresslevel=9, mtime=0))
+            _write(f'{target_path}.br', brotli.compress(data, quality=11))
+        manifest[relpath] = target
+
+    def rewrite(match):
+        target = manifest.get(match.group(1))
+        return f'{ASSETS_URL}{target}' if target else match.group(0)
+
+    for name in sorted(os.listdir(TEMPLATES_DIR)):
+        if name.endswith('.html'):
+            with open(os.path.join(TEMPLATES_DIR, name), encoding='utf-8') as f:
+                html = f.read()
+            _write(os.path.join(staging_dir, 'templates', name), STATIC_REFERENCE.sub(rewrite, html).encode('utf-8'))
+
+    _write(os.path.join(staging_dir, 'manifest.json'), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+
+    previous_dir = f'{BUILD_DIR}.old'
+    shutil.rmtree(previous_dir, ignore_errors=True)
+    if os.path.exists(BUILD_DIR):
+        os.rename(BUILD_DIR, previous_dir)
+    os.rename(staging_dir, BUILD_DIR)
+    shutil.rmtree(previous_dir, ignore_errors=True)
+    return manifest
+
+def is_built():
+    return os.path.exists(MANIFEST_PATH)
+
+def send_asset(filename):
+    """Serve a fingerprinted asset, picking a precompressed variant from Accept-Encoding."""
+    path = safe_join(ASSETS_DIR, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    for name, suffix in ENCODINGS:
+        if request.accept_encodings[name] and os.path.isfile(path + suffix):
+            path, encoding = path + suffix, name
+            break
+
+    response = send_file(path, mimetype=mimetype, conditional=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE
+    return response
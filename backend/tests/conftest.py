@@ -0,0 +1,43 @@
+import os
+import shutil
+import sys
+import tempfile
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bench_support
+
+# app reads its configuration once, at import, so the whole run shares one
+# throwaway directory; every test starts from empty tables.
+WORKDIR = tempfile.mkdtemp(prefix='masina-dock-tests-')
+app = bench_support.open_app(WORKDIR, TRUSTED_PROXY_HOPS='1')
+
+def pytest_unconfigure(config):
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+@pytest.fixture(name='app')
+def app_fixture():
+    return app
+
+@pytest.fixture
+def client():
+    from models import db
+    import identity
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+    identity.cache.clear()
+    client = app.test_client()
+    bench_support.register(client)
+    return client
+
+@pytest.fixture
+def vehicle_id(client):
+    return bench_support.add_vehicle(client)
+
+@pytest.fixture
+def uploads_dir():
+    return app.config['UPLOAD_FOLDER']
@@ -0,0 +1,69 @@
+import pytest
+from models import db, FuelRecord, ServiceRecord, VehicleStats
+import record_writes
+
+def fuel(odometer, cost=50.0):
+    return {'type': 'fuel_record', 'op': 'create', 'data': {
+        'date': '2024-01-01', 'odometer': odometer, 'fuel_amount': 40.0, 'cost': cost, 'unit': 'MPG'
+    }}
+
+@pytest.fixture
+def fail_at(monkeypatch):
+    """fail_at(odometer, error): creating a fill-up there raises error once its economy and stats writes are done."""
+    fuel_record_added = record_writes.vehicle_stats.fuel_record_added
+
+    def install(odometer, error):
+        def failing(vehicle, record):
+            fuel_record_added(vehicle, record)
+            if record.odometer == odometer:
+                raise error
+        monkeypatch.setattr(record_writes.vehicle_stats, 'fuel_record_added', failing)
+    return install
+
+def test_failed_item_rolls_back_alone(app, client, vehicle_id, fail_at):
+    fail_at(2000, ValueError('rejected after writing'))
+    response = client.post(f'/api/vehicles/{vehicle_id}/batch', json={'operations': [
+        fuel(1000, cost=10.0),
+        fuel(3000, cost=30.0),
+        # Inserted between the two: recomputes 3000's distance and adds to
+        # the stats before failing.
+        fuel(2000, cost=20.0),
+        {'type': 'service_record', 'op': 'create', 'data': {
+            'date': '2024-02-01', 'odometer': 3100, 'description': 'Oil', 'cost': 5.0, 'category': 'Maintenance'
+        }},
+    ]})
+    assert response.status_code == 200
+    statuses = [(result['index'], result['status']) for result in response.get_json()['results']]
+    assert statuses == [(0, 201), (1, 201), (2, 400), (3, 201)]
+    assert response.get_json()['results'][2]['error'] == 'Invalid data: rejected after writing'
+
+    with app.app_context():
+        records = FuelRecord.query.filter_by(vehicle_id=vehicle_id).order_by(FuelRecord.odometer).all()
+        assert [(r.odometer, r.distance, r.fuel_economy) for r in records] == [(1000, 0, None), (3000, 2000, 50.0)]
+        assert ServiceRecord.query.filter_by(vehicle_id=vehicle_id).count() == 1
+
+        stats = db.session.get(VehicleStats, vehicle_id)
+        assert (stats.fuel_count, stats.fuel_cost, stats.fuel_volume) == (2, 40.0, 80.0)
+        assert (stats.service_count, stats.maintenance_cost) == (1, 5.0)
+        assert stats.fuel_max_odometer == 3000
+
+def test_batch_of_only_failures_writes_nothing(app, client, vehicle_id, fail_at):
+    fail_at(2000, ValueError('rejected after writing'))
+    response = client.post(f'/api/vehicles/{vehicle_id}/batch', json={'operations': [
+        fuel(2000),
+        {'type': 'fuel_record', 'op': 'update', 'id': 999, 'data': {}},
+    ]})
+    assert [result['status'] for result in response.get_json()['results']] == [400, 404]
+    with app.app_context():
+        assert FuelRecord.query.filter_by(vehicle_id=vehicle_id).count() == 0
+        stats = db.session.get(VehicleStats, vehicle_id)
+        assert stats is None or stats.fuel_count == 0
+
+def test_unexpected_error_discards_the_whole_batch(app, client, vehicle_id, fail_at):
+    # Items that succeeded are only released to the batch's transaction;
+    # without BEGIN, pysqlite would have committed each on release.
+    fail_at(2000, RuntimeError('unexpected'))
+    response = client.post(f'/api/vehicles/{vehicle_id}/batch', json={'operations': [fuel(1000), fuel(2000)]})
+    assert response.status_code == 500
+    with app.app_context():
+        assert FuelRecord.query.filter_by(vehicle_id=vehicle_id).count() == 0
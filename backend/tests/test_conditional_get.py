@@ -0,0 +1,27 @@
+from models import db, VehicleStats
+
+def test_summary_etag_survives_lazy_stats(app, client, vehicle_id):
+    client.post(f'/api/vehicles/{vehicle_id}/fuel-records', json={
+        'date': '2024-01-01', 'odometer': 1000, 'fuel_amount': 40.0, 'cost': 50.0, 'unit': 'MPG'
+    })
+    # As for a vehicle whose rollup was never built.
+    with app.app_context():
+        db.session.delete(db.session.get(VehicleStats, vehicle_id))
+        db.session.commit()
+
+    first = client.get(f'/api/vehicles/{vehicle_id}/summary')
+    assert first.status_code == 200
+    with app.app_context():
+        assert db.session.get(VehicleStats, vehicle_id) is not None
+
+    second = client.get(f'/api/vehicles/{vehicle_id}/summary', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 304
+
+def test_record_write_changes_summary_etag(client, vehicle_id):
+    etag = client.get(f'/api/vehicles/{vehicle_id}/summary').headers['ETag']
+    client.post(f'/api/vehicles/{vehicle_id}/fuel-records', json={
+        'date': '2024-01-01', 'odometer': 1000, 'fuel_amount': 40.0, 'cost': 50.0, 'unit': 'MPG'
+    })
+    response = client.get(f'/api/vehicles/{vehicle_id}/summary', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['fuel_count'] == 1
@@ -0,0 +1,119 @@
+import os
+import pytest
+from werkzeug.http import http_date
+from file_delivery import MAX_RANGES, _resolve_ranges, parse_ranges
+
+BODY = bytes(range(256)) * 4
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-99', [(0, 100)]),
+    ('bytes=100-', [(100, None)]),
+    ('bytes=-50', [(-50, None)]),
+    ('bytes=0-0,-1', [(0, 1), (-1, None)]),
+    ('bytes= 10-19 , 0-4', [(10, 20), (0, 5)]),
+    ('BYTES=0-1', [(0, 2)]),
+    ('bytes=0-9,5-14', [(0, 10), (5, 15)]),
+])
+def test_parse_ranges(header, expected):
+    assert parse_ranges(header) == expected
+
+@pytest.mark.parametrize('header', [
+    'bytes=', 'bytes=-', 'bytes=5', 'bytes=10-5', 'bytes=-0', 'bytes=a-b',
+    'bytes=0-1,', 'bytes=--5', 'items=0-1', '0-1',
+])
+def test_parse_ranges_rejects_malformed(header):
+    assert parse_ranges(header) is None
+
+def test_resolve_ranges_clamps_and_merges():
+    assert _resolve_ranges([(0, 10), (5, 15), (15, 20)], 100) == [[0, 20]]
+    assert _resolve_ranges([(90, 200)], 100) == [[90, 100]]
+    assert _resolve_ranges([(-30, None)], 20) == [[0, 20]]
+    assert _resolve_ranges([(50, None), (0, 10)], 60) == [[0, 10], [50, 60]]
+    assert _resolve_ranges([(100, None), (200, 300)], 100) == []
+
+@pytest.fixture
+def upload(client, uploads_dir):
+    relpath = 'tests/range.bin'
+    os.makedirs(os.path.join(uploads_dir, 'tests'), exist_ok=True)
+    with open(os.path.join(uploads_dir, relpath), 'wb') as f:
+        f.write(BODY)
+    return f'/uploads/{relpath}'
+
+def test_single_range(client, upload):
+    response = client.get(upload, headers={'Range': 'bytes=10-19'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 10-19/{len(BODY)}'
+    assert response.data == BODY[10:20]
+
+def test_suffix_range(client, upload):
+    response = client.get(upload, headers={'Range': 'bytes=-16'})
+    assert response.status_code == 206
+    assert response.data == BODY[-16:]
+
+def test_multiple_ranges(client, upload):
+    response = client.get(upload, headers={'Range': 'bytes=0-3,100-103'})
+    assert response.status_code == 206
+    content_type = response.headers['Content-Type']
+    assert content_type.startswith('multipart/byteranges; boundary=')
+    boundary = content_type.split('boundary=')[1]
+    assert int(response.headers['Content-Length']) == len(response.data)
+
+    parts = response.data.split(f'--{boundary}'.encode())
+    assert parts[0] == b'' and parts[-1] == b'--\r\n'
+    bodies = []
+    for part in parts[1:-1]:
+        head, _, body = part.partition(b'\r\n\r\n')
+        assert body.endswith(b'\r\n')
+        bodies.append((head.split(b'Content-Range: ')[1], body[:-2]))
+    assert bodies == [
+        (f'bytes 0-3/{len(BODY)}'.encode(), BODY[0:4]),
+        (f'bytes 100-103/{len(BODY)}'.encode(), BODY[100:104]),
+    ]
+
+def test_overlapping_ranges_are_one_part(client, upload):
+    response = client.get(upload, headers={'Range': 'bytes=0-9,5-14'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 0-14/{len(BODY)}'
+    assert response.data == BODY[:15]
+
+def test_unsatisfiable_range(client, upload):
+    response = client.get(upload, headers={'Range': f'bytes={len(BODY)}-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(BODY)}'
+    assert response.data == b''
+
+@pytest.mark.parametrize('header', ['bytes=5-1', 'lines=0-1', ','.join(['bytes=0-0'] + ['2-2'] * MAX_RANGES)])
+def test_ignored_range_sends_whole_file(client, upload, header):
+    response = client.get(upload, headers={'Range': header})
+    assert response.status_code == 200
+    assert response.data == BODY
+
+def test_if_range_etag(client, upload):
+    etag = client.get(upload).headers['ETag']
+    matching = client.get(upload, headers={'Range': 'bytes=0-9', 'If-Range': etag})
+    assert matching.status_code == 206
+    assert matching.data == BODY[:10]
+
+    stale = client.get(upload, headers={'Range': 'bytes=0-9', 'If-Range': '"something-else"'})
+    assert stale.status_code == 200
+    assert stale.data == BODY
+
+def test_if_range_date(client, upload):
+    last_modified = client.get(upload).headers['Last-Modified']
+    assert client.get(upload, headers={'Range': 'bytes=0-9', 'If-Range': last_modified}).status_code == 206
+    assert client.get(upload, headers={'Range': 'bytes=0-9', 'If-Range': http_date(0)}).status_code == 200
+
+def test_conditional_get_wins_over_range(client, upload):
+    etag = client.get(upload).headers['ETag']
+    response = client.get(upload, headers={'Range': 'bytes=0-9', 'If-None-Match': etag})
+    assert response.status_code == 304
+
+@pytest.mark.parametrize('relpath, cache_control', [
+    ('objects/ab/cd/abcd.pdf', 'private, max-age=31536000, immutable'),
+    ('variants/objects/ab/cd/abcd-card.webp', 'public, max-age=31536000, immutable'),
+])
+def test_only_photo_variants_are_publicly_cacheable(client, uploads_dir, relpath, cache_control):
+    os.makedirs(os.path.dirname(os.path.join(uploads_dir, relpath)), exist_ok=True)
+    with open(os.path.join(uploads_dir, relpath), 'wb') as f:
+        f.write(BODY)
+    assert client.get(f'/uploads/{relpath}').headers['Cache-Control'] == cache_control
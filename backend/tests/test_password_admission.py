@@ -0,0 +1,37 @@
+import threading
+import bench_support
+import password_admission
+
+def attempt(client, address, username='nobody'):
+    return client.post(
+        '/api/auth/login', json={'username': username, 'password': 'wrong'},
+        headers={'X-Forwarded-For': address}
+    )
+
+def test_forwarded_clients_get_their_own_bucket(app, client):
+    burst = app.config['PASSWORD_IP_BURST']
+    # Spread over usernames so only the IP bucket runs dry.
+    for index in range(burst):
+        assert attempt(client, '203.0.113.1', f'nobody{index}').status_code == 401
+
+    assert attempt(client, '203.0.113.1', 'someone-else').status_code == 429
+    assert attempt(client, '203.0.113.2', 'someone-else').status_code == 401
+
+def test_login_waits_for_a_busy_hashing_slot(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_SLOTS', 1)
+    held, release = threading.Event(), threading.Event()
+
+    def hold_slot():
+        with app.app_context(), password_admission.hashing_slot():
+            held.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold_slot)
+    holder.start()
+    held.wait(5)
+    threading.Timer(0.3, release.set).start()
+    try:
+        assert bench_support.login(client).status_code == 200
+    finally:
+        release.set()
+        holder.join()
@@ -0,0 +1,29 @@
+from datetime import date, timedelta
+import pytest
+
+def add_reminder(client, vehicle_id, **fields):
+    response = client.post(f'/api/vehicles/{vehicle_id}/reminders', json=dict({'description': 'Oil change'}, **fields))
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+@pytest.mark.parametrize('interval_value', ['abc', 0, -5, 1.5, True, [30]])
+def test_completing_with_a_bad_interval_is_rejected(client, vehicle_id, interval_value):
+    reminder_id = add_reminder(client, vehicle_id)
+    url = f'/api/vehicles/{vehicle_id}/reminders/{reminder_id}'
+
+    response = client.put(url, json={'recurring': True, 'interval_type': 'days', 'interval_value': interval_value, 'completed': True})
+    assert response.status_code == 400
+    assert client.get(url).get_json()['due_date'] is None
+
+@pytest.mark.parametrize('interval_value', ['abc', 0])
+def test_creating_with_a_bad_interval_is_rejected(client, vehicle_id, interval_value):
+    response = client.post(f'/api/vehicles/{vehicle_id}/reminders', json={'description': 'Oil change', 'recurring': True, 'interval_type': 'days', 'interval_value': interval_value})
+    assert response.status_code == 400
+
+def test_completing_a_recurring_reminder_moves_it_on(client, vehicle_id):
+    reminder_id = add_reminder(client, vehicle_id)
+    url = f'/api/vehicles/{vehicle_id}/reminders/{reminder_id}'
+
+    response = client.put(url, json={'recurring': True, 'interval_type': 'days', 'interval_value': '30', 'completed': True})
+    assert response.status_code == 200
+    assert client.get(url).get_json()['due_date'] == (date.today() + timedelta(days=30)).isoformat()
@@ -0,0 +1,82 @@
+import io
+import os
+import pytest
+import restore
+
+def write(uploads_dir, relpath, data):
+    path = os.path.join(uploads_dir, relpath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def read(uploads_dir, relpath):
+    with open(os.path.join(uploads_dir, relpath), 'rb') as f:
+        return f.read()
+
+def trees(uploads_dir):
+    parent = os.path.dirname(uploads_dir)
+    return sorted(name for name in os.listdir(parent) if name.startswith(restore.TREE_PREFIX))
+
+@pytest.fixture
+def backup(client, uploads_dir):
+    restore.ensure_uploads_tree(uploads_dir)
+    restore.remove_stale_trees(uploads_dir)
+    write(uploads_dir, 'attachments/kept.txt', b'from the backup')
+    response = client.get('/api/backup/create')
+    assert response.status_code == 200
+    data = response.data
+
+    write(uploads_dir, 'attachments/kept.txt', b'changed since')
+    write(uploads_dir, 'attachments/added.txt', b'not in the backup')
+    return data
+
+def post_restore(client, data):
+    return client.post('/api/backup/restore', data={'backup': (io.BytesIO(data), 'backup.zip')})
+
+def test_restore_swaps_the_whole_tree(client, uploads_dir, backup):
+    previous_tree = os.readlink(uploads_dir)
+
+    assert post_restore(client, backup).status_code == 200
+    assert os.readlink(uploads_dir) != previous_tree
+    assert trees(uploads_dir) == [os.readlink(uploads_dir)]
+    assert read(uploads_dir, 'attachments/kept.txt') == b'from the backup'
+    assert not os.path.exists(os.path.join(uploads_dir, 'attachments/added.txt'))
+
+def test_failed_restore_leaves_uploads_alone(client, uploads_dir, backup, monkeypatch):
+    def fail(*args):
+        raise restore.RestoreError('Backup database failed the integrity check')
+    monkeypatch.setattr(restore, 'validate_database', fail)
+    live_tree = os.readlink(uploads_dir)
+
+    assert post_restore(client, backup).status_code == 400
+    assert os.readlink(uploads_dir) == live_tree
+    assert trees(uploads_dir) == [live_tree]
+    assert read(uploads_dir, 'attachments/added.txt') == b'not in the backup'
+
+def test_interrupted_restore_is_cleaned_up(uploads_dir):
+    restore.ensure_uploads_tree(uploads_dir)
+    live_tree = os.readlink(uploads_dir)
+    parent = os.path.dirname(uploads_dir)
+    os.makedirs(os.path.join(parent, f'{restore.TREE_PREFIX}abandoned', 'attachments'))
+    os.symlink(f'{restore.TREE_PREFIX}abandoned', os.path.join(parent, f'{restore.STAGING_PREFIX}abandoned'))
+
+    assert restore.remove_stale_trees(uploads_dir) == 1
+    assert trees(uploads_dir) == [live_tree]
+    assert not os.path.lexists(os.path.join(parent, f'{restore.STAGING_PREFIX}abandoned'))
+
+def test_legacy_volume_is_moved_into_a_tree(tmp_path, monkeypatch):
+    volume = str(tmp_path / 'uploads')
+    monkeypatch.setattr(restore, 'LEGACY_UPLOADS_VOLUME', volume)
+    write(volume, 'objects/ab/photo.jpg', b'photo')
+    write(volume, '.incoming/partial', b'')
+    # Interrupted earlier: one entry already moved, the link not yet made.
+    write(volume, f'{restore.LEGACY_TREE}/attachments/invoice.pdf', b'invoice')
+    uploads_dir = os.path.join(volume, 'current')
+
+    restore.ensure_uploads_tree(uploads_dir)
+    restore.ensure_uploads_tree(uploads_dir)
+    assert os.readlink(uploads_dir) == restore.LEGACY_TREE
+    assert sorted(os.listdir(volume)) == [restore.LEGACY_TREE, 'current']
+    assert read(uploads_dir, 'objects/ab/photo.jpg') == b'photo'
+    assert read(uploads_dir, 'attachments/invoice.pdf') == b'invoice'
+    assert os.path.exists(os.path.join(uploads_dir, '.incoming/partial'))
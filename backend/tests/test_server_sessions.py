@@ -0,0 +1,68 @@
+import time
+import pytest
+import bench_support
+import server_sessions
+
+class FakeRedis:
+    """The part of redis.Redis that RedisStore uses, in a dict."""
+
+    def __init__(self):
+        self.values, self.ttls, self.writes = {}, {}, 0
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key], self.ttls[key] = value.encode(), ex
+        self.writes += 1
+
+    def delete(self, key):
+        self.values.pop(key, None)
+        self.ttls.pop(key, None)
+
+@pytest.fixture
+def redis(app, client, monkeypatch):
+    fake = FakeRedis()
+    store = server_sessions.RedisStore(client=fake)
+    monkeypatch.setattr(app, 'session_interface', server_sessions.ServerSessionInterface(store))
+    return fake
+
+def session_cookie(app, response):
+    name = app.config['SESSION_COOKIE_NAME']
+    return [value for value in response.headers.getlist('Set-Cookie') if value.startswith(f'{name}=')]
+
+def test_login_rotates_the_session_id(app, redis):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['theme'] = 'dark'
+    [anonymous] = redis.values
+
+    bench_support.login(client)
+    [logged_in] = redis.values
+    assert logged_in != anonymous
+    with client.session_transaction() as session:
+        assert session['theme'] == 'dark'
+
+def test_session_is_written_only_when_it_changes(app, redis):
+    client = app.test_client()
+    bench_support.login(client)
+    writes = redis.writes
+
+    response = client.get('/api/settings')
+    assert response.status_code == 200
+    assert session_cookie(app, response) == []
+    assert redis.writes == writes
+
+def test_expiry_slides_once_the_refresh_interval_has_passed(app, redis, monkeypatch):
+    client = app.test_client()
+    bench_support.login(client)
+    [key] = redis.values
+    expires_at = float(redis.values[key].decode().partition('\n')[0])
+
+    later = time.time() + app.config['SESSION_REFRESH_INTERVAL'] + 1
+    monkeypatch.setattr(server_sessions.time, 'time', lambda: later)
+    response = client.get('/api/settings')
+    assert response.status_code == 200
+    assert len(session_cookie(app, response)) == 1
+    assert float(redis.values[key].decode().partition('\n')[0]) > expires_at
+    assert redis.ttls[key] == pytest.approx(app.permanent_session_lifetime.total_seconds(), abs=2)
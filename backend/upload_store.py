@@ -0,0 +1,275 @@
+from models import db, UploadObject, User, Vehicle, ServiceRecord
+from flask import current_app
+from sqlalchemy import event, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history, PASSIVE_NO_INITIALIZE
+from collections import Counter
+from datetime import datetime, timedelta
+import hashlib
+import os
+import secrets
+import time
+import images
+import jobs
+import data_versions
+
+# Uploads are stored once per content under objects/ab/cd/<sha256><ext>,
+# so the path doubles as an immutable URL. UploadObject.ref_count tracks
+# the columns below and is kept up to date on every flush; objects nobody
+# references are removed by collect_garbage() (maintain_uploads.py
+# --collect-garbage).
+
+OBJECTS_DIR = 'objects'
+# Dot-prefixed, so backups leave half-written uploads out.
+INCOMING_DIR = '.incoming'
+UPLOADS_URL = '/uploads/'
+CHUNK_SIZE = 1024 * 1024
+GARBAGE_GRACE = timedelta(days=1)
+EXTENSION_ALIASES = {'.jpeg': '.jpg'}
+
+# (model, column, whether the column holds a /uploads/ URL or a bare path)
+REFERENCES = (
+    (Vehicle, 'photo', True),
+    (User, 'photo', True),
+    (ServiceRecord, 'document_path', False),
+)
+
+PUBLIC_IMMUTABLE = 'public, max-age=31536000, immutable'
+PRIVATE_IMMUTABLE = 'private, max-age=31536000, immutable'
+
+def object_path(digest, extension):
+    return f'{OBJECTS_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+def is_immutable(relpath):
+    """Whether a path under the uploads folder never changes content."""
+    return relpath.startswith((f'{OBJECTS_DIR}/', f'{images.VARIANTS_DIR}/{OBJECTS_DIR}/'))
+
+def cache_control(relpath):
+    """Cache-Control for serving relpath, or None to leave it to revalidation.
+
+    Objects are private: the same store holds attachments such as invoices
+    and registration documents, which shared caches must not keep. Only
+    variants, which are made from photos alone, may be cached publicly.
+    """
+    if not is_immutable(relpath):
+        return None
+    return PUBLIC_IMMUTABLE if relpath.startswith(f'{images.VARIANTS_DIR}/') else PRIVATE_IMMUTABLE
+
+def reference_path(value):
+    """The store path a column value points at, or None for legacy files."""
+    if not value:
+        return None
+    if value.startswith(UPLOADS_URL):
+        value = value[len(UPLOADS_URL):]
+    return value if value.startswith(f'{OBJECTS_DIR}/') else None
+
+def _touch(path, size):
+    now = datetime.utcnow()
+    touched = db.session.execute(
+        update(UploadObject).where(UploadObject.path == path).values(last_uploaded_at=now)
+    ).rowcount
+    if touched:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(UploadObject(path=path, size=size, last_uploaded_at=now))
+    except IntegrityError:
+        # Another worker stored the same content first.
+        db.session.execute(update(UploadObject).where(UploadObject.path == path).values(last_uploaded_at=now))
+
+def store(stream, uploads_dir, filename):
+    """Save an uploaded stream into the store; the caller commits.
+
+    Returns (path, created); created is False when identical content was
+    already stored, in which case nothing is written.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    extension = EXTENSION_ALIASES.get(extension, extension)
+
+    incoming_dir = os.path.join(uploads_dir, INCOMING_DIR)
+    os.makedirs(incoming_dir, exist_ok=True)
+    temp_path = os.path.join(incoming_dir, secrets.token_hex(8))
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, 'wb') as f:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+
+        path = object_path(digest.hexdigest(), extension)
+        target = os.path.join(uploads_dir, path)
+        created = not os.path.exists(target)
+        if created:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, target)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    _touch(path, size)
+    return path, created
+
+def discard(uploads_dir, path):
+    """Remove an object's file and derived photo variants (not its row)."""
+    images.remove_variants(uploads_dir, path)
+    try:
+        os.remove(os.path.join(uploads_dir, path))
+    except FileNotFoundError:
+        pass
+
+def bump_photo_references(relpaths):
+    """Bump the data versions that show these photos, so cached responses pick up new variants."""
+    urls = [f'{UPLOADS_URL}{relpath}' for relpath in relpaths]
+    for start in range(0, len(urls), 500):
+        chunk = urls[start:start + 500]
+        vehicles = db.session.query(Vehicle.id, Vehicle.user_id).filter(Vehicle.photo.in_(chunk)).all()
+        user_ids = {id for id, in db.session.query(User.id).filter(User.photo.in_(chunk))}
+        user_ids.update(user_id for _, user_id in vehicles)
+        data_versions.bump(db.session, [id for id, _ in vehicles], user_ids)
+
+@jobs.handler('image_variants')
+def image_variants_job(path):
+    try:
+        variants = images.generate_variants(current_app.config['UPLOAD_FOLDER'], path)
+    except images.ImageError as e:
+        raise jobs.JobFailed(str(e))
+    bump_photo_references([path])
+    db.session.commit()
+    return {'photo_url': f'{UPLOADS_URL}{path}', 'photo_variants': variants}
+
+@event.listens_for(Session, 'before_flush')
+def count_references(session, flush_context, instances):
+    deltas = Counter()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        for model, attr, _ in REFERENCES:
+            if not isinstance(obj, model):
+                continue
+            if obj in session.deleted:
+                history = get_history(obj, attr)
+                removed, added = history.deleted or history.unchanged, ()
+            else:
+                history = get_history(obj, attr, passive=PASSIVE_NO_INITIALIZE)
+                removed, added = history.deleted or (), history.added or ()
+            for value in removed:
+                deltas[reference_path(value)] -= 1
+            for value in added:
+                deltas[reference_path(value)] += 1
+
+    deltas.pop(None, None)
+    table = UploadObject.__table__
+    for path, delta in deltas.items():
+        if delta:
+            session.connection().execute(
+                update(table).where(table.c.path == path).values(ref_count=table.c.ref_count + delta)
+            )
+
+def _reference_counts():
+    counts = Counter()
+    for model, attr, _ in REFERENCES:
+        column = getattr(model, attr)
+        for value, count in db.session.query(column, func.count()).filter(column.isnot(None)).group_by(column):
+            path = reference_path(value)
+            if path:
+                counts[path] += count
+    return counts
+
+def rebuild_ref_counts(uploads_dir):
+    """Recount references from the referencing columns; returns the number of objects in use.
+
+    Also registers referenced objects that are on disk but have no row,
+    e.g. after restoring a database from before the store existed.
+    """
+    counts = _reference_counts()
+    db.session.execute(update(UploadObject).values(ref_count=0))
+    known = {path for path, in db.session.query(UploadObject.path)}
+    for path, count in counts.items():
+        if path in known:
+            db.session.execute(update(UploadObject).where(UploadObject.path == path).values(ref_count=count))
+        elif os.path.isfile(os.path.join(uploads_dir, path)):
+            db.session.add(UploadObject(path=path, size=os.path.getsize(os.path.join(uploads_dir, path)), ref_count=count))
+    return len(counts)
+
+def _stray_files(uploads_dir, known, grace):
+    cutoff = time.time() - grace.total_seconds()
+    for directory in (os.path.join(uploads_dir, OBJECTS_DIR), os.path.join(uploads_dir, INCOMING_DIR)):
+        for root, _, files in os.walk(directory):
+            for name in files:
+                full_path = os.path.join(root, name)
+                relpath = os.path.relpath(full_path, uploads_dir).replace(os.sep, '/')
+                if relpath not in known and os.path.getmtime(full_path) < cutoff:
+                    yield relpath
+
+def collect_garbage(uploads_dir, grace=GARBAGE_GRACE):
+    """Delete unreferenced objects not uploaded within grace, plus files without a row.
+
+    A file any referencing column still points at is kept whatever its row
+    says, or when it has none. Meant to run while no worker is serving
+    uploads, before gunicorn starts (maintain_uploads.py --collect-garbage).
+    Returns the number of files removed.
+    """
+    cutoff = datetime.utcnow() - grace
+    referenced = set(_reference_counts())
+    removed = 0
+    garbage = UploadObject.query.filter(UploadObject.ref_count <= 0, UploadObject.last_uploaded_at < cutoff).all()
+    for upload in garbage:
+        if upload.path in referenced:
+            continue
+        discard(uploads_dir, upload.path)
+        db.session.delete(upload)
+        removed += 1
+
+    known = {path for path, in db.session.query(UploadObject.path)} | referenced
+    for relpath in list(_stray_files(uploads_dir, known, grace)):
+        discard(uploads_dir, relpath)
+        removed += 1
+    db.session.commit()
+    return removed
+
+def _legacy_file(uploads_dir, value, is_url):
+    relpath = value[len(UPLOADS_URL):] if is_url and value.startswith(UPLOADS_URL) else value
+    full_path = os.path.normpath(os.path.join(uploads_dir, relpath))
+    if not full_path.startswith(os.path.join(os.path.normpath(uploads_dir), '')) or not os.path.isfile(full_path):
+        return None
+    return full_path
+
+def adopt_legacy_files(uploads_dir):
+    """Move files uploaded before the store existed into it and repoint their references.
+
+    Returns (adopted, missing): files moved, and references whose file is gone.
+    """
+    adopted, missing = {}, []
+    for model, attr, is_url in REFERENCES:
+        column = getattr(model, attr)
+        for record in model.query.filter(column.isnot(None), column != ''):
+            value = getattr(record, attr)
+            if reference_path(value):
+                continue
+            full_path = _legacy_file(uploads_dir, value, is_url)
+            if full_path is None:
+                missing.append(value)
+                continue
+            if full_path not in adopted:
+                with open(full_path, 'rb') as f:
+                    path, _ = store(f, uploads_dir, full_path)
+                if is_url:
+                    try:
+                        images.generate_variants(uploads_dir, path)
+                    except images.ImageError:
+                        pass
+                adopted[full_path] = path
+            path = adopted[full_path]
+            setattr(record, attr, f'{UPLOADS_URL}{path}' if is_url else path)
+    db.session.commit()
+
+    # Only once the references are committed.
+    for full_path in adopted:
+        images.remove_variants(uploads_dir, os.path.relpath(full_path, uploads_dir))
+        os.remove(full_path)
+    return len(adopted), missing
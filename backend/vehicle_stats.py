@@ -0,0 +1,162 @@
+from models import db, Vehicle, VehicleStats, ServiceRecord, FuelRecord
+from sqlalchemy import func, select, update
+from datetime import datetime
+import data_versions
+
+# Service categories with their own running total; anything else is "other".
+CATEGORY_COLUMNS = {
+    'Maintenance': 'maintenance_cost',
+    'Repair': 'repair_cost',
+    'Inspection': 'inspection_cost',
+    'Upgrade': 'upgrade_cost',
+    'Tax': 'tax_cost',
+}
+
+SUM_COLUMNS = (
+    'service_count', 'service_cost', 'maintenance_cost', 'repair_cost', 'inspection_cost',
+    'upgrade_cost', 'tax_cost', 'other_cost', 'fuel_count', 'fuel_cost', 'fuel_volume'
+)
+
+def category_column(category):
+    return CATEGORY_COLUMNS.get(category, 'other_cost')
+
+def service_snapshot(record):
+    return {'cost': record.cost or 0.0, 'category': record.category}
+
+def fuel_snapshot(record):
+    return {'cost': record.cost or 0.0, 'fuel_amount': record.fuel_amount or 0.0}
+
+def _service_contribution(snapshot):
+    return {
+        'service_count': 1,
+        'service_cost': snapshot['cost'],
+        category_column(snapshot['category']): snapshot['cost'],
+    }
+
+def _fuel_contribution(snapshot):
+    return {
+        'fuel_count': 1,
+        'fuel_cost': snapshot['cost'],
+        'fuel_volume': snapshot['fuel_amount'],
+    }
+
+def _difference(before, after):
+    deltas = dict(after)
+    for column, amount in before.items():
+        deltas[column] = deltas.get(column, 0) - amount
+    return {column: amount for column, amount in deltas.items() if amount}
+
+def _extremes(vehicle_id):
+    # Min/max/last values cannot be maintained by deltas once a row is edited
+    # or deleted, but each is a single probe of a (vehicle_id, ...) index.
+    service_max = select(func.max(ServiceRecord.odometer)).where(ServiceRecord.vehicle_id == vehicle_id).scalar_subquery()
+    fuel_max = select(func.max(FuelRecord.odometer)).where(FuelRecord.vehicle_id == vehicle_id).scalar_subquery()
+    return {
+        'fuel_min_odometer': select(func.min(FuelRecord.odometer)).where(FuelRecord.vehicle_id == vehicle_id).scalar_subquery(),
+        'fuel_max_odometer': fuel_max,
+        'max_odometer': func.max(func.coalesce(service_max, 0), func.coalesce(fuel_max, 0)),
+        'last_service_date': select(func.max(ServiceRecord.date)).where(ServiceRecord.vehicle_id == vehicle_id).scalar_subquery(),
+        'last_fuel_date': select(func.max(FuelRecord.date)).where(FuelRecord.vehicle_id == vehicle_id).scalar_subquery(),
+    }
+
+def _sync_odometer(vehicle, stats):
+    if stats.max_odometer and stats.max_odometer > (vehicle.odometer or 0):
+        vehicle.odometer = stats.max_odometer
+
+def rebuild_vehicle_stats(vehicle):
+    """Recompute the rollup for one vehicle from its raw records."""
+    db.session.flush()
+    stats = db.session.get(VehicleStats, vehicle.id)
+    if stats is None:
+        stats = VehicleStats(vehicle_id=vehicle.id)
+        db.session.add(stats)
+
+    for column in SUM_COLUMNS:
+        setattr(stats, column, 0)
+
+    service_rows = db.session.query(
+        ServiceRecord.category,
+        func.count(ServiceRecord.id),
+        func.coalesce(func.sum(ServiceRecord.cost), 0.0)
+    ).filter(ServiceRecord.vehicle_id == vehicle.id).group_by(ServiceRecord.category).all()
+    for category, count, cost in service_rows:
+        stats.service_count += count
+        stats.service_cost += cost
+        column = category_column(category)
+        setattr(stats, column, getattr(stats, column) + cost)
+
+    fuel_count, fuel_cost, fuel_volume = db.session.query(
+        func.count(FuelRecord.id),
+        func.coalesce(func.sum(FuelRecord.cost), 0.0),
+        func.coalesce(func.sum(FuelRecord.fuel_amount), 0.0)
+    ).filter(FuelRecord.vehicle_id == vehicle.id).one()
+    stats.fuel_count = fuel_count
+    stats.fuel_cost = fuel_cost
+    stats.fuel_volume = fuel_volume
+
+    extremes = db.session.query(*[value.label(name) for name, value in _extremes(vehicle.id).items()]).one()
+    for name, value in extremes._mapping.items():
+        setattr(stats, name, value)
+    stats.updated_at = datetime.utcnow()
+
+    _sync_odometer(vehicle, stats)
+    return stats
+
+def rebuild_all_stats():
+    vehicles = Vehicle.query.all()
+    for vehicle in vehicles:
+        rebuild_vehicle_stats(vehicle)
+    # The rebuilt totals may differ from what summaries were served with.
+    data_versions.bump(db.session, [vehicle.id for vehicle in vehicles])
+    return len(vehicles)
+
+def rebuild_missing_stats():
+    vehicles = Vehicle.query.outerjoin(VehicleStats).filter(VehicleStats.vehicle_id.is_(None)).all()
+    for vehicle in vehicles:
+        rebuild_vehicle_stats(vehicle)
+    return len(vehicles)
+
+def get_vehicle_stats(vehicle):
+    stats = db.session.get(VehicleStats, vehicle.id)
+    if stats is None:
+        stats = rebuild_vehicle_stats(vehicle)
+        db.session.commit()
+    return stats
+
+def _apply(vehicle, deltas):
+    # Runs inside the caller's transaction, after its pending record changes
+    # are flushed. Sums move by SQL-side increments so concurrent writers
+    # cannot overwrite each other's totals.
+    db.session.flush()
+    stats = db.session.get(VehicleStats, vehicle.id)
+    if stats is None:
+        rebuild_vehicle_stats(vehicle)
+        return
+
+    values = {column: getattr(VehicleStats, column) + amount for column, amount in deltas.items()}
+    values.update(_extremes(vehicle.id))
+    values['updated_at'] = datetime.utcnow()
+    db.session.execute(
+        update(VehicleStats).where(VehicleStats.vehicle_id == vehicle.id).values(**values),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.refresh(stats)
+    _sync_odometer(vehicle, stats)
+
+def service_record_added(vehicle, record):
+    _apply(vehicle, _service_contribution(service_snapshot(record)))
+
+def service_record_updated(vehicle, before, record):
+    _apply(vehicle, _difference(_service_contribution(before), _service_contribution(service_snapshot(record))))
+
+def service_record_deleted(vehicle, record):
+    _apply(vehicle, _difference(_service_contribution(service_snapshot(record)), {}))
+
+def fuel_record_added(vehicle, record):
+    _apply(vehicle, _fuel_contribution(fuel_snapshot(record)))
+
+def fuel_record_updated(vehicle, before, record):
+    _apply(vehicle, _difference(_fuel_contribution(before), _fuel_contribution(fuel_snapshot(record))))
+
+def fuel_record_deleted(vehicle, record):
+    _apply(vehicle, _difference(_fuel_contribution(fuel_snapshot(record)), {}))
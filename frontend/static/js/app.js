@@ -6,6 +6,13 @@ let editingVehicleId = null;
 let currentUser = null;
 let currentTheme = 'dark';
 let userSettings = null;
+const RECORDS_PAGE_SIZE = 50;
+let serviceRecordsCursor = null;
+let fuelRecordsCursor = null;
+// The vehicle each list's first page was loaded for; later pages continue
+// its cursor even if another tab selects a different vehicle meanwhile.
+let serviceRecordsVehicleId = null;
+let fuelRecordsVehicleId = null;
 
 function setSelectedVehicle(vehicleId) {
     localStorage.setItem('selectedVehicleId', vehicleId);
@@ -68,18 +75,46 @@ function formatDate(dateString) {
     return new Date(dateString).toLocaleDateString(locale);
 }
 
+// GET responses are kept per tab with their ETag and revalidated with
+// If-None-Match; a 304 reuses the cached body.
+const API_CACHE_PREFIX = 'apiCache:';
+
+function readApiCache(endpoint) {
+    try {
+        return JSON.parse(sessionStorage.getItem(API_CACHE_PREFIX + endpoint));
+    } catch (error) {
+        return null;
+    }
+}
+
+function writeApiCache(endpoint, etag, data) {
+    try {
+        sessionStorage.setItem(API_CACHE_PREFIX + endpoint, JSON.stringify({ etag, data }));
+    } catch (error) {
+        // Storage full or unavailable: the next request is simply unconditional.
+    }
+}
+
 async function apiRequest(endpoint, options = {}) {
     try {
+        const isGet = !options.method || options.method.toUpperCase() === 'GET';
+        const cached = isGet ? readApiCache(endpoint) : null;
+        
         const response = await fetch(`${API_URL}${endpoint}`, {
             ...options,
             credentials: 'include',
             headers: {
                 'Content-Type': 'application/json',
                 'X-Requested-With': 'XMLHttpRequest',
+                ...(cached ? { 'If-None-Match': cached.etag } : {}),
                 ...options.headers
             }
         });
         
+        if (response.status === 304 && cached) {
+            return cached.data;
+        }
+        
         const contentType = response.headers.get('content-type');
         if (!contentType || !contentType.includes('application/json')) {
             const text = await response.text();
@@ -93,6 +128,11 @@ async function apiRequest(endpoint, options = {}) {
             throw new Error(data.error || 'Request failed');
         }
         
+        const etag = response.headers.get('ETag');
+        if (isGet && etag) {
+            writeApiCache(endpoint, etag, data);
+        }
+        
         return data;
     } catch (error) {
         console.error('API Request Error:', error);
@@ -163,6 +203,47 @@ async function logout() {
     }
 }
 
+// photo_variants from the API: {thumb, card, full}, each with width, webp
+// and jpeg URLs. Small originals can repeat a width; srcset wants it once.
+function variantSrcset(variants, format) {
+    const widths = new Set();
+    return Object.values(variants)
+        .sort((a, b) => a.width - b.width)
+        .filter(v => !widths.has(v.width) && widths.add(v.width))
+        .map(v => `${v[format]} ${v.width}w`)
+        .join(', ');
+}
+
+function responsivePhotoHtml(photo, variants, sizes, attributes) {
+    if (!variants) return `<img src="${photo}" ${attributes}>`;
+    return `<picture>
+        <source type="image/webp" srcset="${variantSrcset(variants, 'webp')}" sizes="${sizes}">
+        <img src="${variants.card.jpeg}" srcset="${variantSrcset(variants, 'jpeg')}" sizes="${sizes}" loading="lazy" ${attributes}>
+    </picture>`;
+}
+
+function setResponsivePhoto(img, photo, variants, sizes) {
+    let source = img.parentElement.tagName === 'PICTURE' ? img.parentElement.querySelector('source') : null;
+    if (!variants) {
+        if (source) source.remove();
+        img.removeAttribute('srcset');
+        img.src = photo;
+        return;
+    }
+    if (!source) {
+        const picture = document.createElement('picture');
+        img.replaceWith(picture);
+        source = document.createElement('source');
+        source.type = 'image/webp';
+        picture.append(source, img);
+    }
+    source.srcset = variantSrcset(variants, 'webp');
+    source.sizes = sizes;
+    img.srcset = variantSrcset(variants, 'jpeg');
+    img.sizes = sizes;
+    img.src = variants.card.jpeg;
+}
+
 async function loadVehicles() {
     try {
         const vehicles = await apiRequest('/api/vehicles');
@@ -181,7 +262,7 @@ function displayVehicles(vehicles) {
     
     container.innerHTML = vehicles.map(v => `
         <div class="vehicle-card ${v.status === 'sold' ? 'sold' : ''}" onclick="viewVehicle(${v.id})">
-            ${v.photo ? `<img src="${v.photo}" class="vehicle-photo" alt="${v.make} ${v.model}">` : ''}
+            ${v.photo ? responsivePhotoHtml(v.photo, v.photo_variants, '(max-width: 600px) 100vw, 320px', `class="vehicle-photo" alt="${v.make} ${v.model}"`) : ''}
             <h3>${v.year} ${v.make} ${v.model}</h3>
             <p>${v.vin || 'No VIN'}</p>
             <p>Odometer: ${v.odometer.toLocaleString()} ${unitLabel}</p>
@@ -206,24 +287,42 @@ async function addVehicle(vehicleData) {
     }
 }
 
-async function loadServiceRecords(vehicleId) {
+async function fetchRecordsPage(endpoint, cursor = null) {
+    const params = new URLSearchParams({ limit: RECORDS_PAGE_SIZE });
+    if (cursor) params.set('cursor', cursor);
+    return apiRequest(`${endpoint}?${params}`);
+}
+
+function updateLoadMoreButton(buttonId, cursor) {
+    const button = document.getElementById(buttonId);
+    if (button) button.style.display = cursor ? 'inline-block' : 'none';
+}
+
+async function loadServiceRecords(vehicleId, append = false) {
+    if (!append) serviceRecordsVehicleId = vehicleId;
     try {
-        const records = await apiRequest(`/api/vehicles/${vehicleId}/service-records`);
-        displayServiceRecords(records);
+        const page = await fetchRecordsPage(`/api/vehicles/${vehicleId}/service-records`, append ? serviceRecordsCursor : null);
+        // A first page for another vehicle was requested meanwhile.
+        if (vehicleId !== serviceRecordsVehicleId) return;
+        serviceRecordsCursor = page.next_cursor;
+        displayServiceRecords(vehicleId, page.items, append);
+        updateLoadMoreButton('service-records-load-more', serviceRecordsCursor);
     } catch (error) {
         console.error('Failed to load service records:', error);
     }
 }
 
+function loadMoreServiceRecords() {
+    if (serviceRecordsCursor) loadServiceRecords(serviceRecordsVehicleId, true);
+}
 
-function displayServiceRecords(records) {
+function displayServiceRecords(vehicleId, records, append = false) {
     const tbody = document.getElementById('service-records-tbody');
     if (!tbody) return;
     
     const settings = JSON.parse(localStorage.getItem('userSettings') || '{"currency":"GBP"}');
-    const vehicleId = getSelectedVehicle();
     
-    tbody.innerHTML = records.map(r => `
+    const rows = records.map(r => `
         <tr>
             <td>${formatDate(r.date)}</td>
             <td>${r.odometer.toLocaleString()}</td>
@@ -238,15 +337,20 @@ function displayServiceRecords(records) {
             </td>
         </tr>
     `).join('');
+    
+    if (append) {
+        tbody.insertAdjacentHTML('beforeend', rows);
+    } else {
+        tbody.innerHTML = rows;
+    }
 }
-function displayFuelRecords(records) {
+function displayFuelRecords(vehicleId, records, append = false) {
     const tbody = document.getElementById('fuel-records-tbody');
     if (!tbody) return;
     
     const settings = JSON.parse(localStorage.getItem('userSettings') || '{"currency":"GBP"}');
-    const vehicleId = getSelectedVehicle();
     
-    tbody.innerHTML = records.map(r => `
+    const rows = records.map(r => `
         <tr>
             <td>${formatDate(r.date)}</td>
             <td>${r.odometer.toLocaleString()}</td>
@@ -261,30 +365,45 @@ function displayFuelRecords(records) {
             </td>
         </tr>
     `).join('');
+    
+    if (append) {
+        tbody.insertAdjacentHTML('beforeend', rows);
+    } else {
+        tbody.innerHTML = rows;
+    }
 }
-async function loadFuelRecords(vehicleId) {
+async function loadFuelRecords(vehicleId, append = false) {
+    if (!append) fuelRecordsVehicleId = vehicleId;
     try {
-        const records = await apiRequest(`/api/vehicles/${vehicleId}/fuel-records`);
-        displayFuelRecords(records);
-        calculateFuelStats(records);
+        const page = await fetchRecordsPage(`/api/vehicles/${vehicleId}/fuel-records`, append ? fuelRecordsCursor : null);
+        if (vehicleId !== fuelRecordsVehicleId) return;
+        fuelRecordsCursor = page.next_cursor;
+        displayFuelRecords(vehicleId, page.items, append);
+        if (!append) loadFuelStats(vehicleId);
+        updateLoadMoreButton('fuel-records-load-more', fuelRecordsCursor);
     } catch (error) {
         console.error('Failed to load fuel records:', error);
     }
 }
 
+function loadMoreFuelRecords() {
+    if (fuelRecordsCursor) loadFuelRecords(fuelRecordsVehicleId, true);
+}
+
 
-function calculateFuelStats(records) {
-    const totalCost = records.reduce((sum, r) => sum + r.cost, 0);
-    const avgEconomy = records.filter(r => r.fuel_economy).reduce((sum, r, _, arr) => 
-        sum + r.fuel_economy / arr.length, 0);
-    
-    const settings = JSON.parse(localStorage.getItem('userSettings') || '{"currency":"GBP"}');
-    
-    const totalCostEl = document.getElementById('total-fuel-cost');
-    const avgEconomyEl = document.getElementById('avg-fuel-economy');
-    
-    if (totalCostEl) totalCostEl.textContent = formatCurrency(totalCost, settings.currency);
-    if (avgEconomyEl) avgEconomyEl.textContent = avgEconomy.toFixed(2);
+async function loadFuelStats(vehicleId) {
+    try {
+        const summary = await apiRequest(`/api/vehicles/${vehicleId}/summary`);
+        const settings = JSON.parse(localStorage.getItem('userSettings') || '{"currency":"GBP"}');
+        
+        const totalCostEl = document.getElementById('total-fuel-cost');
+        const avgEconomyEl = document.getElementById('avg-fuel-economy');
+        
+        if (totalCostEl) totalCostEl.textContent = formatCurrency(summary.total_fuel_cost, settings.currency);
+        if (avgEconomyEl) avgEconomyEl.textContent = (summary.average_fuel_economy || 0).toFixed(2);
+    } catch (error) {
+        console.error('Failed to load fuel stats:', error);
+    }
 }
 
 async function loadReminders(vehicleId) {
@@ -20,6 +20,7 @@ const translations = {
         add_note: "Add Note",
         add_reminder: "Add Reminder",
         export_csv: "Export CSV",
+        load_more: "Load more",
         export_all_data: "Export All Data",
         back_to_vehicle: "Back to Vehicle",
         date: "Date",
@@ -45,6 +46,7 @@ const translations = {
         add_record: "Add Record",
         update: "Update",
         create_backup: "Create Backup",
+        create_incremental_backup: "Create Incremental Backup",
         restore_backup: "Restore Backup",
         language: "Language",
         select_language: "Select Language",
@@ -143,6 +145,7 @@ const translations = {
         add_note: "Adauga notita",
         add_reminder: "Adauga memento",
         export_csv: "Exporta CSV",
+        load_more: "Incarca mai multe",
         export_all_data: "Exporta toate datele",
         back_to_vehicle: "Inapoi la vehicul",
         date: "Data",
@@ -168,6 +171,7 @@ const translations = {
         add_record: "Adauga inregistrare",
         update: "Actualizeaza",
         create_backup: "Creeaza backup",
+        create_incremental_backup: "Creeaza backup incremental",
         restore_backup: "Restaureaza backup",
         language: "Limba",
         select_language: "Selecteaza limba",